@@ -1,20 +1,25 @@
+import argparse
+import logging
 import pygame
 import random
+import time
 import scipy.spatial
+import scipy.sparse
+import scipy.sparse.csgraph
 import numpy as np
-import json
-import os
 from collections import deque
-import networkx as nx  # Add this line
-import random
+from GalaxyData import GalaxyData, load_galaxy, save_galaxy
+from GalaxyExport import export_galaxy_tiles
+from GalaxyRender import ZOOM_SNAP, FrameTimer, GalaxyRenderer, LayeredView, StaticLayer
+from GalaxyTelemetry import NO_TELEMETRY, Telemetry
+from GalaxyFormat import NameCodes, name_space_size, star_name
 
-# Initialize Pygame
-pygame.init()
+logger = logging.getLogger(__name__)
 
-# Set up the display
+# Set up the display. The window is only opened once something is drawn, so
+# generation can be imported and run on machines without a display.
 width, height = 1200, 900
-screen = pygame.display.set_mode((width, height))
-pygame.display.set_caption("Galaxy Map Generator")
+screen = None
 MAX_CONNECTION_DISTANCE = 100  # Adjust this value as needed
 
 # Colors
@@ -45,70 +50,106 @@ TOTAL_STARS = 500000
 # Maximum distance for star connections
 MAX_CONNECTION_DISTANCE = SEGMENT_SIZE * 1.1
 
+# Number of segments in each row of the galaxy shape
+ROW_SEGMENTS = [2, 4, 4, 4, 4, 4, 4, 4, 4, 6, 6, 6, 6, 6, 6, 6, 6, 8, 8, 8, 8, 8, 8, 8, 8, 10, 10, 10, 10, 10, 10, 10, 10, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 10, 10, 10, 10, 8, 8, 8, 8, 6, 6, 6, 6, 6, 6, 6, 6, 4, 4, 4, 4, 4, 4, 4, 4, 2]
+
+# Integer codes for star types, used by the array based pipeline
+STAR_TYPE_NAMES = list(STAR_TYPES)
+STAR_TYPE_CODES = {name: code for code, name in enumerate(STAR_TYPE_NAMES)}
+STAR_CAPACITY = np.array([STAR_TYPES[name]['connections'] for name in STAR_TYPE_NAMES])
+
+# Cumulative odds of each star type, in STAR_TYPE_NAMES order
+STAR_TYPE_THRESHOLDS = [0.0667, 0.2, 0.4667]
+
+
+def init_display(caption="Galaxy Map Generator"):
+    global screen
+    if screen is None:
+        pygame.init()
+        screen = pygame.display.set_mode((width, height))
+        pygame.display.set_caption(caption)
+    return screen
+
 
 def generate_star_name():
-    prefixes = ["Alpha", "Beta", "Gamma", "Delta", "Epsilon", "Zeta", "Eta", "Theta", "Iota", "Kappa"]
-    suffixes = ["Prime", "Major", "Minor", "Secundus", "Tertius", "Quartus", "Quintus", "Sextus", "Septimus", "Octavus"]
-    numbers = list(range(1, 1001))
-    
-    prefix = random.choice(prefixes)
-    suffix = random.choice(suffixes)
-    number = random.choice(numbers)
-    
-    return f"{prefix} {suffix}-{number}"
+    return star_name(random.randrange(name_space_size()))
+
+
+def generate_star_names(count, rng=None):
+    # Names for count stars in one draw. Codes are picked without
+    # replacement from a name space at least count wide, so no two stars
+    # share a name; the strings are only made when a name is read.
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    return NameCodes(rng.choice(name_space_size(count), count, replace=False).astype(np.uint32))
+
+
+# Minimum distance between stars
+MIN_STAR_DISTANCE = 5
+
+
+class PointGrid:
+    # Background grid for Poisson-disk placement. Cells are min_distance wide,
+    # so any point closer than min_distance lives in one of the 3x3 cells
+    # around a candidate and each check touches a handful of stars at most.
+    def __init__(self, min_distance=MIN_STAR_DISTANCE, points=()):
+        self.min_distance = min_distance
+        self.cells = {}
+        for p in points:
+            self.add(p)
+
+    def _cell(self, point):
+        return (int(point[0] // self.min_distance), int(point[1] // self.min_distance))
+
+    def add(self, point):
+        self.cells.setdefault(self._cell(point), []).append(point)
+
+    def is_far_enough(self, point):
+        cx, cy = self._cell(point)
+        min_sq = self.min_distance ** 2
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for p in self.cells.get((gx, gy), ()):
+                    if (point[0] - p[0])**2 + (point[1] - p[1])**2 < min_sq:
+                        return False
+        return True
 
 
-def generate_segment(segment_x, segment_y, segment_width, segment_height, stars_per_segment, existing_points):
+def generate_segment(segment_x, segment_y, segment_width, segment_height, stars_per_segment, existing_points, grid=None,
+                     telemetry=NO_TELEMETRY):
     seed_points = []
     star_types = []
-    min_distance = 5  # Minimum distance between stars
+
+    # Callers generating many segments should pass one shared grid; building it
+    # here from existing_points keeps the old call signature working.
+    if grid is None:
+        grid = PointGrid(MIN_STAR_DISTANCE, existing_points)
 
     def generate_point():
         return (random.uniform(segment_x, segment_x + segment_width),
                 random.uniform(segment_y, segment_y + segment_height))
 
-    def is_far_enough(point, existing_points):
-        return all((point[0] - p[0])**2 + (point[1] - p[1])**2 >= min_distance**2 for p in existing_points)
-
     attempts = 0
     while len(seed_points) < stars_per_segment and attempts < stars_per_segment * 10:
         new_point = generate_point()
-        if is_far_enough(new_point, seed_points) and is_far_enough(new_point, existing_points):
+        if grid.is_far_enough(new_point):
             seed_points.append(new_point)
+            grid.add(new_point)
             
             rand = random.random()
-            if rand < 0.0667:  # 1/15
+            if rand < STAR_TYPE_THRESHOLDS[0]:  # 1/15
                 star_types.append('gigantic')
-            elif rand < 0.2:  # 1/5
+            elif rand < STAR_TYPE_THRESHOLDS[1]:  # 1/5
                 star_types.append('large')
-            elif rand < 0.4667:  # 1/3
+            elif rand < STAR_TYPE_THRESHOLDS[2]:  # 1/3
                 star_types.append('medium')
             else:
                 star_types.append('small')
         attempts += 1
 
+    telemetry.count('placement_rejected', attempts - len(seed_points))
     return seed_points, star_types
 
-def save_galaxy(galaxy_data, filename):
-    serializable_data = {
-        'points': [list(p) for p in galaxy_data['points']],
-        'types': galaxy_data['types'],
-        'connections': [list(map(list, conn)) for conn in galaxy_data['connections']],
-        'connection_counts': {str(k): v for k, v in galaxy_data['connection_counts'].items()},
-        'star_names': galaxy_data['star_names'],
-        'lane_details': galaxy_data['lane_details']
-    }
-    with open(filename, 'w') as f:
-        json.dump(serializable_data, f)
-
-def load_galaxy(filename):
-    with open(filename, 'r') as f:
-        galaxy_data = json.load(f)
-        galaxy_data['points'] = [tuple(p) for p in galaxy_data['points']]
-        galaxy_data['connections'] = [tuple(map(tuple, conn)) for conn in galaxy_data['connections']]
-        galaxy_data['connection_counts'] = {tuple(eval(k)): v for k, v in galaxy_data['connection_counts'].items()}
-    return galaxy_data
-
 def within_distance(p1, p2, max_distance):
     return ((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2) <= max_distance**2
 
@@ -136,9 +177,113 @@ def find_connected_components(points, connections):
     
     return components
 
+class DisjointSet:
+    # Union-find over star indices with path halving and union by size
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+        self.count = n
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i == root_j:
+            return False
+        if self.size[root_i] < self.size[root_j]:
+            root_i, root_j = root_j, root_i
+        self.parent[root_j] = root_i
+        self.size[root_i] += self.size[root_j]
+        self.count -= 1
+        return True
+
+    def labels(self):
+        return np.array([self.find(i) for i in range(len(self.parent))], dtype=np.int64)
+
+
+# Limits for the component reconnection step
+RECONNECT_MAX_PASSES = 10
+RECONNECT_NEIGHBOURS = 8
+
+
+def reconnect_components(galaxy, max_passes=RECONNECT_MAX_PASSES, neighbours=RECONNECT_NEIGHBOURS, telemetry=NO_TELEMETRY,
+                         anchors=None):
+    # Each pass queries a KD-tree of the main component with every star
+    # outside it and bridges each stray component through its shortest
+    # valid lane. The disjoint set is updated as bridges are added, so the
+    # components never have to be recomputed from scratch. Stops after a
+    # pass that bridges nothing. Returns a mask of the stars in the main
+    # component; the bridges are added to galaxy.edges and galaxy.degree.
+    # The main component is the largest one, or, if anchors are given, the
+    # one holding the anchor stars (which count as already connected).
+    coords = galaxy.positions
+    points = coords.tolist()
+    components = DisjointSet(galaxy.star_count)
+    for i, j in galaxy.edges.tolist():
+        components.union(i, j)
+    anchors = [] if anchors is None else [int(a) for a in anchors]
+    for a in anchors[1:]:
+        components.union(anchors[0], a)
+
+    if not points:
+        return np.zeros(0, dtype=bool)
+
+    def main_label(labels):
+        return labels[anchors[0]] if anchors else np.bincount(labels).argmax()
+
+    bridges = []
+    for _ in range(max_passes):
+        labels = components.labels()
+        main = main_label(labels)
+        if components.count == 1:
+            break
+        telemetry.count('reconnect_passes')
+
+        main_ids = np.flatnonzero(labels == main)
+        others = np.flatnonzero(labels != main)
+        k = min(neighbours, len(main_ids))
+        distance, nearest = scipy.spatial.cKDTree(coords[main_ids]).query(
+            coords[others], k=k, distance_upper_bound=MAX_CONNECTION_DISTANCE)
+        distance = distance.reshape(len(others), k)
+        nearest = nearest.reshape(len(others), k)
+
+        # Visit candidate bridges shortest first; the first valid one wins
+        bridged = set()
+        for flat in np.argsort(distance, axis=None, kind='stable').tolist():
+            row, col = divmod(flat, k)
+            if not np.isfinite(distance[row, col]):
+                break
+            i = int(others[row])
+            if labels[i] in bridged:
+                continue
+            j = int(main_ids[nearest[row, col]])
+            if is_valid_connection(points[j], points[i], SEGMENT_SIZE):
+                bridges.append((j, i))
+                galaxy.degree[i] += 1
+                galaxy.degree[j] += 1
+                components.union(i, j)
+                bridged.add(labels[i])
+
+        if not bridged:
+            break
+
+    telemetry.count('reconnect_bridges', len(bridges))
+    if bridges:
+        galaxy.edges = np.concatenate([galaxy.edges, np.array(bridges, dtype=galaxy.edges.dtype)])
+    labels = components.labels()
+    return labels == main_label(labels)
+
+
 def is_valid_connection(p1, p2, segment_size):
-    seg1 = (int(p1[0] // segment_size), int(p1[1] // segment_size))
-    seg2 = (int(p2[0] // segment_size), int(p2[1] // segment_size))
+    # segment_size is one size for square segments or a (width, height) pair
+    size_x, size_y = segment_size if isinstance(segment_size, tuple) else (segment_size, segment_size)
+    seg1 = (int(p1[0] // size_x), int(p1[1] // size_y))
+    seg2 = (int(p2[0] // size_x), int(p2[1] // size_y))
     
     if seg1 == seg2:
         return True
@@ -150,263 +295,441 @@ def is_valid_connection(p1, p2, segment_size):
         return False
     
     if dx != 0:
-        x1_rel = p1[0] % segment_size
-        x2_rel = p2[0] % segment_size
-        if dx > 0 and x1_rel > segment_size / 2 and x2_rel > segment_size / 2:
+        x1_rel = p1[0] % size_x
+        x2_rel = p2[0] % size_x
+        if dx > 0 and x1_rel > size_x / 2 and x2_rel > size_x / 2:
             return False
-        if dx < 0 and x1_rel < segment_size / 2 and x2_rel < segment_size / 2:
+        if dx < 0 and x1_rel < size_x / 2 and x2_rel < size_x / 2:
             return False
     
     if dy != 0:
-        y1_rel = p1[1] % segment_size
-        y2_rel = p2[1] % segment_size
-        if dy > 0 and y1_rel > segment_size / 2 and y2_rel > segment_size / 2:
+        y1_rel = p1[1] % size_y
+        y2_rel = p2[1] % size_y
+        if dy > 0 and y1_rel > size_y / 2 and y2_rel > size_y / 2:
             return False
-        if dy < 0 and y1_rel < segment_size / 2 and y2_rel < segment_size / 2:
+        if dy < 0 and y1_rel < size_y / 2 and y2_rel < size_y / 2:
             return False
     
     return True
 
-def line_intersection(line1, line2):
-    x1, y1 = line1[0]
-    x2, y2 = line1[1]
-    x3, y3 = line2[0]
-    x4, y4 = line2[1]
-    
-    denom = (y4-y3)*(x2-x1) - (x4-x3)*(y2-y1)
-    if denom == 0:  # lines are parallel
-        return False
-    
-    ua = ((x4-x3)*(y1-y3) - (y4-y3)*(x1-x3)) / denom
-    ub = ((x2-x1)*(y1-y3) - (y2-y1)*(x1-x3)) / denom
-    
-    if ua < 0 or ua > 1 or ub < 0 or ub > 1:
-        return False
-    
-    return True
-
-def creates_too_many_intersections(graph, new_edge, max_intersections=3):
-    def ccw(A, B, C):
-        return (C[1]-A[1]) * (B[0]-A[0]) > (B[1]-A[1]) * (C[0]-A[0])
-
-    def intersect(A, B, C, D):
-        return ccw(A,C,D) != ccw(B,C,D) and ccw(A,B,C) != ccw(A,B,D)
-
-    intersections = 0
-    for edge in graph.edges():
-        if edge != new_edge and intersect(new_edge[0], new_edge[1], edge[0], edge[1]):
-            intersections += 1
-            if intersections > max_intersections:
-                return True
-    return False
-
+def ccw(A, B, C):
+    return (C[1]-A[1]) * (B[0]-A[0]) > (B[1]-A[1]) * (C[0]-A[0])
+
+
+def intersect(A, B, C, D):
+    return ccw(A,C,D) != ccw(B,C,D) and ccw(A,B,C) != ccw(A,B,D)
+
+
+# Cell size of the lane index used for crossing checks
+LANE_INDEX_CELL_SIZE = 20
+
+
+class LaneIndex:
+    # Uniform grid over lane bounding boxes. Each lane is registered in every
+    # cell its bounding box overlaps; two crossing lanes always share the cell
+    # holding the crossing point, so only lanes from shared cells are tested.
+    def __init__(self, edges=(), cell_size=LANE_INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.edges = []
+        self.coords = []
+        self.tests = 0
+        for edge in edges:
+            self.add(edge)
+
+    def _cells(self, edge):
+        (x1, y1), (x2, y2) = edge
+        cs = self.cell_size
+        for gx in range(int(min(x1, x2) // cs), int(max(x1, x2) // cs) + 1):
+            for gy in range(int(min(y1, y2) // cs), int(max(y1, y2) // cs) + 1):
+                yield gx, gy
+
+    def add(self, edge):
+        k = len(self.edges)
+        self.edges.append(edge)
+        self.coords.append((edge[0][0], edge[0][1], edge[1][0], edge[1][1]))
+        for cell in self._cells(edge):
+            self.cells.setdefault(cell, []).append(k)
+
+    def nearby(self, edge):
+        found = set()
+        for cell in self._cells(edge):
+            found.update(self.cells.get(cell, ()))
+        return found
+
+    def count_intersections(self, new_edge, limit=None):
+        intersections = 0
+        for k in self.nearby(new_edge):
+            edge = self.edges[k]
+            self.tests += 1
+            if edge != new_edge and intersect(new_edge[0], new_edge[1], edge[0], edge[1]):
+                intersections += 1
+                if limit is not None and intersections > limit:
+                    break
+        return intersections
+
+    def count_intersections_batch(self, new_edges):
+        # Crossing counts for many candidates at once against the current
+        # index. Candidate/lane pairs come from the grid; the ccw tests run
+        # as one vectorized pass over all pairs.
+        cand_ids, lane_ids = [], []
+        for i, edge in enumerate(new_edges):
+            near = self.nearby(edge)
+            cand_ids.extend([i] * len(near))
+            lane_ids.extend(near)
+        if not lane_ids:
+            return np.zeros(len(new_edges), dtype=int)
+        self.tests += len(lane_ids)
+
+        new_coords = np.array([(e[0][0], e[0][1], e[1][0], e[1][1]) for e in new_edges], dtype=float)
+        A = new_coords[cand_ids, 0:2]
+        B = new_coords[cand_ids, 2:4]
+        lanes = np.array(self.coords, dtype=float)[lane_ids]
+        C = lanes[:, 0:2]
+        D = lanes[:, 2:4]
+
+        def ccw_array(P, Q, R):
+            return (R[:, 1]-P[:, 1]) * (Q[:, 0]-P[:, 0]) > (Q[:, 1]-P[:, 1]) * (R[:, 0]-P[:, 0])
+
+        hits = (ccw_array(A, C, D) != ccw_array(B, C, D)) & (ccw_array(A, B, C) != ccw_array(A, B, D))
+        hits &= ~np.all(np.concatenate([A, B], axis=1) == lanes, axis=1)
+        return np.bincount(np.array(cand_ids)[hits], minlength=len(new_edges))
+
+
+def post_process_galaxy(galaxy, max_intersections=3, telemetry=NO_TELEMETRY):
+    # Replaces galaxy.edges with the MST plus the lanes that can be added
+    # back without too many crossings, and attaches orphaned stars
+    coords = galaxy.positions
+    n = galaxy.star_count
+    points = [tuple(p) for p in coords.tolist()]
+
+    # Dropping self loops and duplicates
+    edges = np.sort(galaxy.edges.astype(np.int64), axis=1)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    _, first = np.unique(edges, axis=0, return_index=True)
+    edges = edges[np.sort(first)]
+
+    weights = np.hypot(*(coords[edges[:, 0]] - coords[edges[:, 1]]).T)
+    within = weights <= MAX_CONNECTION_DISTANCE
+    edges, weights = edges[within], weights[within]
+
+    # Create a minimum spanning tree over a CSR adjacency keyed by star index
+    with telemetry.stage('mst'):
+        graph = scipy.sparse.csr_matrix((weights, (edges[:, 0], edges[:, 1])), shape=(n, n))
+        mst = scipy.sparse.csgraph.minimum_spanning_tree(graph).tocoo()
+        keys = edges[:, 0] * n + edges[:, 1]
+        in_mst = np.isin(keys, mst.row.astype(np.int64) * n + mst.col)
+
+    def lane(i, j):
+        return (points[i], points[j])
 
-def post_process_galaxy(galaxy_data):
-    points = galaxy_data['points']
-    connections = galaxy_data['connections']
-    
-    # Create a graph
-    G = nx.Graph()
-    G.add_nodes_from(points)
-    
-    # Add edges with weights, ensuring both ends have stars
-    valid_connections = []
-    for p1, p2 in connections:
-        if p1 in points and p2 in points:
-            distance = ((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)**0.5
-            if distance <= MAX_CONNECTION_DISTANCE:
-                G.add_edge(p1, p2, weight=distance)
-                valid_connections.append((p1, p2))
-    
-    # Create a minimum spanning tree
-    mst = nx.minimum_spanning_tree(G)
-    
     # Add back some connections, avoiding too many intersections
-    for edge in G.edges(data=True):
-        if edge[:2] not in mst.edges():
-            if not creates_too_many_intersections(mst, edge[:2]):
-                mst.add_edge(edge[0], edge[1], weight=edge[2]['weight'])
-    
-    # Remove any remaining long connections
-    edges_to_remove = [(u, v) for (u, v, d) in mst.edges(data=True) if d['weight'] > MAX_CONNECTION_DISTANCE]
-    mst.remove_edges_from(edges_to_remove)
-    
-    # Ensure all nodes are connected
-    largest_cc = max(nx.connected_components(mst), key=len)
-    for node in mst.nodes():
-        if node not in largest_cc:
-            closest_node = min(largest_cc, key=lambda x: ((x[0]-node[0])**2 + (x[1]-node[1])**2)**0.5)
-            distance = ((node[0]-closest_node[0])**2 + (node[1]-closest_node[1])**2)**0.5
-            if distance <= MAX_CONNECTION_DISTANCE:
-                mst.add_edge(node, closest_node, weight=distance)
-    
-    # Update galaxy data
-    galaxy_data['connections'] = list(mst.edges())
-    
-    return galaxy_data
-
-
-def generate_galaxy():
-    all_points = []
-    all_types = []
-    all_connections = []
-    connection_counts = {}
-
-    # Define the number of segments for each row
-    row_segments = [2, 4, 4, 4, 4, 4, 4, 4, 4, 6, 6, 6, 6, 6, 6, 6, 6, 8, 8, 8, 8, 8, 8, 8, 8, 10, 10, 10, 10, 10, 10, 10, 10, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 10, 10, 10, 10, 8, 8, 8, 8, 6, 6, 6, 6, 6, 6, 6, 6, 4, 4, 4, 4, 4, 4, 4, 4, 2]
+    with telemetry.stage('lane_restore'):
+        lane_index = LaneIndex(lane(i, j) for i, j in edges[in_mst].tolist())
+        candidates = np.flatnonzero(~in_mst)
+        candidate_lanes = [lane(i, j) for i, j in edges[candidates].tolist()]
+
+        # Crossing counts only grow as lanes are added back, so anything
+        # already over the limit against the bare MST can be dropped in one batch
+        mst_crossings = lane_index.count_intersections_batch(candidate_lanes)
+        keep = in_mst.copy()
+        for k, new_lane, crossings in zip(candidates.tolist(), candidate_lanes, mst_crossings):
+            if crossings > max_intersections:
+                continue
+            if lane_index.count_intersections(new_lane, max_intersections) <= max_intersections:
+                keep[k] = True
+                lane_index.add(new_lane)
+        edges = edges[keep]
+    telemetry.count('restore_candidates', len(candidates))
+    telemetry.count('lanes_restored', int(keep.sum() - in_mst.sum()))
+    telemetry.count('intersection_tests', lane_index.tests)
+
+    # Ensure all nodes are connected: attach every star outside the largest
+    # component to its nearest star inside it
+    with telemetry.stage('orphan_repair'):
+        graph = scipy.sparse.csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n, n))
+        _, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+        if n:
+            largest = np.bincount(labels).argmax()
+            main_ids = np.flatnonzero(labels == largest)
+            orphans = np.flatnonzero(labels != largest)
+            if len(orphans):
+                distance, nearest = scipy.spatial.cKDTree(coords[main_ids]).query(
+                    coords[orphans], distance_upper_bound=MAX_CONNECTION_DISTANCE)
+                reachable = np.isfinite(distance)
+                bridges = np.column_stack([orphans[reachable], main_ids[nearest[reachable]]])
+                edges = np.concatenate([edges, bridges])
+                telemetry.count('orphans_attached', len(bridges))
+
+    galaxy.edges = edges
+    return galaxy
+
+
+def iter_segments(row_segments=ROW_SEGMENTS, total_stars=TOTAL_STARS, map_size=None):
+    map_width, map_height = map_size or (width, height)
     total_rows = len(row_segments)
-    
-    for row, num_segments in enumerate(row_segments):
-        segment_width = width / 12  # Always divide the width into 12 parts
-        segment_height = height / total_rows
-        stars_per_segment = TOTAL_STARS // sum(row_segments)
+    segment_width = map_width / 12  # Always divide the width into 12 parts
+    segment_height = map_height / total_rows
+    stars_per_segment = total_stars // sum(row_segments)
 
+    for row, num_segments in enumerate(row_segments):
         start_x = (12 - num_segments) * segment_width / 2  # Center the segments
-
         for col in range(num_segments):
-            segment_x = start_x + col * segment_width
-            segment_y = row * segment_height
+            yield row, col, start_x + col * segment_width, row * segment_height, segment_width, segment_height, stars_per_segment
+
+
+# Minimum time in seconds between progress redraws when visualizing
+DRAW_INTERVAL = 0.25
+
+
+class ProgressView:
+    # Opt-in generation window. Each redraw only adds the stars and lanes
+    # produced since the previous one, and redraws are throttled to one per
+    # interval, so drawing stays off the generation critical path.
+    def __init__(self, map_size=None, interval=DRAW_INTERVAL):
+        map_width, map_height = map_size or (width, height)
+        self.scale = min(width / map_width, height / map_height)
+        self.interval = interval
+        self.last_draw = 0.0
+        self.points_drawn = 0
+        self.lanes_drawn = 0
+        self.text_rect = None
+        self.font = None
+
+    def _screen_pos(self, point):
+        return (int(point[0] * self.scale), int(point[1] * self.scale))
+
+    def update(self, points, types, edges, progress_text, force=False):
+        # edges are (i, j) star index pairs into points
+        now = time.monotonic()
+        if not force and now - self.last_draw < self.interval:
+            return
+        self.last_draw = now
+
+        surface = init_display()
+        if self.font is None or len(points) < self.points_drawn or len(edges) < self.lanes_drawn:
+            surface.fill(BLACK)
+            self.font = pygame.font.Font(None, 36)
+            self.points_drawn = self.lanes_drawn = 0
+
+        for i, j in edges[self.lanes_drawn:]:
+            pygame.draw.line(surface, (50, 50, 50), self._screen_pos(points[i]), self._screen_pos(points[j]), 1)
+        for point, star_type in zip(points[self.points_drawn:], types[self.points_drawn:]):
+            color = STAR_TYPES[star_type]['color']
+            size = STAR_TYPES[star_type]['size']
+            pygame.draw.circle(surface, color, self._screen_pos(point), size)
+        self.points_drawn = len(points)
+        self.lanes_drawn = len(edges)
 
-            seed_points, star_types = generate_segment(segment_x, segment_y, segment_width, segment_height, stars_per_segment, all_points)
-            
-            points_to_triangulate = seed_points + [p for p in all_points if 
-                                                   abs(p[0] - (segment_x + segment_width/2)) <= segment_width*1.5 and
-                                                   abs(p[1] - (segment_y + segment_height/2)) <= segment_height*1.5]
-            
-            if len(points_to_triangulate) > 3:
-                delaunay = scipy.spatial.Delaunay(points_to_triangulate)
-                
-                new_connections = []
-                for simplex in delaunay.simplices:
+        if self.text_rect:
+            surface.fill(BLACK, self.text_rect)
+        text_surface = self.font.render(progress_text, True, WHITE, BLACK)
+        self.text_rect = surface.blit(text_surface, (width // 2 - text_surface.get_width() // 2, height - 50))
+
+        pygame.event.pump()
+        pygame.display.flip()
+
+
+def generate_lanes_segments(total_stars=TOTAL_STARS, map_size=None, on_segment=None, telemetry=NO_TELEMETRY):
+    # Segment by segment: each new segment is triangulated together with the
+    # stars already placed around it. Stars are indices into growing lists;
+    # earlier stars are found through a bucket per segment.
+    points = []
+    types = []
+    degree = []
+    edges = []
+    grid = PointGrid(MIN_STAR_DISTANCE)
+    buckets = {}
+
+    segments = list(iter_segments(ROW_SEGMENTS, total_stars, map_size))
+    for done, (row, col, segment_x, segment_y, segment_width, segment_height, stars_per_segment) in enumerate(segments, 1):
+        with telemetry.stage('placement'):
+            seed_points, star_types = generate_segment(segment_x, segment_y, segment_width, segment_height,
+                                                       stars_per_segment, points, grid, telemetry)
+
+        # Stars within 1.5 segments of the centre all sit in the 3x3 block of
+        # segments around this one (segments are aligned to the width grid)
+        centre_x, centre_y = segment_x + segment_width/2, segment_y + segment_height/2
+        key = (round(segment_x / segment_width), row)
+        nearby = sorted(i for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                        for i in buckets.get((key[0] + dx, key[1] + dy), ())
+                        if abs(points[i][0] - centre_x) <= segment_width*1.5 and
+                        abs(points[i][1] - centre_y) <= segment_height*1.5)
+
+        first = len(points)
+        points.extend(seed_points)
+        types.extend(star_types)
+        degree.extend([0] * len(seed_points))
+        buckets[key] = range(first, len(points))
+        to_triangulate = list(buckets[key]) + nearby
+
+        if len(to_triangulate) > 3:
+            with telemetry.stage('triangulation'):
+                delaunay = scipy.spatial.Delaunay([points[i] for i in to_triangulate])
+
+            with telemetry.stage('lane_selection'):
+                considered = 0
+                lanes_before = len(edges)
+                for simplex in delaunay.simplices.tolist():
                     for k in range(3):
-                        p1 = points_to_triangulate[simplex[k]]
-                        p2 = points_to_triangulate[simplex[(k+1)%3]]
-                        
-                        if p1 in seed_points or p2 in seed_points:
-                            t1 = star_types[seed_points.index(p1)] if p1 in seed_points else all_types[all_points.index(p1)]
-                            t2 = star_types[seed_points.index(p2)] if p2 in seed_points else all_types[all_points.index(p2)]
-                            
-                            max_connections1 = STAR_TYPES[t1]['connections']
-                            max_connections2 = STAR_TYPES[t2]['connections']
-                            
-                            if not within_distance(p1, p2, MAX_CONNECTION_DISTANCE):
+                        i = to_triangulate[simplex[k]]
+                        j = to_triangulate[simplex[(k+1)%3]]
+
+                        # Only lanes touching the new segment
+                        if i >= first or j >= first:
+                            considered += 1
+                            max_connections1 = STAR_TYPES[types[i]]['connections']
+                            max_connections2 = STAR_TYPES[types[j]]['connections']
+
+                            if not within_distance(points[i], points[j], MAX_CONNECTION_DISTANCE):
                                 continue
-                            
-                            if (connection_counts.get(p1, 0) < max_connections1 and
-                                connection_counts.get(p2, 0) < max_connections2):
-                                
+
+                            if degree[i] < max_connections1 and degree[j] < max_connections2:
                                 keep_chance = min(max_connections1, max_connections2) / 7.0
-                                
+
                                 if random.random() < keep_chance:
-                                    new_connections.append((p1, p2))
-                                    connection_counts[p1] = connection_counts.get(p1, 0) + 1
-                                    connection_counts[p2] = connection_counts.get(p2, 0) + 1
-
-                all_connections.extend(new_connections)
-
-            all_points.extend(seed_points)
-            all_types.extend(star_types)
-
-            screen.fill(BLACK)
-            for conn in all_connections:
-                pygame.draw.line(screen, (50, 50, 50), conn[0], conn[1], 1)
-            for point, star_type in zip(all_points, all_types):
-                color = STAR_TYPES[star_type]['color']
-                size = STAR_TYPES[star_type]['size']
-                pygame.draw.circle(screen, color, (int(point[0]), int(point[1])), size)
-
-            progress_text = f"Generating segment ({row+1}, {col+1})"
-            font = pygame.font.Font(None, 36)
-            text_surface = font.render(progress_text, True, WHITE)
-            screen.blit(text_surface, (width // 2 - text_surface.get_width() // 2, height - 50))
-            pygame.display.flip()
-
-    all_points_set = set(all_points)
-    all_connections = [conn for conn in all_connections if conn[0] in all_points_set and conn[1] in all_points_set]
-
-    # Remove lanes with only one star
-    valid_connections = []
-    for conn in all_connections:
-        if conn[0] in all_points_set and conn[1] in all_points_set:
-            valid_connections.append(conn)
-    all_connections = valid_connections
-
-    components = find_connected_components(all_points, all_connections)
-    largest_component = max(components, key=len)
-    
-    all_points = [p for p in all_points if p in largest_component]
-    all_types = [t for p, t in zip(all_points, all_types) if p in largest_component]
-    all_connections = [c for c in all_connections if c[0] in largest_component and c[1] in largest_component]
-    connection_counts = {p: count for p, count in connection_counts.items() if p in largest_component}
-
-    while len(components) > 1:
-        main_component = largest_component
-        for component in components:
-            if component != main_component:
-                p1 = random.choice(list(main_component))
-                p2 = min(component, key=lambda p: ((p[0]-p1[0])**2 + (p[1]-p1[1])**2))
-                if within_distance(p1, p2, MAX_CONNECTION_DISTANCE) and is_valid_connection(p1, p2, SEGMENT_SIZE):
-                    all_connections.append((p1, p2))
-                    connection_counts[p1] = connection_counts.get(p1, 0) + 1
-                    connection_counts[p2] = connection_counts.get(p2, 0) + 1
-        components = find_connected_components(all_points, all_connections)
-        largest_component = max(components, key=len)
-
-    galaxy_data = {
-        'points': all_points,
-        'types': all_types,
-        'connections': all_connections,
-        'connection_counts': connection_counts
-    }
-
-    # Apply post-processing
-    galaxy_data = post_process_galaxy(galaxy_data)
-
-    # Update all_points and all_connections after post-processing
-    all_points = galaxy_data['points']
-    all_connections = galaxy_data['connections']
-
-    valid_points = set(all_points)
-
-    # Filter connections to ensure both endpoints are in valid_points
-    valid_connections = [conn for conn in all_connections if conn[0] in valid_points and conn[1] in valid_points]
-
-    star_names = []
-    lane_details = []
-
-    # Create a dictionary to map points to their indices
-    point_to_index = {tuple(p): i for i, p in enumerate(all_points)}
-
-    for point in all_points:
-        star_names.append(generate_star_name())
-
-    for conn in valid_connections:
-        start_point = tuple(conn[0])
-        end_point = tuple(conn[1])
-        start_star = point_to_index[start_point]
-        end_star = point_to_index[end_point]
-        distance = ((start_point[0] - end_point[0])**2 + (start_point[1] - end_point[1])**2)**0.5
-        lane_details.append({
-            "start_star": start_star,
-            "end_star": end_star,
-            "distance": distance
-        })
-
-    galaxy_data = {
-        'points': all_points,
-        'types': [all_types[all_points.index(p)] for p in all_points],
-        'connections': valid_connections,
-        'connection_counts': {p: connection_counts.get(p, 0) for p in all_points},
-        'star_names': star_names,
-        'lane_details': lane_details
-    }
-
-    save_galaxy(galaxy_data, "galaxy.json")
-
-    print("Galaxy generation complete!")
-
-def display_galaxy():
-    galaxy_data = load_galaxy("galaxy.json")
+                                    edges.append((i, j))
+                                    degree[i] += 1
+                                    degree[j] += 1
+            telemetry.count('delaunay_edges', considered)
+            telemetry.count('lanes_kept', len(edges) - lanes_before)
+
+        if on_segment:
+            on_segment(done, len(segments), points, types, edges)
+
+    return GalaxyData(points, [STAR_TYPE_CODES[t] for t in types], np.array(edges, dtype=np.int64).reshape(-1, 2), degree)
+
+
+def place_all_stars(total_stars=TOTAL_STARS, map_size=None, on_segment=None, telemetry=NO_TELEMETRY):
+    all_points = []
+    all_types = []
+    grid = PointGrid(MIN_STAR_DISTANCE)
+    segments = list(iter_segments(ROW_SEGMENTS, total_stars, map_size))
+    for done, (row, col, segment_x, segment_y, segment_width, segment_height, stars_per_segment) in enumerate(segments, 1):
+        seed_points, star_types = generate_segment(segment_x, segment_y, segment_width, segment_height, stars_per_segment,
+                                                   all_points, grid, telemetry)
+        all_points.extend(seed_points)
+        all_types.extend(star_types)
+        if on_segment:
+            on_segment(done, len(segments), all_points, all_types, [])
+    return all_points, all_types
+
+
+def delaunay_edges(points):
+    # Unique (i, j) index pairs with i < j from a single triangulation
+    simplices = scipy.spatial.Delaunay(points).simplices
+    edges = np.concatenate([simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [2, 0]]])
+    edges.sort(axis=1)
+    return np.unique(edges, axis=0)
+
+
+def select_lanes(points, type_codes, edges, rng, degree=None):
+    # Keep each candidate with chance min(capacity) / 7, visiting candidates in
+    # random order and respecting per-star connection caps. The keep draws are
+    # independent of the caps, so they are made for all edges up front and
+    # only the survivors go through the sequential capacity pass.
+    capacity = STAR_CAPACITY[type_codes]
+    delta = points[edges[:, 0]] - points[edges[:, 1]]
+    edges = edges[np.einsum('ij,ij->i', delta, delta) <= MAX_CONNECTION_DISTANCE**2]
+    edges = edges[rng.permutation(len(edges))]
+
+    keep_chance = np.minimum(capacity[edges[:, 0]], capacity[edges[:, 1]]) / 7.0
+    edges = edges[rng.random(len(edges)) < keep_chance]
+
+    degree = [0] * len(points) if degree is None else list(degree)
+    capacity = capacity.tolist()
+    kept = []
+    for k, (i, j) in enumerate(edges.tolist()):
+        if degree[i] < capacity[i] and degree[j] < capacity[j]:
+            degree[i] += 1
+            degree[j] += 1
+            kept.append(k)
+    return edges[kept], np.array(degree)
+
+
+def generate_lanes_global(total_stars=TOTAL_STARS, map_size=None, on_segment=None, telemetry=NO_TELEMETRY):
+    # Place every star first, then triangulate once and pick lanes on index arrays
+    with telemetry.stage('placement'):
+        all_points, all_types = place_all_stars(total_stars, map_size, on_segment, telemetry)
+    points = np.array(all_points)
+    type_codes = np.array([STAR_TYPE_CODES[t] for t in all_types], dtype=np.uint8)
+
+    # Seed numpy from the random module so random.seed() still controls the run
+    rng = np.random.default_rng(random.getrandbits(64))
+    with telemetry.stage('triangulation'):
+        candidates = delaunay_edges(points)
+    with telemetry.stage('lane_selection'):
+        edges, degree = select_lanes(points, type_codes, candidates, rng)
+    telemetry.count('delaunay_edges', len(candidates))
+    telemetry.count('lanes_kept', len(edges))
+    return GalaxyData(points, type_codes, edges, degree)
+
+
+def generate_galaxy(total_stars=TOTAL_STARS, seed=None, output="galaxy.json", pipeline="segments",
+                    tiles_dir=None, map_size=None, progress=None, visualize=False, workers=None, telemetry=None):
+    # progress, if given, is called as progress(stage, done, total); without
+    # it progress goes to the module logger. visualize opens a window that
+    # shows the stars and lanes as they are generated. workers only applies
+    # to the parallel pipeline, which gives identical output for a given
+    # seed whatever the worker count. telemetry, a GalaxyTelemetry.Telemetry,
+    # collects stage times and counters for the run.
+    if seed is not None:
+        random.seed(seed)
+    view = ProgressView(map_size) if visualize else None
+    telemetry = telemetry or NO_TELEMETRY
+
+    def report(stage, done, total):
+        if progress is not None:
+            progress(stage, done, total)
+        else:
+            logger.debug("%s %d/%d", stage, done, total)
+
+    def on_segment(done, total, points, types, edges):
+        report("segments", done, total)
+        if view:
+            view.update(points, types, edges, f"Generating segment {done}/{total}", force=done == total)
+
+    with telemetry.capture():
+        if pipeline == "parallel":
+            from GalaxyParallel import generate_lanes_parallel
+            galaxy = generate_lanes_parallel(total_stars, map_size, on_segment, seed=seed, workers=workers, telemetry=telemetry)
+        elif pipeline == "global":
+            galaxy = generate_lanes_global(total_stars, map_size, on_segment, telemetry)
+        else:
+            galaxy = generate_lanes_segments(total_stars, map_size, on_segment, telemetry)
+        logger.info("Placed %d stars with %d lanes", galaxy.star_count, galaxy.lane_count)
+
+        # Bridge stray components into the main one, then keep only the main one
+        report("reconnect", 0, 1)
+        with telemetry.stage('reconnect'):
+            galaxy = galaxy.subset(reconnect_components(galaxy, telemetry=telemetry))
+
+        # Apply post-processing
+        report("post_process", 0, 1)
+        with telemetry.stage('post_process'):
+            galaxy = post_process_galaxy(galaxy, telemetry=telemetry)
+        if view:
+            view.update(galaxy.positions, galaxy['types'], galaxy.edges, "Post-processing complete", force=True)
+
+        report("naming", 0, 1)
+        with telemetry.stage('naming'):
+            galaxy.name_codes = generate_star_names(galaxy.star_count).codes
+
+        report("save", 0, 1)
+        with telemetry.stage('save'):
+            save_galaxy(galaxy, output)
+        if tiles_dir:
+            with telemetry.stage('tiles'):
+                export_galaxy_tiles(galaxy, tiles_dir)
+        telemetry.count('stars', galaxy.star_count)
+        telemetry.count('lanes', galaxy.lane_count)
+
+    logger.info("Galaxy generation complete! %d stars, %d lanes written to %s", galaxy.star_count, galaxy.lane_count, output)
+    return galaxy
+
+def display_galaxy(filename="galaxy.json", show_frame_times=False):
+    galaxy_data = load_galaxy(filename)
+    screen = init_display()
     
     camera_x, camera_y = 0, 0
     zoom = 0.5
@@ -415,13 +738,24 @@ def display_galaxy():
     pan_start_x, pan_start_y = 0, 0
     font = pygame.font.Font(None, 24)
 
+    # Grid, lanes and stars live in a cached layer that is only repainted
+    # where the camera move exposed something new; the text overlay is the
+    # only thing drawn every frame
+    grid_size = 100
+    renderer = GalaxyRenderer(galaxy_data, STAR_TYPES)
+    view = LayeredView(screen, StaticLayer(renderer, (width, height), grid_size, (width * 2, height * 2)))
+
     running = True
     clock = pygame.time.Clock()
+    frame_timer = FrameTimer()
 
     while running:
+        frame_timer.start()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_frame_times = not show_frame_times
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 2:  # Middle mouse button
                     panning = True
@@ -439,31 +773,14 @@ def display_galaxy():
                 target_zoom *= 1.1 ** event.y
 
         zoom += (target_zoom - zoom) * 0.1
+        if abs(target_zoom - zoom) < target_zoom * ZOOM_SNAP:
+            zoom = target_zoom
+        frame_timer.mark("events")
 
-        screen.fill(BLACK)
-
-        grid_size = 100
-        for x in range(0, width * 2, grid_size):
-            pygame.draw.line(screen, (30, 30, 30), 
-                             (int((x + camera_x) * zoom), 0), 
-                             (int((x + camera_x) * zoom), height))
-        for y in range(0, height * 2, grid_size):
-            pygame.draw.line(screen, (30, 30, 30), 
-                             (0, int((y + camera_y) * zoom)), 
-                             (width, int((y + camera_y) * zoom)))
-
-        for p1, p2 in galaxy_data['connections']:
-            x1, y1 = int((p1[0] + camera_x) * zoom), int((p1[1] + camera_y) * zoom)
-            x2, y2 = int((p2[0] + camera_x) * zoom), int((p2[1] + camera_y) * zoom)
-            pygame.draw.line(screen, (50, 50, 50), (x1, y1), (x2, y2), 1)
-
-        for point, star_type in zip(galaxy_data['points'], galaxy_data['types']):
-            x = int((point[0] + camera_x) * zoom)
-            y = int((point[1] + camera_y) * zoom)
-            color = STAR_TYPES[star_type]['color']
-            size = STAR_TYPES[star_type]['size']
-            pygame.draw.circle(screen, color, (x, y), size)
-            mouse_x, mouse_y = pygame.mouse.get_pos()
+        view.begin_frame(camera_x, camera_y, zoom)
+        overlay = []
+
+        mouse_x, mouse_y = pygame.mouse.get_pos()
         grid_x = int((mouse_x / zoom - camera_x) / grid_size)
         grid_y = int((mouse_y / zoom - camera_y) / grid_size)
         quadrant_x = min(max(grid_x // 5, 0), 1)
@@ -474,14 +791,57 @@ def display_galaxy():
 
         coord_text = f"{quadrant} Quadrant, Segment ({segment_x}, {segment_y})"
         text_surface = font.render(coord_text, True, WHITE)
-        screen.blit(text_surface, (mouse_x + 10, mouse_y + 10))
+        overlay.append(screen.blit(text_surface, (mouse_x + 10, mouse_y + 10)))
 
-        pygame.display.flip()
+        # Frame-time breakdown in the top right corner, toggled with F3
+        if show_frame_times:
+            overlay.extend(frame_timer.draw(screen, font, width - 10, 10, WHITE))
+        frame_timer.mark("draw")
+
+        view.end_frame(overlay)
+        frame_timer.mark("flip")
         clock.tick(60)
 
     pygame.quit()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a galaxy map.")
+    parser.add_argument("--stars", type=int, default=TOTAL_STARS, help="number of stars to aim for")
+    parser.add_argument("--seed", type=int, help="random seed for a reproducible galaxy")
+    parser.add_argument("--output", default="galaxy.json", help="output file (.json, .json.gz, .json.br or .gbin)")
+    parser.add_argument("--map-size", type=float, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help="map size in world units (default: %d %d)" % (width, height))
+    parser.add_argument("--pipeline", choices=["segments", "global", "parallel"], default="segments")
+    parser.add_argument("--workers", type=int, help="worker processes for the parallel pipeline (default: all cores)")
+    parser.add_argument("--tiles", dest="tiles_dir", help="also write a tiled export to this directory")
+    parser.add_argument("--visualize", action="store_true", help="draw generation progress in a window")
+    parser.add_argument("--show", action="store_true", help="open the viewer once generation is done")
+    parser.add_argument("--frame-times", action="store_true", help="start the viewer with the frame-time overlay (F3 toggles it)")
+    parser.add_argument("--report", help="write stage timings and counters for the run to this JSON file")
+    parser.add_argument("--profile", help="run under cProfile and save the stats to this file (adds them to --report)")
+    parser.add_argument("--trace-memory", action="store_true", help="record peak traced memory per stage with tracemalloc")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    telemetry = None
+    if args.report or args.profile or args.trace_memory:
+        telemetry = Telemetry(profile=bool(args.profile), trace_memory=args.trace_memory)
+    generate_galaxy(total_stars=args.stars, seed=args.seed, output=args.output, pipeline=args.pipeline,
+                    tiles_dir=args.tiles_dir, map_size=tuple(args.map_size) if args.map_size else None,
+                    visualize=args.visualize, workers=args.workers, telemetry=telemetry)
+    if telemetry:
+        for line in telemetry.summary_lines():
+            logger.info("  %s", line)
+        if args.report:
+            telemetry.write_report(args.report)
+            logger.info("Telemetry report written to %s", args.report)
+        if args.profile:
+            telemetry.dump_profile(args.profile)
+            logger.info("Profile written to %s", args.profile)
+    if args.show:
+        display_galaxy(args.output, show_frame_times=args.frame_times)
+
+
 # Run the generation and display
 if __name__ == "__main__":
-    generate_galaxy()
-    display_galaxy()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -1,14 +1,12 @@
-import json
 import pygame
 import sys
+from GalaxyData import GalaxyData, load_galaxy
+from GalaxyRender import ZOOM_SNAP, FrameTimer, GalaxyRenderer, LayeredView, StarPicker, StaticLayer
 
-# Initialize Pygame
-pygame.init()
-
-# Set up the display
+# Set up the display. The window is opened by init_display so the module
+# can be imported without one.
 width, height = 1200, 900
-screen = pygame.display.set_mode((width, height))
-pygame.display.set_caption("Galaxy Viewer")
+screen = None
 
 # Colors
 WHITE = (255, 255, 255)
@@ -29,14 +27,17 @@ STAR_TYPES = {
 # Quadrants
 QUADRANTS = ['Alpha', 'Beta', 'Gamma', 'Delta']
 
-def load_galaxy(filename):
-    with open(filename, 'r') as f:
-        galaxy_data = json.load(f)
-    galaxy_data['points'] = [tuple(p) for p in galaxy_data['points']]
-    galaxy_data['connections'] = [tuple(map(tuple, conn)) for conn in galaxy_data['connections']]
-    return galaxy_data
-
-def display_galaxy(galaxy_data):
+def init_display():
+    global screen
+    if screen is None:
+        pygame.init()
+        screen = pygame.display.set_mode((width, height))
+        pygame.display.set_caption("Galaxy Viewer")
+    return screen
+
+def display_galaxy(galaxy_data, show_frame_times=False):
+    galaxy_data = GalaxyData.from_mapping(galaxy_data)
+    screen = init_display()
     camera_x, camera_y = 0, 0
     zoom = 0.5
     target_zoom = 0.5
@@ -44,20 +45,45 @@ def display_galaxy(galaxy_data):
     pan_start_x, pan_start_y = 0, 0
     font = pygame.font.Font(None, 24)
 
+    # Grid, lanes and stars live in a cached layer that is only repainted
+    # where the camera move exposed something new; the text overlay is the
+    # only thing drawn every frame
+    grid_size = 100
+    renderer = GalaxyRenderer(galaxy_data, STAR_TYPES)
+    view = LayeredView(screen, StaticLayer(renderer, (width, height), grid_size, (width * 2, height * 2)))
+    picker = StarPicker.for_renderer(renderer, galaxy_data.star_names())
+
+    # Left click selects the star under the cursor, left drag selects a box
+    selection = []
+    select_start = None
+
     running = True
     clock = pygame.time.Clock()
+    frame_timer = FrameTimer()
 
     while running:
+        frame_timer.start()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_frame_times = not show_frame_times
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 2:  # Middle mouse button
                     panning = True
                     pan_start_x, pan_start_y = event.pos
+                elif event.button == 1:
+                    select_start = event.pos
             elif event.type == pygame.MOUSEBUTTONUP:
                 if event.button == 2:  # Middle mouse button
                     panning = False
+                elif event.button == 1 and select_start:
+                    if abs(event.pos[0] - select_start[0]) + abs(event.pos[1] - select_start[1]) > 4:
+                        selection = picker.in_screen_box(select_start, event.pos, camera_x, camera_y, zoom).tolist()
+                    else:
+                        clicked = picker.at_screen(*event.pos, camera_x, camera_y, zoom)
+                        selection = [] if clicked is None else [clicked]
+                    select_start = None
             elif event.type == pygame.MOUSEMOTION:
                 if panning:
                     dx, dy = event.pos[0] - pan_start_x, event.pos[1] - pan_start_y
@@ -68,42 +94,37 @@ def display_galaxy(galaxy_data):
                 target_zoom *= 1.1 ** event.y
 
         zoom += (target_zoom - zoom) * 0.1
+        if abs(target_zoom - zoom) < target_zoom * ZOOM_SNAP:
+            zoom = target_zoom
+        frame_timer.mark("events")
 
-        screen.fill(BLACK)
-
-        grid_size = 100
-        for x in range(0, width * 2, grid_size):
-            pygame.draw.line(screen, (30, 30, 30), 
-                             (int((x + camera_x) * zoom), 0), 
-                             (int((x + camera_x) * zoom), height))
-        for y in range(0, height * 2, grid_size):
-            pygame.draw.line(screen, (30, 30, 30), 
-                             (0, int((y + camera_y) * zoom)), 
-                             (width, int((y + camera_y) * zoom)))
-
-        for p1, p2 in galaxy_data['connections']:
-            x1, y1 = int((p1[0] + camera_x) * zoom), int((p1[1] + camera_y) * zoom)
-            x2, y2 = int((p2[0] + camera_x) * zoom), int((p2[1] + camera_y) * zoom)
-            pygame.draw.line(screen, (50, 50, 50), (x1, y1), (x2, y2), 1)
+        view.begin_frame(camera_x, camera_y, zoom)
+        overlay = []
 
         mouse_x, mouse_y = pygame.mouse.get_pos()
         hovered_star = None
 
-        for i, (point, star_type) in enumerate(zip(galaxy_data['points'], galaxy_data['types'])):
-            x = int((point[0] + camera_x) * zoom)
-            y = int((point[1] + camera_y) * zoom)
-            color = STAR_TYPES[star_type]['color']
-            size = STAR_TYPES[star_type]['size']
-            pygame.draw.circle(screen, color, (x, y), size)
-
-            # Check if mouse is hovering over the star
-            if ((x - mouse_x)**2 + (y - mouse_y)**2)**0.5 < size * 2:
-                hovered_star = galaxy_data['star_names'][i]
+        # Check if mouse is hovering over a star; the nearest one wins
+        hovered = picker.at_screen(mouse_x, mouse_y, camera_x, camera_y, zoom)
+        if hovered is not None:
+            hovered_star = picker.names[hovered]
 
         # Display number of stars in top left corner
-        star_count_text = f"Total Stars: {len(galaxy_data['points'])}"
+        star_count_text = f"Total Stars: {galaxy_data.star_count}"
         star_count_surface = font.render(star_count_text, True, WHITE)
-        screen.blit(star_count_surface, (10, 10))
+        overlay.append(screen.blit(star_count_surface, (10, 10)))
+
+        # Display the current selection below it
+        if len(selection) == 1:
+            star = picker.info(selection[0])
+            selection_text = f"Selected: {star['name']} ({star['type']}, {star['degree']} lanes)"
+        elif selection:
+            selection_text = f"Selected: {len(selection)} stars"
+        else:
+            selection_text = None
+        if selection_text:
+            selection_surface = font.render(selection_text, True, WHITE)
+            overlay.append(screen.blit(selection_surface, (10, 35)))
 
         # Display quadrant and segment information
         grid_x = int((mouse_x / zoom - camera_x) / grid_size)
@@ -120,19 +141,25 @@ def display_galaxy(galaxy_data):
         quadrant_surface = font.render(quadrant_text, True, WHITE)
         segment_surface = font.render(segment_text, True, WHITE)
         
-        screen.blit(quadrant_surface, (mouse_x + 10, mouse_y + 10))
-        screen.blit(segment_surface, (mouse_x + 10, mouse_y + 35))
+        overlay.append(screen.blit(quadrant_surface, (mouse_x + 10, mouse_y + 10)))
+        overlay.append(screen.blit(segment_surface, (mouse_x + 10, mouse_y + 35)))
 
         # Display hovered star name
         if hovered_star:
             star_name_surface = font.render(hovered_star, True, WHITE)
-            screen.blit(star_name_surface, (mouse_x + 10, mouse_y + 60))
+            overlay.append(screen.blit(star_name_surface, (mouse_x + 10, mouse_y + 60)))
+
+        # Frame-time breakdown in the top right corner, toggled with F3
+        if show_frame_times:
+            overlay.extend(frame_timer.draw(screen, font, width - 10, 10, WHITE))
+        frame_timer.mark("draw")
 
-        pygame.display.flip()
+        view.end_frame(overlay)
+        frame_timer.mark("flip")
         clock.tick(60)
 
     pygame.quit()
 
 if __name__ == "__main__":
-    galaxy_data = load_galaxy("galaxy.json")
+    galaxy_data = load_galaxy(sys.argv[1] if len(sys.argv) > 1 else "galaxy.json")
     display_galaxy(galaxy_data)
\ No newline at end of file
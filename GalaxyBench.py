@@ -0,0 +1,297 @@
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pygame
+
+try:
+    import resource
+except ImportError:  # not available on Windows; peak RSS is then left out
+    resource = None
+
+import BetterGalaxyShape as shape
+from GalaxyData import load_galaxy, save_galaxy
+from GalaxyRender import GalaxyRenderer, StaticLayer
+from GalaxyTelemetry import Telemetry
+
+logger = logging.getLogger(__name__)
+
+# Headless benchmark of the generation and viewing pipeline. Each galaxy
+# size runs in a fresh process with a fixed seed, so peak RSS belongs to
+# that size alone. The map grows with the star count to keep the density of
+# a BENCH_DENSITY_STARS galaxy on the default 1200x900 map. Results go to a
+# JSON file; --compare checks them against an earlier results file:
+#
+#   python GalaxyBench.py --output bench.json
+#   python GalaxyBench.py --sizes 1000 10000 --compare bench.json
+#
+# Each of the --repeat runs of a size is its own process too. Stage times
+# are the median over the runs and peak RSS the largest any run reached.
+
+BENCH_SIZES = (1000, 10000, 100000, 500000)
+BENCH_SEED = 1
+BENCH_DENSITY_STARS = 10000
+BENCH_REPEAT = 3
+RESULTS_VERSION = 2
+
+# Frames drawn on the off-screen surface
+FRAME_SIZE = (shape.width, shape.height)
+FRAME_ZOOM = 1.0
+FRAME_PAN_STEPS = 20
+FRAME_PAN_PIXELS = 7
+
+# Lowest zoom a frame is drawn at; the density-map zoom of a galaxy with no
+# stars would otherwise be 0
+FRAME_MIN_ZOOM = 0.01
+
+# A stage only counts as a regression when it is this much slower than the
+# baseline, both relatively and in seconds. Run to run noise on an idle
+# machine reaches a few hundredths of a second on the larger stages.
+REGRESSION_TOLERANCE = 0.2
+REGRESSION_MIN_SECONDS = 0.05
+
+LANE_PIPELINES = ('segments', 'global', 'parallel')
+
+
+def bench_map_size(stars):
+    scale = math.sqrt(max(stars, 1) / BENCH_DENSITY_STARS)
+    return (shape.width * scale, shape.height * scale)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def place_stars(stars, map_size):
+    # generate_segment over every segment, sharing one grid as the
+    # pipelines do
+    points = []
+    grid = shape.PointGrid(shape.MIN_STAR_DISTANCE)
+    for _, _, x, y, w, h, per_segment in shape.iter_segments(shape.ROW_SEGMENTS, stars, map_size):
+        seed_points, _ = shape.generate_segment(x, y, w, h, per_segment, points, grid)
+        points.extend(seed_points)
+    return points
+
+
+def generate_lanes(pipeline, stars, map_size, seed, workers=None):
+    random.seed(seed)
+    if pipeline == 'parallel':
+        from GalaxyParallel import generate_lanes_parallel
+        return generate_lanes_parallel(stars, map_size, seed=seed, workers=workers)
+    if pipeline == 'global':
+        return shape.generate_lanes_global(stars, map_size)
+    return shape.generate_lanes_segments(stars, map_size)
+
+
+def draw_frames(renderer, galaxy, zoom, label, telemetry):
+    # A full repaint of the static layer centred on the galaxy, then a pan
+    # that only repaints the strips scrolled into view, laid out like the
+    # viewers' layer. Each pan frame is a call of the <label>_pan stage.
+    layer = StaticLayer(renderer, FRAME_SIZE, grid_extent=(FRAME_SIZE[0] * 2, FRAME_SIZE[1] * 2))
+    centre = galaxy.positions.mean(axis=0) if galaxy.star_count else np.zeros(2)
+    camera_x = FRAME_SIZE[0] / (2 * zoom) - float(centre[0])
+    camera_y = FRAME_SIZE[1] / (2 * zoom) - float(centre[1])
+
+    with telemetry.stage(f'{label}_full'):
+        layer.update(camera_x, camera_y, zoom)
+    for step in range(1, FRAME_PAN_STEPS + 1):
+        with telemetry.stage(f'{label}_pan'):
+            layer.update(camera_x - step * FRAME_PAN_PIXELS / zoom, camera_y - step * FRAME_PAN_PIXELS / zoom / 2, zoom)
+
+
+def run_size(stars, seed=BENCH_SEED, pipeline='segments', workers=None):
+    # One benchmark run; meant to be called in a fresh process. Stages are
+    # timed with Telemetry; a stage called several times (the pan frames)
+    # is reported per call. The process peak RSS is taken as each stage
+    # ends, so the stage that pushes it up is the one to look at.
+    telemetry = Telemetry()
+    stage_peak_rss = {}
+
+    @contextmanager
+    def stage(name):
+        with telemetry.stage(name):
+            yield
+        stage_peak_rss[name] = peak_rss_mb()
+
+    map_size = bench_map_size(stars)
+    random.seed(seed)
+    with stage('generate_segment'):
+        points = place_stars(stars, map_size)
+    with stage('lanes'):
+        galaxy = generate_lanes(pipeline, stars, map_size, seed, workers)
+
+    point_list = [tuple(p) for p in galaxy.positions.tolist()]
+    connections = [(point_list[i], point_list[j]) for i, j in galaxy.edges.tolist()]
+    with stage('find_connected_components'):
+        shape.find_connected_components(point_list, connections)
+    del point_list, connections
+
+    with stage('reconnect'):
+        in_main = shape.reconnect_components(galaxy)
+    galaxy = galaxy.subset(in_main)
+    with stage('post_process'):
+        galaxy = shape.post_process_galaxy(galaxy)
+    galaxy.name_codes = shape.generate_star_names(galaxy.star_count, np.random.default_rng(seed)).codes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, extension in (('json', '.json'), ('binary', '.gbin')):
+            filename = os.path.join(tmp, 'galaxy' + extension)
+            with stage(f'save_{label}'):
+                save_galaxy(galaxy, filename)
+            with stage(f'load_{label}'):
+                loaded = load_galaxy(filename)
+        galaxy = loaded
+
+        with stage('viewer_setup'):
+            renderer = GalaxyRenderer(galaxy, shape.STAR_TYPES)
+        lod_zoom = max(renderer.pyramid.lod_zoom / 2, FRAME_MIN_ZOOM)
+        for label, zoom in (('frame', FRAME_ZOOM), ('frame_lod', lod_zoom)):
+            draw_frames(renderer, galaxy, zoom, label, telemetry)
+        del renderer, loaded, galaxy
+
+    return {
+        'stars': stars,
+        'seed': seed,
+        'placed_stars': len(points),
+        'star_count': int(in_main.sum()),
+        'stages': {name: seconds / telemetry.calls[name] for name, seconds in telemetry.seconds.items()},
+        'stage_peak_rss_mb': stage_peak_rss,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def scaling_exponents(runs):
+    # Least-squares slope of log(seconds) against log(stars) for each stage:
+    # 1 is linear, 2 quadratic. Needs at least two sizes.
+    exponents = {}
+    metrics = {name for run in runs for name in run['stages']} | {'peak_rss_mb'}
+    for name in sorted(metrics):
+        pairs = []
+        for run in runs:
+            value = run['peak_rss_mb'] if name == 'peak_rss_mb' else run['stages'].get(name)
+            if value:
+                pairs.append((math.log(run['stars']), math.log(value)))
+        if len({x for x, _ in pairs}) >= 2:
+            xs, ys = np.array(pairs).T
+            exponents[name] = round(float(np.polyfit(xs, ys, 1)[0]), 3)
+    return exponents
+
+
+def largest(values):
+    # Max of the values that were measured, None if none were
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def combine_runs(repeats):
+    # One result for the repeats of a size: the median time of each stage
+    # and the largest peak RSS, as each repeat ran in its own process
+    run = dict(repeats[0])
+    run['stages'] = {name: float(np.median([r['stages'][name] for r in repeats])) for name in run['stages']}
+    run['stage_peak_rss_mb'] = {name: largest(r['stage_peak_rss_mb'][name] for r in repeats)
+                                for name in run['stage_peak_rss_mb']}
+    run['peak_rss_mb'] = largest(r['peak_rss_mb'] for r in repeats)
+    return run
+
+
+def run_benchmarks(sizes=BENCH_SIZES, seed=BENCH_SEED, pipeline='segments', repeat=BENCH_REPEAT, workers=None):
+    runs = []
+    for stars in sizes:
+        repeats = []
+        for _ in range(max(repeat, 1)):
+            # A fresh process per run, so ru_maxrss is that run's alone
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                repeats.append(executor.submit(run_size, stars, seed, pipeline, workers).result())
+        run = combine_runs(repeats)
+        logger.info("%d stars: %.2fs total, peak RSS %s MB", stars, sum(run['stages'].values()),
+                    f"{run['peak_rss_mb']:.0f}" if run['peak_rss_mb'] is not None else "n/a")
+        runs.append(run)
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'pipeline': pipeline,
+        'repeat': repeat,
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'runs': runs,
+        'scaling': scaling_exponents(runs),
+    }
+
+
+def compare_results(results, baseline, tolerance=REGRESSION_TOLERANCE, min_seconds=REGRESSION_MIN_SECONDS):
+    # Rows of (stars, stage, baseline, current, ratio, regressed) for every
+    # stage timed at a size present in both results. Both sides are the
+    # median of their repeats; a single run is too noisy to compare.
+    previous = {run['stars']: run for run in baseline['runs']}
+    rows = []
+    for run in results['runs']:
+        old = previous.get(run['stars'])
+        if old is None:
+            continue
+        for name, seconds in run['stages'].items():
+            if name not in old['stages']:
+                continue
+            before = old['stages'][name]
+            ratio = seconds / before if before else math.inf
+            regressed = seconds > before * (1 + tolerance) and seconds - before > min_seconds
+            rows.append((run['stars'], name, before, seconds, ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark galaxy generation, save/load and drawing.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(BENCH_SIZES), help="star counts to run")
+    parser.add_argument('--seed', type=int, default=BENCH_SEED)
+    parser.add_argument('--pipeline', choices=LANE_PIPELINES, default='segments', help="lane pipeline to time")
+    parser.add_argument('--workers', type=int, help="worker processes for the parallel pipeline")
+    parser.add_argument('--repeat', type=int, default=BENCH_REPEAT,
+                        help="runs per size, each in its own process; the median time of each stage is kept")
+    parser.add_argument('--output', default='bench_results.json', help="results file to write")
+    parser.add_argument('--compare', metavar='BASELINE', help="earlier results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help="allowed slowdown before a stage counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    results = run_benchmarks(args.sizes, args.seed, args.pipeline, args.repeat, args.workers)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info("Scaling exponents: %s", ", ".join(f"{name} {value}" for name, value in results['scaling'].items()))
+    logger.info("Results written to %s", args.output)
+
+    if not args.compare:
+        return 0
+    with open(args.compare, 'r') as f:
+        baseline = json.load(f)
+    if min(results['repeat'], baseline.get('repeat', 1)) < 2:
+        logger.warning("Comparing single runs; use --repeat 3 or more on both sides for stable results")
+    regressions = 0
+    for stars, name, before, seconds, ratio, regressed in compare_results(results, baseline, args.tolerance):
+        regressions += regressed
+        logger.info("%8d %-26s %9.4fs -> %9.4fs  x%.2f%s", stars, name, before, seconds, ratio, "  REGRESSION" if regressed else "")
+    logger.info("%d regression(s) against %s", regressions, args.compare)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
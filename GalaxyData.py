@@ -0,0 +1,140 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+from GalaxyExport import galaxy_arrays, read_galaxy, write_galaxy_json
+from GalaxyFormat import (BINARY_EXTENSION, STAR_TYPE_NAMES, CodedColumn, LanePoints, LaneTable, NameCodes,
+                          save_galaxy_binary)
+
+# Struct-of-arrays galaxy model. Stars are integer ids into contiguous
+# columns (position, type code, degree, name code) and lanes are an (m, 2)
+# array of star ids, so every per-star lookup is an array index instead of a
+# search over coordinate tuples.
+#
+# GalaxyData also reads like the galaxy_data dict the tools have always
+# passed around: 'points', 'types', 'connections', 'connection_counts',
+# 'star_names' and 'lane_details' are views over the columns, so exporters,
+# the binary writer and the viewers accept it unchanged.
+
+GALAXY_KEYS = ('points', 'types', 'connections', 'connection_counts', 'star_names', 'lane_details')
+
+
+class GalaxyData(Mapping):
+    # degree is the lane count recorded for each star while lanes were
+    # picked, written out as connection_counts. names holds text names for
+    # galaxies loaded without name codes.
+    def __init__(self, positions, type_codes, edges=None, degree=None, name_codes=None, names=None):
+        if not isinstance(positions, np.ndarray):
+            positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.positions = positions
+        self.type_codes = np.asarray(type_codes, dtype=np.uint8)
+        if edges is None:
+            edges = np.zeros((0, 2), dtype=np.int64)
+        self.edges = np.asarray(edges).reshape(-1, 2)
+        if degree is None:
+            degree = np.bincount(self.edges.ravel(), minlength=len(self.positions))
+        self.degree = np.asarray(degree, dtype=np.uint16)
+        self.name_codes = None if name_codes is None else np.asarray(name_codes, dtype=np.uint32)
+        self.names = names
+
+    @classmethod
+    def from_mapping(cls, galaxy_data):
+        # Columns from a galaxy_data dict, either parsed JSON or the result
+        # of load_galaxy_binary (whose memory-mapped columns are kept as is)
+        if isinstance(galaxy_data, cls):
+            return galaxy_data
+        positions, type_codes, edges, _ = galaxy_arrays(galaxy_data)
+        points = galaxy_data['points']
+        if isinstance(points, np.ndarray):
+            positions = points
+
+        counts = galaxy_data.get('connection_counts')
+        if isinstance(counts, dict):
+            lookup = {_point_key(key): count for key, count in counts.items()}
+            degree = [lookup.get(tuple(p), 0) for p in positions.tolist()]
+        else:
+            degree = counts
+
+        names = galaxy_data.get('star_names')
+        if hasattr(names, 'codes'):
+            return cls(positions, type_codes, edges, degree, name_codes=names.codes)
+        return cls(positions, type_codes, edges, degree, names=names)
+
+    @property
+    def star_count(self):
+        return len(self.positions)
+
+    @property
+    def lane_count(self):
+        return len(self.edges)
+
+    @property
+    def connections(self):
+        # Lane coordinate pairs, gathered from the edges on access
+        return LanePoints(self.positions, self.edges)
+
+    def lane_distances(self):
+        # Written out as sqrt(dx**2 + dy**2), the way lane_details always was
+        delta = self.positions[self.edges[:, 0]] - self.positions[self.edges[:, 1]]
+        return np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+
+    def star_names(self):
+        if self.name_codes is not None:
+            return NameCodes(self.name_codes)
+        return self.names
+
+    def subset(self, keep):
+        # The stars selected by a boolean mask, renumbered in order, and the
+        # lanes between them
+        keep = np.asarray(keep, dtype=bool)
+        new_ids = np.full(self.star_count, -1, dtype=np.int64)
+        new_ids[keep] = np.arange(int(keep.sum()))
+        edges = new_ids[self.edges].reshape(-1, 2)
+        names = None if self.names is None else [self.names[i] for i in np.flatnonzero(keep).tolist()]
+        return GalaxyData(self.positions[keep], self.type_codes[keep], edges[(edges >= 0).all(axis=1)], self.degree[keep],
+                          None if self.name_codes is None else self.name_codes[keep], names)
+
+    # Mapping interface with the legacy galaxy_data keys
+
+    def __getitem__(self, key):
+        if key == 'points':
+            return self.positions
+        if key == 'types':
+            return CodedColumn(self.type_codes, STAR_TYPE_NAMES)
+        if key == 'connections':
+            return self.connections
+        if key == 'connection_counts':
+            return self.degree
+        if key == 'star_names' and self.star_names() is not None:
+            return self.star_names()
+        if key == 'lane_details':
+            return LaneTable(self.edges, self.lane_distances())
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (key for key in GALAXY_KEYS if key != 'star_names' or self.star_names() is not None)
+
+    def __contains__(self, key):
+        # Without building the views, which for star_names may be a full list
+        return key in GALAXY_KEYS and (key != 'star_names' or self.star_names() is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def _point_key(key):
+    # connection_counts keys are point tuples, or "(x, y)" strings in JSON
+    if isinstance(key, str):
+        return tuple(float(v) for v in key.strip('()').split(','))
+    return tuple(key)
+
+
+def load_galaxy(filename):
+    return GalaxyData.from_mapping(read_galaxy(filename))
+
+
+def save_galaxy(galaxy, filename):
+    if filename.endswith(BINARY_EXTENSION):
+        save_galaxy_binary(galaxy, filename)
+    else:
+        write_galaxy_json(galaxy, filename)
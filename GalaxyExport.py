@@ -0,0 +1,364 @@
+import gzip
+import io
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+from GalaxyFormat import STAR_TYPE_NAMES, is_binary_galaxy, load_galaxy_binary
+
+try:
+    import brotli
+except ImportError:  # optional, only needed for .br files
+    brotli = None
+
+# Streaming galaxy.json export. Every section is produced by a generator and
+# written in batches of CHUNK_SIZE records, so memory use stays flat no matter
+# how large the galaxy is.
+#
+# Schemas:
+#   full  - the layout save_galaxy has always written and the web client reads
+#   index - drops the coordinate pairs in 'connections' (the client rebuilds
+#           them from lane_details) and stores connection_counts as a list
+#           indexed like points instead of a dict keyed by stringified tuples
+
+CHUNK_SIZE = 4096
+SCHEMAS = ('full', 'index')
+
+
+def iter_rows(values):
+    # Plain Python rows from lists or numpy arrays, converted block by block
+    if isinstance(values, np.ndarray):
+        for start in range(0, len(values), CHUNK_SIZE):
+            yield from values[start:start + CHUNK_SIZE].tolist()
+    else:
+        yield from values
+
+
+def iter_connections(galaxy_data):
+    # Coordinate pairs gathered from the edge list a block at a time when
+    # there is one, so the (m, 2, 2) connections array is never built whole
+    edges = getattr(galaxy_data, 'edges', None)
+    if edges is None:
+        edges = getattr(galaxy_data.get('lane_details'), 'edges', None)
+    if edges is not None:
+        points = np.asarray(galaxy_data['points'])
+        for start in range(0, len(edges), CHUNK_SIZE):
+            yield from points[np.asarray(edges[start:start + CHUNK_SIZE], dtype=np.int64)].tolist()
+        return
+    if 'connections' in galaxy_data:
+        yield from iter_rows(galaxy_data['connections'])
+        return
+    points = galaxy_data['points']
+    for lane in galaxy_data['lane_details']:
+        yield (points[lane['start_star']], points[lane['end_star']])
+
+
+def iter_connection_counts(galaxy_data):
+    # (point, count) pairs in star order
+    counts = galaxy_data.get('connection_counts', {})
+    if isinstance(counts, dict):
+        for p in iter_rows(galaxy_data['points']):
+            yield p, counts.get(tuple(p), 0)
+    else:
+        yield from zip(iter_rows(galaxy_data['points']), iter_rows(counts))
+
+
+def encode_point(p):
+    return f"[{float(p[0])!r}, {float(p[1])!r}]"
+
+
+def encode_connection(conn):
+    return f"[{encode_point(conn[0])}, {encode_point(conn[1])}]"
+
+
+def encode_lane(lane):
+    return json.dumps({
+        "start_star": int(lane['start_star']),
+        "end_star": int(lane['end_star']),
+        "distance": float(lane['distance'])
+    })
+
+
+def iter_json_array(items, encode=json.dumps):
+    yield '['
+    batch = []
+    separator = ''
+    for item in items:
+        batch.append(encode(item))
+        if len(batch) >= CHUNK_SIZE:
+            yield separator + ', '.join(batch)
+            separator = ', '
+            batch = []
+    if batch:
+        yield separator + ', '.join(batch)
+    yield ']'
+
+
+def iter_json_object(fields):
+    # fields is an iterable of (key, chunk generator) pairs
+    yield '{'
+    for k, (key, chunks) in enumerate(fields):
+        yield (', ' if k else '') + json.dumps(key) + ': '
+        yield from chunks
+    yield '}'
+
+
+def iter_galaxy_json(galaxy_data, schema='full'):
+    if schema not in SCHEMAS:
+        raise ValueError(f"unknown galaxy schema {schema!r}, expected one of {SCHEMAS}")
+
+    points = lambda: iter_json_array(iter_rows(galaxy_data['points']), encode_point)
+    types = lambda: iter_json_array(galaxy_data['types'])
+    star_names = lambda: iter_json_array(galaxy_data['star_names'])
+    lane_details = lambda: iter_json_array(galaxy_data['lane_details'], encode_lane)
+
+    if schema == 'full':
+        counts = ((str((float(p[0]), float(p[1]))), int(count)) for p, count in iter_connection_counts(galaxy_data))
+        fields = [
+            ('points', points()),
+            ('types', types()),
+            ('connections', iter_json_array(iter_connections(galaxy_data), encode_connection)),
+            ('connection_counts', iter_json_object((key, iter([str(count)])) for key, count in counts)),
+            ('star_names', star_names()),
+            ('lane_details', lane_details()),
+        ]
+    else:
+        fields = [
+            ('schema', iter([json.dumps('index')])),
+            ('points', points()),
+            ('types', types()),
+            ('connection_counts', iter_json_array((int(count) for _, count in iter_connection_counts(galaxy_data)))),
+            ('star_names', star_names()),
+            ('lane_details', lane_details()),
+        ]
+    yield from iter_json_object(fields)
+
+
+class BrotliWriter:
+    # Minimal text file wrapper around a streaming brotli compressor
+    def __init__(self, filename):
+        if brotli is None:
+            raise RuntimeError("brotli output needs the 'brotli' package (pip install brotli)")
+        self.file = open(filename, 'wb')
+        self.compressor = brotli.Compressor()
+
+    def write(self, text):
+        self.file.write(self.compressor.process(text.encode('utf-8')))
+
+    def close(self):
+        self.file.write(self.compressor.finish())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_output(filename, compression=None):
+    if compression is None:
+        if filename.endswith('.gz'):
+            compression = 'gzip'
+        elif filename.endswith('.br'):
+            compression = 'brotli'
+    if compression == 'gzip':
+        return gzip.open(filename, 'wt', encoding='utf-8')
+    if compression == 'brotli':
+        return BrotliWriter(filename)
+    if compression is not None:
+        raise ValueError(f"unknown compression {compression!r}")
+    return open(filename, 'w')
+
+
+def open_input(filename):
+    # Text stream over a galaxy JSON file, decompressed by its .gz/.br suffix.
+    # json.load reads the whole text anyway, so .br is decompressed in one go.
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt', encoding='utf-8')
+    if filename.endswith('.br'):
+        if brotli is None:
+            raise RuntimeError("brotli input needs the 'brotli' package (pip install brotli)")
+        with open(filename, 'rb') as f:
+            return io.StringIO(brotli.decompress(f.read()).decode('utf-8'))
+    return open(filename, 'r')
+
+
+def write_galaxy_json(galaxy_data, filename, schema='full', compression=None):
+    # compression is None, 'gzip' or 'brotli'; None picks it from a .gz/.br suffix
+    with open_output(filename, compression) as f:
+        for chunk in iter_galaxy_json(galaxy_data, schema):
+            f.write(chunk)
+
+
+# Tiled export. The finished galaxy is cut into a quadtree whose leaves are
+# TILE_SIZE squares (the generator's SEGMENT_SIZE) aligned to the origin.
+# Leaf tiles carry every star and lane; coarser levels are summaries with the
+# bright stars only and a lane density grid, for zoomed-out views. The
+# manifest lists every non-empty tile so a client fetches only what is
+# visible.
+
+TILE_SIZE = 240
+DENSITY_RESOLUTION = 16
+
+# Star types kept by summary tiles, by distance from the leaf level
+SUMMARY_STAR_TYPES = {1: ('gigantic', 'large')}
+DEFAULT_SUMMARY_STAR_TYPES = ('gigantic',)
+
+
+def read_galaxy(filename):
+    # Binary, JSON or compressed JSON, as written by save_galaxy
+    if is_binary_galaxy(filename):
+        return load_galaxy_binary(filename)
+    with open_input(filename) as f:
+        return json.load(f)
+
+
+def galaxy_arrays(galaxy_data):
+    positions = np.asarray(galaxy_data['points'], dtype=float).reshape(-1, 2)
+    codes = {name: code for code, name in enumerate(STAR_TYPE_NAMES)}
+    if hasattr(galaxy_data['types'], 'codes'):
+        type_codes = np.asarray(galaxy_data['types'].codes, dtype=np.uint8)
+    else:
+        type_codes = np.array([codes[t] for t in galaxy_data['types']], dtype=np.uint8)
+    lanes = galaxy_data['lane_details']
+    if hasattr(lanes, 'edges'):
+        edges = np.asarray(lanes.edges, dtype=np.int64).reshape(-1, 2)
+        distances = np.asarray(lanes.distances, dtype=float)
+    else:
+        edges = np.array([(lane['start_star'], lane['end_star']) for lane in lanes], dtype=np.int64).reshape(-1, 2)
+        distances = np.array([lane['distance'] for lane in lanes], dtype=float)
+    return positions, type_codes, edges, distances
+
+
+def group_by_tile(tile_xy):
+    # {(tx, ty): indices} for rows of an (n, 2) integer tile array
+    if not len(tile_xy):
+        return {}
+    order = np.lexsort((tile_xy[:, 1], tile_xy[:, 0]))
+    keys, starts = np.unique(tile_xy[order], axis=0, return_index=True)
+    groups = np.split(order, starts[1:])
+    return {(int(tx), int(ty)): group for (tx, ty), group in zip(keys, groups)}
+
+
+def export_galaxy_tiles(galaxy_data, out_dir, tile_size=TILE_SIZE):
+    positions, type_codes, edges, distances = galaxy_arrays(galaxy_data)
+    names = galaxy_data['star_names']
+    os.makedirs(out_dir, exist_ok=True)
+
+    leaf_tiles = np.floor(positions / tile_size).astype(np.int64)
+    span = int(leaf_tiles.max()) + 1 if len(leaf_tiles) else 1
+    leaf_level = max(0, math.ceil(math.log2(span)))
+
+    manifest = {
+        'version': 1,
+        'tile_size': tile_size,
+        'leaf_level': leaf_level,
+        'root_size': tile_size * 2 ** leaf_level,
+        'bounds': positions.min(axis=0).tolist() + positions.max(axis=0).tolist() if len(positions) else [0, 0, 0, 0],
+        'star_count': len(positions),
+        'lane_count': len(edges),
+        'star_types': STAR_TYPE_NAMES,
+        'levels': {}
+    }
+
+    for level in range(leaf_level, -1, -1):
+        size = tile_size * 2 ** (leaf_level - level)
+        star_tiles = leaf_tiles >> (leaf_level - level)
+        entries = []
+        os.makedirs(os.path.join(out_dir, str(level)), exist_ok=True)
+
+        if level == leaf_level:
+            tiles = leaf_tile_payloads(positions, type_codes, names, edges, distances, star_tiles)
+        else:
+            summary_types = SUMMARY_STAR_TYPES.get(leaf_level - level, DEFAULT_SUMMARY_STAR_TYPES)
+            tiles = summary_tile_payloads(positions, type_codes, names, edges, star_tiles, size, summary_types)
+
+        for (tx, ty), payload in tiles:
+            payload.update({'level': level, 'x': tx, 'y': ty, 'bounds': [tx * size, ty * size, (tx + 1) * size, (ty + 1) * size]})
+            path = f"{level}/{tx}_{ty}.json"
+            with open(os.path.join(out_dir, path), 'w') as f:
+                json.dump(payload, f)
+            entries.append([tx, ty, payload['star_count'], path])
+
+        manifest['levels'][level] = {'tile_size': size, 'tiles': entries}
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def leaf_tile_payloads(positions, type_codes, names, edges, distances, star_tiles):
+    start_tiles = star_tiles[edges[:, 0]]
+    end_tiles = star_tiles[edges[:, 1]]
+    internal = np.all(start_tiles == end_tiles, axis=1)
+
+    # Each boundary lane is listed in both tiles it touches
+    lanes_by_tile = group_by_tile(start_tiles[internal])
+    boundary_ids = np.flatnonzero(~internal)
+    boundary_by_tile = group_by_tile(np.concatenate([start_tiles[boundary_ids], end_tiles[boundary_ids]]))
+    boundary_lanes = np.concatenate([boundary_ids, boundary_ids])
+    boundary_sides = np.repeat([0, 1], len(boundary_ids))
+    internal_ids = np.flatnonzero(internal)
+    empty = np.zeros(0, dtype=np.int64)
+
+    for key, stars in group_by_tile(star_tiles).items():
+        lane_ids = internal_ids[lanes_by_tile.get(key, empty)]
+        crossing = boundary_by_tile.get(key, empty)
+        yield key, {
+            'star_count': len(stars),
+            'stars': {
+                'index': stars.tolist(),
+                'points': positions[stars].tolist(),
+                'types': type_codes[stars].tolist(),
+                'names': [names[i] for i in stars.tolist()]
+            },
+            'lanes': [[i, j, d] for (i, j), d in zip(edges[lane_ids].tolist(), distances[lane_ids].tolist())],
+            'boundary_lanes': [
+                {
+                    'star': int(edges[lane, side]),
+                    'other': int(edges[lane, 1 - side]),
+                    'other_point': positions[edges[lane, 1 - side]].tolist(),
+                    'other_tile': star_tiles[edges[lane, 1 - side]].tolist(),
+                    'distance': float(distances[lane])
+                }
+                for lane, side in zip(boundary_lanes[crossing].tolist(), boundary_sides[crossing].tolist())
+            ]
+        }
+
+
+def summary_tile_payloads(positions, type_codes, names, edges, star_tiles, size, summary_types):
+    keep_codes = [STAR_TYPE_NAMES.index(t) for t in summary_types]
+    midpoints = (positions[edges[:, 0]] + positions[edges[:, 1]]) / 2
+    lanes_by_tile = group_by_tile(np.floor(midpoints / size).astype(np.int64))
+    empty = np.zeros(0, dtype=np.int64)
+
+    for key, stars in group_by_tile(star_tiles).items():
+        bright = stars[np.isin(type_codes[stars], keep_codes)]
+        origin = np.array(key) * size
+
+        lane_cells = np.floor((midpoints[lanes_by_tile.get(key, empty)] - origin) / size * DENSITY_RESOLUTION).astype(np.int64)
+        lane_cells = np.clip(lane_cells, 0, DENSITY_RESOLUTION - 1)
+        density = np.zeros((DENSITY_RESOLUTION, DENSITY_RESOLUTION), dtype=np.int64)
+        np.add.at(density, (lane_cells[:, 1], lane_cells[:, 0]), 1)
+
+        yield key, {
+            'star_count': len(stars),
+            'type_counts': np.bincount(type_codes[stars], minlength=len(STAR_TYPE_NAMES)).tolist(),
+            'stars': {
+                'index': bright.tolist(),
+                'points': positions[bright].tolist(),
+                'types': type_codes[bright].tolist(),
+                'names': [names[i] for i in bright.tolist()]
+            },
+            'lane_density': density.tolist()
+        }
+
+
+# Cut a saved galaxy into tiles:
+#   python GalaxyExport.py galaxy.json tiles/
+if __name__ == "__main__":
+    export_galaxy_tiles(read_galaxy(sys.argv[1]), sys.argv[2])
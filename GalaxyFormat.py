@@ -0,0 +1,297 @@
+import json
+import sys
+
+import numpy as np
+
+# Columnar binary galaxy container.
+#
+# Layout: 8 byte magic, uint32 header length, JSON header, then raw
+# little-endian arrays, each starting on a 64 byte boundary. The header
+# records dtype, shape and offset for every array so a reader can np.memmap
+# any column without parsing the rest of the file.
+
+MAGIC = b'GALAXYB1'
+ALIGNMENT = 64
+BINARY_EXTENSION = '.gbin'
+
+# Arrays are written and iterated this many rows at a time, so memory-mapped
+# columns never have to be copied whole
+BLOCK_ROWS = 1 << 16
+
+# Type code order used in the file; stored in the header as well
+STAR_TYPE_NAMES = ['gigantic', 'large', 'medium', 'small']
+
+# Star names are "<prefix> <suffix>-<number>". A name code packs the three
+# parts as number_index * 100 + prefix * 10 + suffix, so every code is a
+# distinct name and the space grows by raising the number range without
+# changing any existing code.
+NAME_PREFIXES = ["Alpha", "Beta", "Gamma", "Delta", "Epsilon", "Zeta", "Eta", "Theta", "Iota", "Kappa"]
+NAME_SUFFIXES = ["Prime", "Major", "Minor", "Secundus", "Tertius", "Quartus", "Quintus", "Sextus", "Septimus", "Octavus"]
+NAME_NUMBERS = 1000
+NAME_STEMS = len(NAME_PREFIXES) * len(NAME_SUFFIXES)
+
+
+def is_binary_galaxy(filename):
+    if str(filename).endswith(BINARY_EXTENSION):
+        return True
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_arrays(filename, arrays, meta=None):
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    header = {'version': 1, 'meta': meta or {}, 'arrays': {}}
+
+    # Offsets depend on the header size, which depends on the offsets, so
+    # lay out against a generous header length
+    header_space = _aligned(len(MAGIC) + 4 + 512 + 128 * len(arrays))
+    offset = header_space
+    for name, a in arrays.items():
+        header['arrays'][name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset = _aligned(offset + a.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+    if len(MAGIC) + 4 + len(header_bytes) > header_space:
+        raise ValueError("galaxy header too large")
+
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint32(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for name, a in arrays.items():
+            f.seek(header['arrays'][name]['offset'])
+            for start in range(0, len(a), BLOCK_ROWS):
+                f.write(a[start:start + BLOCK_ROWS].tobytes())
+        f.truncate(offset)
+
+
+def read_arrays(filename, mmap_mode='r'):
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not a binary galaxy file")
+        header_length = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+        header = json.loads(f.read(header_length))
+
+    arrays = {}
+    for name, info in header['arrays'].items():
+        shape = tuple(info['shape'])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=info['dtype'])
+        elif mmap_mode:
+            arrays[name] = np.memmap(filename, dtype=info['dtype'], mode=mmap_mode, offset=info['offset'], shape=shape)
+        else:
+            with open(filename, 'rb') as f:
+                f.seek(info['offset'])
+                arrays[name] = np.fromfile(f, dtype=info['dtype'], count=int(np.prod(shape))).reshape(shape)
+    return arrays, header['meta']
+
+
+class NameTable:
+    # Star names packed as UTF-8 bytes plus offsets, decoded on access
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def pack(cls, names):
+        encoded = [name.encode('utf-8') for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return bytes(self.data[start:end]).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def name_space_size(count=0):
+    # Smallest name space of whole thousands of numbers holding count names
+    blocks = max(1, -(-count // (NAME_STEMS * NAME_NUMBERS)))
+    return NAME_STEMS * NAME_NUMBERS * blocks
+
+
+def star_name(code):
+    number, stem = divmod(int(code), NAME_STEMS)
+    prefix, suffix = divmod(stem, len(NAME_SUFFIXES))
+    return f"{NAME_PREFIXES[prefix]} {NAME_SUFFIXES[suffix]}-{number + 1}"
+
+
+def star_name_code(name):
+    # Inverse of star_name; None for names outside the scheme
+    try:
+        stem, number = name.rsplit('-', 1)
+        prefix, suffix = stem.split(' ')
+        return (int(number) - 1) * NAME_STEMS + NAME_PREFIXES.index(prefix) * len(NAME_SUFFIXES) + NAME_SUFFIXES.index(suffix)
+    except ValueError:
+        return None
+
+
+class NameCodes:
+    # Star names kept as integer name codes and spelled out on access
+    def __init__(self, codes):
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [star_name(c) for c in self.codes[i].tolist()]
+        return star_name(self.codes[i])
+
+    def __iter__(self):
+        for start in range(0, len(self.codes), BLOCK_ROWS):
+            for c in self.codes[start:start + BLOCK_ROWS].tolist():
+                yield star_name(c)
+
+
+class CodedColumn:
+    # Sequence view mapping integer codes to labels, e.g. type codes to names
+    def __init__(self, codes, labels):
+        self.codes = codes
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.labels[c] for c in self.codes[i].tolist()]
+        return self.labels[self.codes[i]]
+
+    def __iter__(self):
+        labels = self.labels
+        for start in range(0, len(self.codes), BLOCK_ROWS):
+            for c in self.codes[start:start + BLOCK_ROWS].tolist():
+                yield labels[c]
+
+
+class LaneTable:
+    # lane_details view over the edge and distance columns
+    def __init__(self, edges, distances):
+        self.edges = edges
+        self.distances = distances
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        return {
+            "start_star": int(self.edges[i, 0]),
+            "end_star": int(self.edges[i, 1]),
+            "distance": float(self.distances[i])
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class LanePoints:
+    # connections view: the coordinate pairs of each lane, gathered from the
+    # edge list when asked for instead of stored as an (m, 2, 2) array
+    def __init__(self, positions, edges):
+        self.positions = positions
+        self.edges = edges
+
+    @property
+    def shape(self):
+        return (len(self.edges), 2, self.positions.shape[1])
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __getitem__(self, i):
+        return self.positions[np.asarray(self.edges[i], dtype=np.int64)]
+
+    def __iter__(self):
+        for start in range(0, len(self.edges), BLOCK_ROWS):
+            yield from self[start:start + BLOCK_ROWS].tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        points = self[:]
+        return points if dtype is None else points.astype(dtype, copy=False)
+
+
+def save_galaxy_binary(galaxy_data, filename):
+    # Accepts a galaxy_data dict or GalaxyData; columns that are already
+    # arrays are written as they are
+    points = galaxy_data['points']
+    types = galaxy_data['types']
+    connection_counts = galaxy_data.get('connection_counts', {})
+    lane_details = galaxy_data['lane_details']
+    star_names = galaxy_data['star_names']
+
+    if hasattr(types, 'codes'):
+        type_codes = np.asarray(types.codes, dtype=np.uint8)
+    else:
+        codes = {name: code for code, name in enumerate(STAR_TYPE_NAMES)}
+        type_codes = np.array([codes[t] for t in types], dtype=np.uint8)
+    if hasattr(lane_details, 'edges'):
+        edges = np.asarray(lane_details.edges, dtype=np.uint32).reshape(-1, 2)
+        distances = np.asarray(lane_details.distances, dtype=np.float32)
+    else:
+        edges = np.array([(lane['start_star'], lane['end_star']) for lane in lane_details], dtype=np.uint32).reshape(-1, 2)
+        distances = np.array([lane['distance'] for lane in lane_details], dtype=np.float32)
+    if isinstance(connection_counts, dict):
+        connection_counts = [connection_counts.get(tuple(p), 0) for p in points]
+
+    arrays = {
+        'positions': np.asarray(points, dtype=np.float32).reshape(-1, 2),
+        'type_codes': type_codes,
+        'edges': edges,
+        'lane_distances': distances,
+        'connection_counts': np.asarray(connection_counts, dtype=np.uint16),
+    }
+    # Generated names are stored as their codes, anything else as text
+    if hasattr(star_names, 'codes'):
+        arrays['name_codes'] = np.asarray(star_names.codes, dtype=np.uint32)
+    else:
+        names = NameTable.pack(star_names)
+        arrays['name_offsets'] = names.offsets
+        arrays['name_bytes'] = names.data
+    write_arrays(filename, arrays, {'star_types': STAR_TYPE_NAMES})
+
+
+def load_galaxy_binary(filename, mmap_mode='r'):
+    # Returns the usual galaxy_data keys backed by memory-mapped columns:
+    # points is an (n, 2) float32 array, connection_counts an array indexed
+    # like points, and types, connections, star_names and lane_details lazy
+    # sequences.
+    arrays, meta = read_arrays(filename, mmap_mode)
+    positions = arrays['positions']
+    edges = arrays['edges']
+    return {
+        'points': positions,
+        'types': CodedColumn(arrays['type_codes'], meta.get('star_types', STAR_TYPE_NAMES)),
+        'connections': LanePoints(positions, edges),
+        'connection_counts': arrays['connection_counts'],
+        'star_names': NameCodes(arrays['name_codes']) if 'name_codes' in arrays else NameTable(arrays['name_offsets'], arrays['name_bytes']),
+        'lane_details': LaneTable(edges, arrays['lane_distances']),
+        'arrays': arrays
+    }
+
+
+# Convert a JSON galaxy (.json, .json.gz or .json.br) to the binary format:
+#   python GalaxyFormat.py galaxy.json galaxy.gbin
+if __name__ == "__main__":
+    from GalaxyData import load_galaxy
+    source, target = sys.argv[1], sys.argv[2]
+    save_galaxy_binary(load_galaxy(source), target)
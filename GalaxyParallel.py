@@ -0,0 +1,163 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from BetterGalaxyShape import (MIN_STAR_DISTANCE, ROW_SEGMENTS, STAR_TYPE_NAMES, STAR_TYPE_THRESHOLDS, TOTAL_STARS,
+                               PointGrid, delaunay_edges, is_valid_connection, iter_segments, select_lanes)
+from GalaxyData import GalaxyData
+from GalaxyTelemetry import NO_TELEMETRY
+
+logger = logging.getLogger(__name__)
+
+# Seeded, parallel generation engine. Every segment draws from its own RNG
+# stream spawned from the master seed. Segments are built in phases: no two
+# segments of a phase are within MIN_STAR_DISTANCE of each other, so a phase
+# runs in any order on any number of worker processes, and each segment
+# places its stars around a halo of the stars its neighbours placed in
+# earlier phases. Results are merged in segment order and the shared
+# borders are stitched with one more stream, which makes the output depend
+# on the seed alone and not on the worker count.
+
+
+def segment_rng(seed, index):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+
+
+def segment_phases(segments, margin=MIN_STAR_DISTANCE):
+    # Greedy colouring, in segment order, of the graph joining segments less
+    # than margin apart. Returns the phase of each segment and each
+    # segment's neighbours.
+    rects = np.array([(x, y, x + w, y + h) for _, _, x, y, w, h, _ in segments], dtype=float).reshape(-1, 4)
+    near = ((rects[:, None, 0] < rects[None, :, 2] + margin) & (rects[:, None, 2] > rects[None, :, 0] - margin) &
+            (rects[:, None, 1] < rects[None, :, 3] + margin) & (rects[:, None, 3] > rects[None, :, 1] - margin))
+    np.fill_diagonal(near, False)
+    neighbours = [np.flatnonzero(row).tolist() for row in near]
+    phases = []
+    for index, adjacent in enumerate(neighbours):
+        taken = {phases[j] for j in adjacent if j < index}
+        phases.append(next(phase for phase in range(len(taken) + 1) if phase not in taken))
+    return phases, neighbours
+
+
+def segment_halo(segment, neighbour_points, margin=MIN_STAR_DISTANCE):
+    # Stars from neighbouring segments close enough to the segment to
+    # constrain its placement
+    _, _, x, y, w, h, _ = segment
+    halo = np.concatenate(neighbour_points).reshape(-1, 2) if neighbour_points else np.zeros((0, 2))
+    inside = ((halo[:, 0] > x - margin) & (halo[:, 0] < x + w + margin) &
+              (halo[:, 1] > y - margin) & (halo[:, 1] < y + h + margin))
+    return halo[inside]
+
+
+def build_segment(task):
+    # Stars and local lanes for one segment; runs in a worker process. halo
+    # holds the stars already placed around the segment.
+    index, seed, segment_x, segment_y, segment_width, segment_height, stars_per_segment, halo = task
+    rng = segment_rng(seed, index)
+
+    # Same dart throwing as generate_segment, with the candidates and their
+    # type rolls drawn up front
+    attempts = stars_per_segment * 10
+    xs = rng.uniform(segment_x, segment_x + segment_width, attempts)
+    ys = rng.uniform(segment_y, segment_y + segment_height, attempts)
+    codes = np.searchsorted(STAR_TYPE_THRESHOLDS, rng.random(attempts), side='right').astype(np.uint8)
+
+    grid = PointGrid(MIN_STAR_DISTANCE, map(tuple, halo.tolist()))
+    accepted = []
+    for k, point in enumerate(zip(xs.tolist(), ys.tolist())):
+        if len(accepted) >= stars_per_segment:
+            break
+        if grid.is_far_enough(point):
+            grid.add(point)
+            accepted.append(k)
+
+    points = np.column_stack([xs[accepted], ys[accepted]])
+    type_codes = codes[accepted]
+    if len(points) > 3:
+        edges, _ = select_lanes(points, type_codes, delaunay_edges(points), rng)
+    else:
+        edges = np.zeros((0, 2), dtype=np.int64)
+    return points, type_codes, edges
+
+
+def merge_segments(results):
+    # Concatenate segment results in segment order, renumbering each
+    # segment's lanes. owner is the segment of each star.
+    points, type_codes, edges, owner = [], [], [], []
+    offset = 0
+    for index, (seg_points, seg_codes, seg_edges) in enumerate(results):
+        edges.append(np.asarray(seg_edges, dtype=np.int64).reshape(-1, 2) + offset)
+        points.append(seg_points)
+        type_codes.append(seg_codes)
+        owner.append(np.full(len(seg_points), index, dtype=np.int64))
+        offset += len(seg_points)
+
+    return (np.concatenate(points).reshape(-1, 2), np.concatenate(type_codes),
+            np.concatenate(edges).reshape(-1, 2), np.concatenate(owner))
+
+
+def stitch_borders(points, type_codes, owner, edges, segment_size, rng):
+    # Cross-segment lanes from one triangulation of the merged stars, limited
+    # by is_valid_connection's half-segment rules and the remaining capacity
+    # of each star after its local lanes
+    candidates = delaunay_edges(points)
+    candidates = candidates[owner[candidates[:, 0]] != owner[candidates[:, 1]]]
+    valid = [is_valid_connection(tuple(points[i]), tuple(points[j]), segment_size) for i, j in candidates.tolist()]
+    candidates = candidates[np.array(valid, dtype=bool)] if len(candidates) else candidates
+
+    degree = np.bincount(edges.ravel(), minlength=len(points))
+    stitched, degree = select_lanes(points, type_codes, candidates, rng, degree)
+    return np.concatenate([edges, stitched]), degree
+
+
+def generate_lanes_parallel(total_stars=TOTAL_STARS, map_size=None, on_segment=None, seed=None, workers=None,
+                            telemetry=NO_TELEMETRY):
+    # Placement, triangulation and local lane selection happen inside the
+    # workers, so telemetry only sees them together as 'segments'
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+        logger.info("Parallel generation seed: %d", seed)
+
+    segments = list(iter_segments(ROW_SEGMENTS, total_stars, map_size))
+    phases, neighbours = segment_phases(segments)
+    segment_size = (segments[0][4], segments[0][5])
+    workers = workers or os.cpu_count() or 1
+
+    preview_points, preview_types = [], []
+    results = [None] * len(segments)
+    done = 0
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        with telemetry.stage('segments'):
+            for phase in range(max(phases, default=-1) + 1):
+                indices = [index for index, p in enumerate(phases) if p == phase]
+                tasks = []
+                for index in indices:
+                    _, _, x, y, w, h, n = segments[index]
+                    halo = segment_halo(segments[index], [results[j][0] for j in neighbours[index] if results[j] is not None])
+                    tasks.append((index, seed, x, y, w, h, n, halo))
+                if executor:
+                    iterator = executor.map(build_segment, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+                else:
+                    iterator = map(build_segment, tasks)
+                for index, result in zip(indices, iterator):
+                    results[index] = result
+                    done += 1
+                    if on_segment:
+                        preview_points.extend(map(tuple, result[0].tolist()))
+                        preview_types.extend(STAR_TYPE_NAMES[c] for c in result[1].tolist())
+                        on_segment(done, len(segments), preview_points, preview_types, [])
+    finally:
+        if executor:
+            executor.shutdown()
+
+    with telemetry.stage('merge'):
+        points, type_codes, edges, owner = merge_segments(results)
+    telemetry.count('lanes_kept', len(edges))
+    with telemetry.stage('border_stitch'):
+        local_lanes = len(edges)
+        edges, degree = stitch_borders(points, type_codes, owner, edges, segment_size, segment_rng(seed, len(segments)))
+    telemetry.count('lanes_kept', len(edges) - local_lanes)
+    return GalaxyData(points, type_codes, edges, degree)
@@ -0,0 +1,417 @@
+import argparse
+import json
+import logging
+import random
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+from BetterGalaxyShape import (MIN_STAR_DISTANCE, ROW_SEGMENTS, STAR_TYPE_CODES, STAR_TYPE_NAMES, DisjointSet, LaneIndex,
+                               PointGrid, delaunay_edges, generate_segment, iter_segments, reconnect_components,
+                               select_lanes)
+from GalaxyData import GalaxyData, load_galaxy, save_galaxy
+from GalaxyFormat import name_space_size, star_name
+from GalaxyTelemetry import NO_TELEMETRY
+
+logger = logging.getLogger(__name__)
+
+# Regenerates chosen segments of an existing galaxy without touching the
+# rest of it. The stars in the segments are re-rolled (or kept, with new
+# stars added among them) and every lane touching them is rebuilt from a
+# triangulation of the segments plus a halo ring of neighbouring stars:
+#
+#   1. lanes are picked with select_lanes, with the halo stars' caps reduced
+#      by the lanes they keep
+#   2. the post_process_galaxy rule is applied to the new lanes only: lanes
+#      on a spanning tree of the local graph stay, the others only if they
+#      cross few enough lanes, the halo's lanes included
+#   3. connectivity is repaired locally: halo stars that are still part of
+#      the main component once the region is taken out count as connected,
+#      and stray components are bridged to them by reconnect_components
+#
+# The work done grows with the stars around the edit rather than with the
+# galaxy: a RegionIndex finds them and their lanes through the segment grid,
+# and the main component is found by searching outward from the halo only
+# as far as it takes (see main_halo_stars). Building the index reads the
+# whole galaxy, so pass one in when making several edits to the same galaxy.
+#
+# Star ids outside the region stay the same. Removed stars' ids are reused
+# for the new stars; if fewer stars come back, stars from the end of the
+# arrays move into the leftover ids. The delta lists, in the order a client
+# applies them: lanes removed and stars removed (old ids), stars moved
+# (old id -> new id), then stars and lanes added and the lane counts of the
+# stars around the edit (new ids).
+
+DEFAULT_HALO = 1
+MAX_INTERSECTIONS = 3
+DELTA_VERSION = 1
+
+
+def segment_layout(map_size=None):
+    # {(row, col): (x, y, width, height)} for the ROW_SEGMENTS layout
+    return {(row, col): (x, y, w, h) for row, col, x, y, w, h, _ in iter_segments(ROW_SEGMENTS, 0, map_size)}
+
+
+def in_rects(positions, rects):
+    # Mask of the positions inside any (x, y, width, height) rectangle. The
+    # right and bottom edges are left out so a star sits in one segment only.
+    inside = np.zeros(len(positions), dtype=bool)
+    for x, y, w, h in rects:
+        inside |= ((positions[:, 0] >= x) & (positions[:, 0] < x + w) &
+                   (positions[:, 1] >= y) & (positions[:, 1] < y + h))
+    return inside
+
+
+class RegionIndex:
+    # Star ids bucketed by the cells of the segment grid, which line up with
+    # the segments of every row, and the lanes of each star
+    def __init__(self, galaxy, map_size=None):
+        galaxy = GalaxyData.from_mapping(galaxy)
+        self.edges = galaxy.edges
+        _, _, self.cell_width, self.cell_height = next(iter(segment_layout(map_size).values()))
+        keys = self._keys(*self._cells(np.asarray(galaxy.positions)))
+        self.star_order = np.argsort(keys, kind='stable')
+        self.star_keys = keys[self.star_order]
+
+        ends = np.asarray(galaxy.edges, dtype=np.int64).ravel()
+        self.lane_order = np.argsort(ends, kind='stable')
+        self.lane_starts = np.searchsorted(ends[self.lane_order], np.arange(galaxy.star_count + 1))
+        self.lane_order //= 2
+
+    def _cells(self, positions):
+        return (np.floor(positions[:, 0] / self.cell_width).astype(np.int64),
+                np.floor(positions[:, 1] / self.cell_height).astype(np.int64))
+
+    @staticmethod
+    def _keys(gx, gy):
+        return (gx << 32) + gy
+
+    def stars_near(self, rects, cells=1):
+        # Ids of the stars in the rectangles' cells and cells more around them
+        keys = []
+        for x, y, w, h in rects:
+            (x0, x1), (y0, y1) = self._cells(np.array([[x, y], [x + w, y + h]]))
+            gx, gy = np.meshgrid(np.arange(x0 - cells, x1 + cells + 1), np.arange(y0 - cells, y1 + cells + 1))
+            keys.append(self._keys(gx.ravel(), gy.ravel()))
+        keys = np.unique(np.concatenate(keys)) if keys else np.zeros(0, dtype=np.int64)
+        starts = np.searchsorted(self.star_keys, keys)
+        ends = np.searchsorted(self.star_keys, keys, side='right')
+        return np.sort(self.star_order[gather_ranges(starts, ends)])
+
+    def lanes_of(self, stars):
+        # Ids of the lanes touching any of the stars
+        return np.unique(self.lane_order[gather_ranges(self.lane_starts[stars], self.lane_starts[stars + 1])])
+
+    def neighbours(self, stars):
+        # (star, star at the other end) for every lane of the stars
+        starts, ends = self.lane_starts[stars], self.lane_starts[stars + 1]
+        lanes = self.lane_order[gather_ranges(starts, ends)]
+        stars = np.repeat(stars, ends - starts)
+        return stars, np.asarray(self.edges[lanes], dtype=np.int64).reshape(-1, 2).sum(axis=1) - stars
+
+
+def gather_ranges(starts, ends):
+    # Concatenation of arange(start, end) over the pairs
+    counts = ends - starts
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    return np.arange(int(counts.sum())) + offsets
+
+
+def main_halo_stars(index, halo_ids, region_ids, inner_lanes):
+    # Halo stars in the main component of the galaxy without the region's
+    # lanes. Every star beyond the halo reaches it without crossing the
+    # region, so each component holds halo stars. A search goes outward from
+    # each component of the halo at once, and searches that meet are merged,
+    # until at most one is still going: the others ran out, so they are parts
+    # of the galaxy that the region alone held on. The one left is the main
+    # component, or the one that reached most stars if every search ran out.
+    if not len(halo_ids):
+        return halo_ids
+    inner = np.searchsorted(halo_ids, inner_lanes).reshape(-1, 2)
+    count, labels = scipy.sparse.csgraph.connected_components(
+        scipy.sparse.csr_matrix((np.ones(len(inner)), (inner[:, 0], inner[:, 1])), shape=(len(halo_ids),) * 2),
+        directed=False)
+    components = DisjointSet(count)
+    label_of = dict(zip(halo_ids.tolist(), labels.tolist()))
+    blocked = set(region_ids.tolist())
+    frontier = halo_ids
+    going = set()
+    while len(frontier):
+        reached = []
+        for star, other in zip(*[a.tolist() for a in index.neighbours(frontier)]):
+            if other in blocked:
+                continue
+            label, other_label = label_of[star], label_of.get(other)
+            if other_label is None:
+                label_of[other] = label
+                reached.append(other)
+            elif other_label != label:
+                components.union(label, other_label)
+        frontier = np.array(reached, dtype=np.int64)
+        going = {components.find(label_of[s]) for s in reached}
+        if len(going) <= 1:
+            break
+    if going:
+        main = going.pop()
+    else:
+        main = np.bincount([components.find(label) for label in label_of.values()]).argmax()
+    return halo_ids[[components.find(label) == main for label in labels.tolist()]]
+
+
+def prune_lanes(positions, fixed, lanes, outside_lanes=(), max_intersections=MAX_INTERSECTIONS):
+    # post_process_galaxy's rule for new lanes among fixed ones: a new lane
+    # on the minimum spanning tree of both stays, any other new lane only if
+    # it crosses at most max_intersections lanes. outside_lanes are extra
+    # lanes, as coordinate pairs, that only take part in the crossing test.
+    # Returns the kept lanes and the number of intersection tests made.
+    n = len(positions)
+    both = np.sort(np.concatenate([fixed, lanes]), axis=1)
+    weights = np.hypot(*(positions[both[:, 0]] - positions[both[:, 1]]).T)
+    mst = scipy.sparse.csgraph.minimum_spanning_tree(
+        scipy.sparse.csr_matrix((weights, (both[:, 0], both[:, 1])), shape=(n, n))).tocoo()
+    keys = both[len(fixed):, 0] * n + both[len(fixed):, 1]
+    in_tree = np.isin(keys, np.minimum(mst.row, mst.col).astype(np.int64) * n + np.maximum(mst.row, mst.col))
+
+    def lane(i, j):
+        return (tuple(positions[i].tolist()), tuple(positions[j].tolist()))
+
+    # Only lanes overlapping the box around the tested lanes can cross one
+    tested = positions[lanes[~in_tree]].reshape(-1, 2)
+    low, high = (tested.min(axis=0), tested.max(axis=0)) if len(tested) else (np.inf, -np.inf)
+
+    def near(coords):
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2, 2)
+        return np.all(coords.min(axis=1) <= high, axis=1) & np.all(coords.max(axis=1) >= low, axis=1)
+
+    outside_lanes = list(outside_lanes)
+    fixed = fixed[near(positions[fixed])]
+    tree_lanes = lanes[in_tree][near(positions[lanes[in_tree]])]
+    lane_index = LaneIndex([l for l, keep in zip(outside_lanes, near(outside_lanes).tolist()) if keep] +
+                           [lane(i, j) for i, j in fixed.tolist()] + [lane(i, j) for i, j in tree_lanes.tolist()])
+    keep = in_tree.copy()
+    for k in np.flatnonzero(~in_tree).tolist():
+        new_lane = lane(*lanes[k])
+        if lane_index.count_intersections(new_lane, max_intersections) <= max_intersections:
+            keep[k] = True
+            lane_index.add(new_lane)
+    return lanes[keep], lane_index.tests
+
+
+def fresh_name_codes(existing, count, rng):
+    # count name codes not in existing, from a name space wide enough for both
+    space = name_space_size(len(existing) + count)
+    codes = np.zeros(0, dtype=np.int64)
+    while len(codes) < count:
+        draw = rng.choice(space, min(space, 2 * count + 16), replace=False)
+        draw = draw[~np.isin(draw, existing) & ~np.isin(draw, codes)]
+        codes = np.concatenate([codes, draw[:count - len(codes)]])
+    return codes
+
+
+def regenerate_region(galaxy, segments, halo=DEFAULT_HALO, stars=None, keep_stars=False, seed=None, map_size=None,
+                      max_intersections=MAX_INTERSECTIONS, telemetry=NO_TELEMETRY, index=None):
+    # Returns the edited GalaxyData and the delta. segments are (row, col)
+    # pairs of the ROW_SEGMENTS layout; halo is the width of the ring around
+    # them in segments. stars is how many stars to place in each segment;
+    # by default a re-rolled segment gets as many as it had and a kept one
+    # gets none. map_size must match the one the galaxy was generated with.
+    # index is a RegionIndex of galaxy for the same map_size, built if not
+    # given.
+    galaxy = GalaxyData.from_mapping(galaxy)
+    layout = segment_layout(map_size)
+    segments = sorted({(int(row), int(col)) for row, col in segments})
+    missing = [s for s in segments if s not in layout]
+    if missing:
+        raise ValueError(f"no segment(s) {missing} in the ROW_SEGMENTS layout")
+    if seed is not None:
+        random.seed(seed)
+    rng = np.random.default_rng(random.getrandbits(64))
+
+    n = galaxy.star_count
+    positions = galaxy.positions
+    rects = [layout[s] for s in segments]
+
+    if index is None:
+        with telemetry.stage('index'):
+            index = RegionIndex(galaxy, map_size)
+
+    with telemetry.stage('select_region'):
+        # The cells one past the halo catch stars the grid rounds across
+        halo_rects = [(x - halo * w, y - halo * h, w * (1 + 2 * halo), h * (1 + 2 * halo)) for x, y, w, h in rects]
+        near = index.stars_near(rects, halo + 1)
+        near_positions = positions[near]
+        in_region = in_rects(near_positions, rects)
+        region_ids = near[in_region]
+        edges = galaxy.edges
+        removed_lane_ids = index.lanes_of(region_ids)
+        removed_lanes = np.asarray(edges[removed_lane_ids], dtype=np.int64).reshape(-1, 2)
+
+        # Stars beyond the ring that lose a lane into the region join the halo
+        halo_ids = np.union1d(near[in_rects(near_positions, halo_rects) & ~in_region], removed_lanes.ravel())
+        halo_ids = np.setdiff1d(halo_ids, region_ids)
+        kept_ids = region_ids if keep_stars else np.zeros(0, dtype=np.int64)
+        halo_lanes = np.asarray(edges[np.setdiff1d(index.lanes_of(halo_ids), removed_lane_ids)], dtype=np.int64)
+        halo_lanes = halo_lanes.reshape(-1, 2)
+        leaving = ~np.isin(halo_lanes, np.union1d(halo_ids, region_ids)).all(axis=1)
+
+        # Lanes through the region may have held the rest of the galaxy
+        # together, so only the halo stars in the main component left
+        # without the region count as connected
+        anchors = main_halo_stars(index, halo_ids, region_ids, halo_lanes[~leaving])
+
+    # Local numbering: halo stars, kept region stars, then new stars
+    local_ids = np.concatenate([halo_ids, kept_ids])
+    order = np.argsort(local_ids)
+
+    def to_local(ids):
+        return order[np.searchsorted(local_ids[order], ids)]
+
+    with telemetry.stage('placement'):
+        grid = PointGrid(MIN_STAR_DISTANCE, map(tuple, positions[local_ids].tolist()))
+        new_points, new_types = [], []
+        for x, y, w, h in rects:
+            if stars is not None:
+                count = stars
+            else:
+                count = 0 if keep_stars else int(in_rects(positions[region_ids], [(x, y, w, h)]).sum())
+            seed_points, star_types = generate_segment(x, y, w, h, count, [], grid, telemetry)
+            new_points.extend(seed_points)
+            new_types.extend(star_types)
+
+    local_positions = np.concatenate([positions[local_ids].astype(float), np.array(new_points, dtype=float).reshape(-1, 2)])
+    local_codes = np.concatenate([galaxy.type_codes[local_ids],
+                                  np.array([STAR_TYPE_CODES[t] for t in new_types], dtype=np.uint8)])
+    local_count = len(local_positions)
+    rebuilt = np.arange(local_count) >= len(halo_ids)
+
+    # Halo caps are what the halo stars have left after losing their lanes
+    # into the region
+    freed = np.bincount(to_local(removed_lanes[np.isin(removed_lanes, halo_ids)]), minlength=local_count)
+    degree = np.zeros(local_count, dtype=np.int64)
+    degree[:len(halo_ids)] = np.maximum(galaxy.degree[halo_ids].astype(np.int64) - freed[:len(halo_ids)], 0)
+    fixed = to_local(halo_lanes[~leaving]).reshape(-1, 2)
+    outside_lanes = [tuple(map(tuple, lane)) for lane in positions[halo_lanes[leaving]].astype(float).tolist()]
+
+    with telemetry.stage('triangulation'):
+        candidates = delaunay_edges(local_positions) if local_count > 3 else np.zeros((0, 2), dtype=np.int64)
+        candidates = candidates[rebuilt[candidates].any(axis=1)]
+    with telemetry.stage('lane_selection'):
+        new_lanes, degree = select_lanes(local_positions, local_codes, candidates, rng, degree)
+    telemetry.count('delaunay_edges', len(candidates))
+    telemetry.count('lanes_kept', len(new_lanes))
+
+    with telemetry.stage('prune'):
+        new_lanes, tests = prune_lanes(local_positions, fixed, new_lanes, outside_lanes, max_intersections)
+    telemetry.count('intersection_tests', tests)
+
+    with telemetry.stage('repair'):
+        local = GalaxyData(local_positions, local_codes, np.concatenate([fixed, new_lanes]), degree)
+        connected = reconnect_components(local, telemetry=telemetry, anchors=to_local(anchors) if len(anchors) else None)
+        new_lanes = np.concatenate([new_lanes, local.edges[len(fixed) + len(new_lanes):]])
+        survives = ~rebuilt | connected
+        new_lanes = new_lanes[survives[new_lanes].all(axis=1)]
+        degree = local.degree
+
+    # Ids for the surviving region stars: removed stars' ids first, then new
+    # ids past the end. Ids still free afterwards are filled from the end.
+    kept_count = len(halo_ids) + len(kept_ids)
+    removed_ids = np.sort(np.concatenate([np.setdiff1d(region_ids, kept_ids), kept_ids[~survives[len(halo_ids):kept_count]]]))
+    added = np.flatnonzero(survives[kept_count:]) + kept_count
+    extra = max(len(added) - len(removed_ids), 0)
+    global_ids = np.empty(local_count, dtype=np.int64)
+    global_ids[:kept_count] = local_ids
+    global_ids[added] = np.concatenate([removed_ids[:len(added)], np.arange(n, n + extra)])
+    holes = removed_ids[len(added):]
+    final_count = n + extra - len(holes)
+    targets = holes[holes < final_count]
+    movers = np.setdiff1d(np.arange(final_count, n), holes)
+    remap = np.arange(n + extra)
+    remap[movers] = targets
+
+    def rebuild(column, values):
+        out = np.concatenate([column, np.zeros((extra,) + column.shape[1:], dtype=column.dtype)])
+        out[global_ids[added]] = values
+        out[targets] = out[movers]
+        return out[:final_count]
+
+    touched = np.flatnonzero(survives)
+    out_degree = np.concatenate([galaxy.degree, np.zeros(extra, dtype=galaxy.degree.dtype)])
+    out_degree[global_ids[touched]] = np.minimum(degree[touched], np.iinfo(out_degree.dtype).max)
+    out_degree[targets] = out_degree[movers]
+    kept_lanes = np.delete(np.asarray(edges, dtype=np.int64).reshape(-1, 2), removed_lane_ids, axis=0)
+    out_edges = remap[np.concatenate([kept_lanes, global_ids[new_lanes]])]
+
+    name_codes, names = galaxy.name_codes, galaxy.names
+    if name_codes is not None:
+        fresh = fresh_name_codes(name_codes, len(added), rng)
+        name_codes = rebuild(np.asarray(name_codes), fresh.astype(name_codes.dtype))
+        added_names = [star_name(c) for c in fresh.tolist()]
+    elif names is not None:
+        taken = set(names)
+        codes = fresh_name_codes(np.zeros(0, dtype=np.int64), 2 * len(added) + 16, rng)
+        added_names = [name for name in map(star_name, codes.tolist()) if name not in taken][:len(added)]
+        names = list(names) + [None] * extra
+        for star_id, name in zip(global_ids[added].tolist(), added_names):
+            names[star_id] = name
+        for source, target in zip(movers.tolist(), targets.tolist()):
+            names[target] = names[source]
+        names = names[:final_count]
+    else:
+        added_names = [None] * len(added)
+
+    result = GalaxyData(rebuild(np.asarray(positions), local_positions[added].astype(positions.dtype)),
+                        rebuild(np.asarray(galaxy.type_codes), local_codes[added]), out_edges,
+                        out_degree[:final_count], name_codes, names)
+
+    new_ids = remap[global_ids]
+    lane_ends = new_ids[new_lanes]
+    delta = {
+        'version': DELTA_VERSION,
+        'segments': [list(s) for s in segments],
+        'star_count': final_count,
+        'removed_lanes': removed_lanes.tolist(),
+        'removed_stars': removed_ids.tolist(),
+        'moved_stars': np.column_stack([movers, targets]).tolist(),
+        'added_stars': [{'id': star_id, 'point': point, 'type': STAR_TYPE_NAMES[code], 'name': name}
+                        for star_id, point, code, name in zip(new_ids[added].tolist(), local_positions[added].tolist(),
+                                                              local_codes[added].tolist(), added_names)],
+        'added_lanes': [{'start_star': i, 'end_star': j, 'distance': d}
+                        for (i, j), d in zip(lane_ends.tolist(),
+                                             np.hypot(*(local_positions[new_lanes[:, 0]] - local_positions[new_lanes[:, 1]]).T).tolist())],
+        'connection_counts': dict(zip(map(str, new_ids[touched].tolist()), result.degree[new_ids[touched]].tolist())),
+    }
+    telemetry.count('stars_removed', len(removed_ids))
+    telemetry.count('stars_added', len(added))
+    return result, delta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerate segments of an existing galaxy.")
+    parser.add_argument('galaxy', help="galaxy file (.json or .gbin)")
+    parser.add_argument('--segment', type=int, nargs=2, action='append', required=True, metavar=('ROW', 'COL'),
+                        help="segment to regenerate; repeat for more")
+    parser.add_argument('--halo', type=int, default=DEFAULT_HALO, help="width of the ring of neighbouring segments")
+    parser.add_argument('--stars', type=int, help="stars to place in each segment (default: as many as it had)")
+    parser.add_argument('--keep-stars', action='store_true', help="keep the existing stars and add --stars more")
+    parser.add_argument('--seed', type=int, help="random seed for the new stars and lanes")
+    parser.add_argument('--map-size', type=float, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help="map size the galaxy was generated with (default: the generator's default)")
+    parser.add_argument('--output', help="where to write the edited galaxy (default: overwrite the input)")
+    parser.add_argument('--delta', help="also write the changes to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    galaxy, delta = regenerate_region(load_galaxy(args.galaxy), args.segment, args.halo, args.stars, args.keep_stars, args.seed,
+                                      tuple(args.map_size) if args.map_size else None)
+    save_galaxy(galaxy, args.output or args.galaxy)
+    if args.delta:
+        with open(args.delta, 'w') as f:
+            json.dump(delta, f)
+    logger.info("Removed %d stars and %d lanes, added %d stars and %d lanes; %d stars in total",
+                len(delta['removed_stars']), len(delta['removed_lanes']), len(delta['added_stars']),
+                len(delta['added_lanes']), galaxy.star_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+import itertools
+import time
+
+import numpy as np
+import pygame
+from scipy.spatial import cKDTree
+
+from GalaxyExport import galaxy_arrays
+from GalaxyFormat import STAR_TYPE_NAMES
+
+# Rendering helpers shared by the pygame viewers.
+
+# Cell size of the viewer's spatial index, the same as the background grid
+VIEW_CELL_SIZE = 100
+
+# Extra screen margin in pixels when culling, so stars on the edge still draw
+VIEW_MARGIN = 12
+
+
+def camera_rect(camera_x, camera_y, zoom, screen_width, screen_height, margin=VIEW_MARGIN, left=0, top=0):
+    # World rectangle seen through a screen rectangle; screen = (world + camera) * zoom
+    return ((left - margin) / zoom - camera_x, (top - margin) / zoom - camera_y,
+            (left + screen_width + margin) / zoom - camera_x, (top + screen_height + margin) / zoom - camera_y)
+
+
+def _cell_csr(cell_ids, n_cells):
+    # Items sorted by cell plus start offsets, so a run of neighbouring cells
+    # in one grid row is a single slice
+    order = np.argsort(cell_ids, kind='stable')
+    starts = np.zeros(n_cells + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell_ids, minlength=n_cells), out=starts[1:])
+    return order, starts
+
+
+class ViewIndex:
+    # Static uniform grid over stars and lanes. Stars are bucketed by the
+    # cell they sit in, lanes by every cell their bounding box touches, so a
+    # camera rectangle maps to a few grid rows of contiguous slices.
+    def __init__(self, positions, edges, cell_size=VIEW_CELL_SIZE):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.cell_size = cell_size
+        self.origin = positions.min(axis=0) if len(positions) else np.zeros(2)
+
+        star_cells = self._cells(positions)
+        self.shape = tuple((star_cells.max(axis=0) + 1).tolist()) if len(positions) else (1, 1)
+        nx, ny = self.shape
+        self.star_order, self.star_starts = _cell_csr(star_cells[:, 1] * nx + star_cells[:, 0], nx * ny)
+
+        lo = np.minimum(star_cells[edges[:, 0]], star_cells[edges[:, 1]])
+        hi = np.maximum(star_cells[edges[:, 0]], star_cells[edges[:, 1]])
+        span = hi - lo + 1
+        counts = span[:, 0] * span[:, 1]
+        lane_ids = np.repeat(np.arange(len(edges)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        span_x = np.repeat(span[:, 0], counts)
+        cx = np.repeat(lo[:, 0], counts) + offset % span_x
+        cy = np.repeat(lo[:, 1], counts) + offset // span_x
+        order, self.lane_starts = _cell_csr(cy * nx + cx, nx * ny)
+        self.lane_entries = lane_ids[order]
+
+    @classmethod
+    def from_galaxy(cls, galaxy_data, cell_size=VIEW_CELL_SIZE):
+        positions, _, edges, _ = galaxy_arrays(galaxy_data)
+        return cls(positions, edges, cell_size)
+
+    def _cells(self, positions):
+        return np.floor((positions - self.origin) / self.cell_size).astype(np.int64)
+
+    def _row_slices(self, x0, y0, x1, y1):
+        nx, ny = self.shape
+        (cx0, cy0), (cx1, cy1) = self._cells(np.array([[x0, y0], [x1, y1]]))
+        cx0, cx1 = max(cx0, 0), min(cx1, nx - 1)
+        cy0, cy1 = max(cy0, 0), min(cy1, ny - 1)
+        if cx0 > cx1 or cy0 > cy1:
+            return
+        for cy in range(cy0, cy1 + 1):
+            yield cy * nx + cx0, cy * nx + cx1 + 1
+
+    def query(self, x0, y0, x1, y1):
+        # Indices of stars and lanes in the cells overlapping a world rectangle
+        slices = list(self._row_slices(x0, y0, x1, y1))
+        empty = np.zeros(0, dtype=np.int64)
+        stars = [self.star_order[self.star_starts[a]:self.star_starts[b]] for a, b in slices]
+        lanes = [self.lane_entries[self.lane_starts[a]:self.lane_starts[b]] for a, b in slices]
+        stars = np.concatenate(stars) if stars else empty
+        lanes = np.unique(np.concatenate(lanes)) if lanes else empty
+        return stars, lanes
+
+    def visible(self, camera_x, camera_y, zoom, screen_width, screen_height):
+        return self.query(*camera_rect(camera_x, camera_y, zoom, screen_width, screen_height))
+
+
+LANE_COLOR = (50, 50, 50)
+
+
+def world_to_screen(positions, camera_x, camera_y, zoom):
+    # Vectorized form of int((p + camera) * zoom) for an (n, 2) array. Floors
+    # rather than truncates so off-screen lane ends land on the same pixels
+    # however the camera has been scrolled.
+    return np.floor((positions + (camera_x, camera_y)) * zoom).astype(np.int64)
+
+
+def make_star_sprite(color, size):
+    # Pre-rendered circle matching pygame.draw.circle(surface, color, centre, size)
+    sprite = pygame.Surface((2 * size + 1, 2 * size + 1))
+    sprite.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+    pygame.draw.circle(sprite, color, (size, size), size)
+    return sprite
+
+
+def clip_segments(starts, ends, rect):
+    # Liang-Barsky over all segments at once: the parameter range [t0, t1]
+    # of each segment inside rect (left, top, right, bottom), and a mask of
+    # the segments that reach it at all
+    left, top, right, bottom = rect
+    delta = (ends - starts).astype(float)
+    t0 = np.zeros(len(starts))
+    t1 = np.ones(len(starts))
+    visible = np.ones(len(starts), dtype=bool)
+    for p, q in ((-delta[:, 0], starts[:, 0] - left), (delta[:, 0], right - starts[:, 0]),
+                 (-delta[:, 1], starts[:, 1] - top), (delta[:, 1], bottom - starts[:, 1])):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = q / p
+        visible &= (p != 0) | (q >= 0)
+        t0 = np.where(p < 0, np.maximum(t0, ratio), t0)
+        t1 = np.where(p > 0, np.minimum(t1, ratio), t1)
+    return t0, t1, visible & (t0 <= t1)
+
+
+def draw_lines(surface, starts, ends, color):
+    # Draw many 1px segments at once by sampling every segment once per
+    # pixel step and writing the samples straight into the pixel array. Only
+    # the steps inside the clip rect are sampled, at the same positions as
+    # for the whole segment, so the cost follows the visible length and a
+    # lane drawn in strips joins up exactly.
+    if not len(starts):
+        return
+    clip = surface.get_clip()
+    # A sample at x lands on pixel floor(x + 0.5); one pixel of slack keeps
+    # the rounding at the edges, and the mask below drops the extra samples
+    t0, t1, visible = clip_segments(starts, ends, (clip.left - 1, clip.top - 1, clip.right, clip.bottom))
+    starts, ends, t0, t1 = starts[visible], ends[visible], t0[visible], t1[visible]
+    if not len(starts):
+        return
+    if surface.get_bytesize() not in (1, 2, 4):
+        delta = ends - starts
+        for p1, p2 in zip((starts + delta * t0[:, None]).tolist(), (starts + delta * t1[:, None]).tolist()):
+            pygame.draw.line(surface, color, p1, p2, 1)
+        return
+
+    delta = ends - starts
+    intervals = np.maximum(np.abs(delta).max(axis=1), 1)
+    first = np.ceil(t0 * intervals).astype(np.int64)
+    steps = np.maximum(np.floor(t1 * intervals).astype(np.int64) - first + 1, 0)
+    seg = np.repeat(np.arange(len(starts)), steps)
+    k = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps) + first[seg]
+    t = k / intervals[seg]
+    xs = np.floor(starts[seg, 0] + delta[seg, 0] * t + 0.5).astype(np.int64)
+    ys = np.floor(starts[seg, 1] + delta[seg, 1] * t + 0.5).astype(np.int64)
+
+    inside = (xs >= clip.left) & (xs < clip.right) & (ys >= clip.top) & (ys < clip.bottom)
+    pixels = pygame.surfarray.pixels2d(surface)
+    pixels[xs[inside], ys[inside]] = surface.map_rgb(color)
+    del pixels
+
+
+# Once stars would get fewer than this many screen pixels each, the viewer
+# draws a density map instead of individual stars and lanes
+LOD_PIXELS_PER_STAR = 8
+
+# Density cells are never drawn narrower than this many pixels
+LOD_CELL_PIXELS = 2
+
+
+class DensityPyramid:
+    # Zoomed-out stand-in for the stars: per-cell star counts on grids that
+    # halve in resolution level by level, built once at load time. Every
+    # level keeps one colour per cell, the colour of the cell's most common
+    # star type brightened by its log star count, so drawing is one lookup
+    # per screen pixel whatever the galaxy size.
+    def __init__(self, positions, type_codes, colors):
+        n_types = len(colors)
+        self.origin = positions.min(axis=0) if len(positions) else np.zeros(2)
+
+        # Screen area per star is judged on the occupied part of the map, so
+        # the empty space around the arms does not dilute the density
+        occupied_cell = VIEW_CELL_SIZE / 4
+        occupied = np.unique(np.floor((positions - self.origin) / occupied_cell).astype(np.int64), axis=0)
+        star_area = len(occupied) * occupied_cell ** 2 / max(len(positions), 1)
+        self.lod_zoom = np.sqrt(LOD_PIXELS_PER_STAR / star_area) if len(positions) else 0.0
+
+        cell = LOD_CELL_PIXELS / self.lod_zoom if self.lod_zoom else VIEW_CELL_SIZE
+        cells = np.floor((positions - self.origin) / cell).astype(np.int64)
+        shape = tuple(cells.max(axis=0) + 1) if len(cells) else (1, 1)
+        flat = (type_codes.astype(np.int64) * shape[0] + cells[:, 0]) * shape[1] + cells[:, 1]
+        counts = np.bincount(flat, minlength=n_types * shape[0] * shape[1]).reshape(n_types, *shape)
+
+        palette = np.array(colors, dtype=np.float64)
+        self.levels = []
+        while True:
+            self.levels.append((cell, self._colorize(counts, palette)))
+            if max(counts.shape[1:]) <= 1:
+                break
+            pad = [(0, 0)] + [(0, size % 2) for size in counts.shape[1:]]
+            counts = np.pad(counts, pad)
+            counts = counts.reshape(n_types, counts.shape[1] // 2, 2, counts.shape[2] // 2, 2).sum(axis=(2, 4))
+            cell *= 2
+
+    @staticmethod
+    def _colorize(counts, palette):
+        total = counts.sum(axis=0)
+        brightness = np.log1p(total) / np.log1p(max(total.max(), 1))
+        brightness = np.where(total > 0, 0.3 + 0.7 * brightness, 0)
+        return (palette[counts.argmax(axis=0)] * brightness[..., None]).astype(np.uint8)
+
+    def level(self, zoom):
+        # Finest level whose cells are at least LOD_CELL_PIXELS wide on screen
+        for cell, rgb in self.levels:
+            if cell * zoom >= LOD_CELL_PIXELS:
+                return cell, rgb
+        return self.levels[-1]
+
+    def draw(self, surface, camera_x, camera_y, zoom, rect):
+        # Each pixel takes the colour of the cell under its centre; empty
+        # cells stay transparent so the background grid shows through
+        cell, rgb = self.level(zoom)
+        ix = np.floor(((np.arange(rect.left, rect.right) + 0.5) / zoom - camera_x - self.origin[0]) / cell).astype(np.int64)
+        iy = np.floor(((np.arange(rect.top, rect.bottom) + 0.5) / zoom - camera_y - self.origin[1]) / cell).astype(np.int64)
+        in_x = (ix >= 0) & (ix < rgb.shape[0])
+        in_y = (iy >= 0) & (iy < rgb.shape[1])
+        block = np.zeros((rect.width, rect.height, 3), dtype=np.uint8)
+        block[np.ix_(in_x, in_y)] = rgb[np.ix_(ix[in_x], iy[in_y])]
+        density = pygame.surfarray.make_surface(block)
+        density.set_colorkey((0, 0, 0))
+        surface.blit(density, rect.topleft)
+
+
+class GalaxyRenderer:
+    # Draws the visible part of a galaxy for a camera: one vectorized
+    # transform for all visible stars and lanes, lanes rasterized in bulk and
+    # one pre-rendered sprite per star type blitted with Surface.blits.
+    # Zoomed far enough out, a DensityPyramid is drawn instead.
+    def __init__(self, galaxy_data, star_types, lane_color=LANE_COLOR, view_index=None):
+        self.positions, self.type_codes, self.edges, _ = galaxy_arrays(galaxy_data)
+        self.view_index = view_index or ViewIndex(self.positions, self.edges)
+        self.lane_color = lane_color
+        self.styles = [star_types[name] for name in STAR_TYPE_NAMES]
+        self.star_sizes = np.array([style['size'] for style in self.styles])[self.type_codes]
+        self.sprites = None
+        self.pyramid = DensityPyramid(self.positions, self.type_codes, [style['color'] for style in self.styles])
+
+    def _sprites(self):
+        if self.sprites is None:
+            self.sprites = [make_star_sprite(style['color'], style['size']) for style in self.styles]
+        return self.sprites
+
+    def draw_lanes(self, surface, lanes, camera_x, camera_y, zoom):
+        starts = world_to_screen(self.positions[self.edges[lanes, 0]], camera_x, camera_y, zoom)
+        ends = world_to_screen(self.positions[self.edges[lanes, 1]], camera_x, camera_y, zoom)
+        draw_lines(surface, starts, ends, self.lane_color)
+
+    def draw_stars(self, surface, stars, coords):
+        # Smallest types first so the big stars end up on top
+        codes = self.type_codes[stars]
+        sprites = self._sprites()
+        for code in range(len(self.styles) - 1, -1, -1):
+            size = self.styles[code]['size']
+            corners = (coords[codes == code] - size).tolist()
+            surface.blits(zip(itertools.repeat(sprites[code]), corners), doreturn=False)
+
+    def draw(self, surface, camera_x, camera_y, zoom, rect=None):
+        # Draws what falls inside rect (default: the whole surface) and
+        # returns the star indices drawn and their screen coordinates
+        rect = rect or surface.get_rect()
+        if zoom < self.pyramid.lod_zoom:
+            self.pyramid.draw(surface, camera_x, camera_y, zoom, rect)
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 2), dtype=np.int64)
+        stars, lanes = self.view_index.query(*camera_rect(camera_x, camera_y, zoom, rect.width, rect.height, left=rect.left, top=rect.top))
+        coords = world_to_screen(self.positions[stars], camera_x, camera_y, zoom)
+        self.draw_lanes(surface, lanes, camera_x, camera_y, zoom)
+        self.draw_stars(surface, stars, coords)
+        return stars, coords
+
+
+class StarPicker:
+    # Star lookups for the mouse: a k-d tree over world positions answers
+    # hover and click queries in O(log n) and rectangle queries for box
+    # selection, so the frame loop does no per-star work
+    def __init__(self, positions, type_codes, edges, names, pick_radius):
+        self.positions = positions
+        self.type_codes = type_codes
+        self.names = names
+        self.pick_radius = pick_radius
+        self.max_pick_radius = float(pick_radius.max(initial=0))
+        self.degree = np.bincount(edges.ravel(), minlength=len(positions))
+        self.tree = cKDTree(positions)
+
+    @classmethod
+    def for_renderer(cls, renderer, names):
+        # A star can be picked within twice its drawn size, in screen pixels
+        return cls(renderer.positions, renderer.type_codes, renderer.edges, names, renderer.star_sizes * 2)
+
+    def nearest(self, world_x, world_y, zoom):
+        # Index of the closest star whose pick radius covers the point, or None
+        candidates = np.array(self.tree.query_ball_point((world_x, world_y), self.max_pick_radius / zoom), dtype=np.int64)
+        if not len(candidates):
+            return None
+        distance = np.hypot(*(self.positions[candidates] - (world_x, world_y)).T) * zoom
+        hits = distance < self.pick_radius[candidates]
+        if not hits.any():
+            return None
+        return int(candidates[hits][np.argmin(distance[hits])])
+
+    def at_screen(self, screen_x, screen_y, camera_x, camera_y, zoom):
+        return self.nearest(screen_x / zoom - camera_x, screen_y / zoom - camera_y, zoom)
+
+    def in_box(self, x0, y0, x1, y1):
+        # Indices of the stars inside a world rectangle, in index order
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        centre = ((x0 + x1) / 2, (y0 + y1) / 2)
+        candidates = np.array(self.tree.query_ball_point(centre, max(x1 - x0, y1 - y0) / 2, p=np.inf), dtype=np.int64)
+        if not len(candidates):
+            return candidates
+        p = self.positions[candidates]
+        inside = (p[:, 0] >= x0) & (p[:, 0] <= x1) & (p[:, 1] >= y0) & (p[:, 1] <= y1)
+        return np.sort(candidates[inside])
+
+    def in_screen_box(self, start, end, camera_x, camera_y, zoom):
+        return self.in_box(start[0] / zoom - camera_x, start[1] / zoom - camera_y,
+                           end[0] / zoom - camera_x, end[1] / zoom - camera_y)
+
+    def info(self, index):
+        return {
+            'index': index,
+            'name': self.names[index],
+            'type': STAR_TYPE_NAMES[self.type_codes[index]],
+            'degree': int(self.degree[index])
+        }
+
+
+BACKGROUND_COLOR = (0, 0, 0)
+GRID_COLOR = (30, 30, 30)
+GRID_EXTENT = (2400, 1800)
+
+# Zoom animations snap to the target once this close (relative), so the
+# cached layer stops being invalidated by ever smaller zoom steps
+ZOOM_SNAP = 0.001
+
+
+def draw_grid(surface, camera_x, camera_y, zoom, grid_size=VIEW_CELL_SIZE, extent=GRID_EXTENT):
+    w, h = surface.get_size()
+    for x in range(0, extent[0], grid_size):
+        pygame.draw.line(surface, GRID_COLOR,
+                         (int((x + camera_x) * zoom), 0),
+                         (int((x + camera_x) * zoom), h))
+    for y in range(0, extent[1], grid_size):
+        pygame.draw.line(surface, GRID_COLOR,
+                         (0, int((y + camera_y) * zoom)),
+                         (w, int((y + camera_y) * zoom)))
+
+
+class StaticLayer:
+    # Offscreen copy of the background grid, lanes and stars for one zoom
+    # level. A pan scrolls the cached pixels and paints only the strips that
+    # scrolled into view; only a zoom change repaints the whole layer.
+    def __init__(self, renderer, size, grid_size=VIEW_CELL_SIZE, grid_extent=GRID_EXTENT):
+        self.renderer = renderer
+        self.surface = pygame.Surface(size)
+        self.grid_size = grid_size
+        self.grid_extent = grid_extent
+        self.zoom = None
+        self.camera = (0.0, 0.0)
+
+    def _paint(self, rect):
+        camera_x, camera_y = self.camera
+        self.surface.set_clip(rect)
+        self.surface.fill(BACKGROUND_COLOR, rect)
+        draw_grid(self.surface, camera_x, camera_y, self.zoom, self.grid_size, self.grid_extent)
+        self.renderer.draw(self.surface, camera_x, camera_y, self.zoom, rect)
+        self.surface.set_clip(None)
+
+    def update(self, camera_x, camera_y, zoom):
+        # Returns True if the layer's pixels changed
+        w, h = self.surface.get_size()
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.camera = (camera_x, camera_y)
+            self._paint(self.surface.get_rect())
+            return True
+
+        # Whole-pixel scroll; the cached camera moves by exactly that amount
+        dx = round((camera_x - self.camera[0]) * zoom)
+        dy = round((camera_y - self.camera[1]) * zoom)
+        if dx == 0 and dy == 0:
+            return False
+        self.camera = (self.camera[0] + dx / zoom, self.camera[1] + dy / zoom)
+
+        if abs(dx) >= w or abs(dy) >= h:
+            self._paint(self.surface.get_rect())
+            return True
+
+        self.surface.scroll(dx, dy)
+        if dx > 0:
+            self._paint(pygame.Rect(0, 0, dx, h))
+        elif dx < 0:
+            self._paint(pygame.Rect(w + dx, 0, -dx, h))
+        if dy > 0:
+            self._paint(pygame.Rect(0, 0, w, dy))
+        elif dy < 0:
+            self._paint(pygame.Rect(0, h + dy, w, -dy))
+        return True
+
+
+class LayeredView:
+    # Puts a StaticLayer on screen under a per-frame overlay. While the layer
+    # is unchanged, a frame only restores the previous overlay rectangles from
+    # the layer and pushes the old and new overlay rectangles to the display.
+    # While the zoom is still changing the cached layer is shown scaled to the
+    # new zoom; it is repainted once the zoom holds still for a frame.
+    def __init__(self, screen, layer):
+        self.screen = screen
+        self.layer = layer
+        self.overlay_rects = []
+        self.full_redraw = True
+        self.last_zoom = None
+
+    def begin_frame(self, camera_x, camera_y, zoom):
+        zooming = self.layer.zoom is not None and zoom != self.layer.zoom and zoom != self.last_zoom
+        self.last_zoom = zoom
+        if zooming:
+            self.draw_scaled(camera_x, camera_y, zoom)
+            self.full_redraw = True
+        elif self.layer.update(camera_x, camera_y, zoom) or self.full_redraw:
+            self.screen.blit(self.layer.surface, (0, 0))
+            self.full_redraw = True
+        else:
+            for rect in self.overlay_rects:
+                self.screen.blit(self.layer.surface, rect, rect)
+
+    def draw_scaled(self, camera_x, camera_y, zoom):
+        # Screen x = layer x * scale + left, from (world + camera) * zoom for
+        # both cameras; only the part of the layer that lands on screen is
+        # scaled
+        layer = self.layer
+        scale = zoom / layer.zoom
+        left = (camera_x - layer.camera[0]) * zoom
+        top = (camera_y - layer.camera[1]) * zoom
+        screen_w, screen_h = self.screen.get_size()
+        x0, y0 = int(np.floor(-left / scale)), int(np.floor(-top / scale))
+        source = pygame.Rect(x0, y0, int(np.ceil(screen_w / scale)) + 1, int(np.ceil(screen_h / scale)) + 1)
+        source = source.clip(layer.surface.get_rect())
+        self.screen.fill(BACKGROUND_COLOR)
+        if source.width and source.height:
+            size = (max(round(source.width * scale), 1), max(round(source.height * scale), 1))
+            scaled = pygame.transform.scale(layer.surface.subsurface(source), size)
+            self.screen.blit(scaled, (round(left + source.x * scale), round(top + source.y * scale)))
+
+    def end_frame(self, overlay_rects):
+        if self.full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.overlay_rects + overlay_rects)
+        self.overlay_rects = overlay_rects
+        self.full_redraw = False
+
+
+# Weight of the newest frame in the frame-time averages
+FRAME_TIME_SMOOTHING = 0.1
+
+
+class FrameTimer:
+    # Smoothed time spent in each phase of a frame (event handling, drawing,
+    # pushing to the display) for the viewers' frame-time overlay. Call
+    # start() once, then mark(phase) as each phase ends; time between the
+    # last mark and start() of the next frame, such as the clock tick, is
+    # not counted.
+    def __init__(self, smoothing=FRAME_TIME_SMOOTHING):
+        self.smoothing = smoothing
+        self.averages = {}
+        self.last = None
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        elapsed = now - self.last
+        previous = self.averages.get(phase)
+        self.averages[phase] = elapsed if previous is None else previous + (elapsed - previous) * self.smoothing
+        self.last = now
+
+    def lines(self):
+        lines = [f"{phase}: {seconds * 1000:.1f} ms" for phase, seconds in self.averages.items()]
+        return lines + [f"frame: {sum(self.averages.values()) * 1000:.1f} ms"]
+
+    def draw(self, surface, font, right, top, color):
+        # Right-aligned text lines; returns the rectangles drawn
+        rects = []
+        for line in self.lines():
+            text = font.render(line, True, color)
+            rects.append(surface.blit(text, (right - text.get_width(), top)))
+            top += text.get_height() + 2
+        return rects
@@ -0,0 +1,277 @@
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+from GalaxyExport import galaxy_arrays, read_galaxy
+from GalaxyFormat import read_arrays, write_arrays
+
+logger = logging.getLogger(__name__)
+
+# Route queries over the lane graph. Stars are nodes, lane_details entries
+# are undirected edges weighted by their distance. Point-to-point routes use
+# A* with the larger of the straight-line distance and, when an index has
+# been built, the ALT landmark bound (triangle inequality against a few
+# precomputed shortest-path trees). Many-to-many queries go to scipy's
+# Dijkstra in one call.
+#
+# A* runs as scipy's Dijkstra over the reduced lane weights
+# w(u, v) - h(u) + h(v), h being the bound to the target for every star,
+# worked out in one vectorized pass. A path's reduced length is its length
+# less h(source), so the search settles stars in A* order, in compiled code.
+# It is cut off at a reduced distance that grows ROUTE_LIMIT_GROWTH times
+# until the target is reached, or at most at the ALT upper bound when there
+# are landmarks.
+
+ROUTE_INDEX_EXTENSION = '.alt'
+DEFAULT_LANDMARKS = 16
+
+# Landmark distances are stored as float32, each rounded by up to half an
+# epsilon of the largest distance. The bound subtracts this many epsilons of
+# the largest distance, more than the error of a difference of two of them,
+# so it stays a lower bound however large and close the two distances are.
+LANDMARK_ERROR_EPSILONS = 4
+
+# Lane distances are float32 too, each up to half an epsilon short of the
+# straight line between its stars, so the straight-line bound is scaled
+# down by a whole epsilon to stay below any path's summed lane distances.
+# Positions are float32 as well; each end of the straight line may have
+# moved by half an epsilon of the largest coordinate in x and y, so the
+# bound also subtracts this many epsilons of it.
+STRAIGHT_LINE_SCALE = 1 - float(np.finfo(np.float32).eps)
+POSITION_ERROR_EPSILONS = 4
+
+# First reduced-distance cutoff of a route search, in mean lane lengths,
+# and how much it grows while the target is not reached. With landmarks the
+# reduced distance is mostly under ROUTE_LIMIT_LANES lanes; without them it
+# is a good part of the straight line, and the failed searches before the
+# last cost less than the last one does.
+ROUTE_LIMIT_LANES = 16
+ROUTE_LIMIT_GROWTH = 2
+
+
+def route_index_filename(galaxy_filename):
+    # The landmark index lives next to the galaxy: galaxy.json -> galaxy.alt
+    return os.path.splitext(galaxy_filename)[0] + ROUTE_INDEX_EXTENSION
+
+
+def lane_graph(star_count, edges, distances):
+    # Symmetric CSR adjacency; a lane listed twice is kept once
+    edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+    edges, first = np.unique(edges, axis=0, return_index=True)
+    weights = np.asarray(distances, dtype=float)[first]
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    return scipy.sparse.csr_matrix((np.concatenate([weights, weights]), (rows, cols)), shape=(star_count, star_count))
+
+
+class RouteEngine:
+    def __init__(self, positions, edges, distances, landmarks=None, landmark_distances=None):
+        self.positions = np.asarray(positions, dtype=float)
+        self.graph = lane_graph(len(self.positions), edges, distances)
+        # Row of every CSR entry, for reweighting the lanes
+        self.rows = np.repeat(np.arange(len(self.positions)), np.diff(self.graph.indptr))
+        self.mean_weight = float(self.graph.data.mean()) if self.graph.nnz else 0.0
+        self.position_error = 0.0
+        if len(self.positions):
+            self.position_error = float(np.abs(self.positions).max()) * np.finfo(np.float32).eps * POSITION_ERROR_EPSILONS
+        self.component_count, self.labels = scipy.sparse.csgraph.connected_components(self.graph, directed=False)
+        self.set_landmarks(landmarks, landmark_distances)
+
+    @classmethod
+    def from_galaxy(cls, galaxy_data):
+        positions, _, edges, distances = galaxy_arrays(galaxy_data)
+        return cls(positions, edges, distances)
+
+    def heuristic(self, nodes, target):
+        # Lower bound on the lane distance from each node to target
+        return self._bound(nodes, *self._goal(target))
+
+    def bounds(self, target):
+        # heuristic for every star at once, the landmark bound one landmark
+        # at a time over the transposed table. The float32 differences are
+        # rounded by less than landmark_error covers.
+        delta = self.positions - self.positions[target]
+        bound = (np.hypot(delta[:, 0], delta[:, 1]) - self.position_error) * STRAIGHT_LINE_SCALE
+        if self.landmark_columns is not None:
+            alt = np.zeros(len(bound), dtype=np.float32)
+            difference = np.empty_like(alt)
+            for column in self.landmark_columns:
+                np.subtract(column, column[target], out=difference)
+                np.abs(difference, out=difference)
+                np.maximum(alt, difference, out=alt)
+            bound = np.maximum(bound, alt - self.landmark_error)
+        return np.maximum(bound, 0)
+
+    def upper_bound(self, source, target):
+        # Via the best landmark in their component, or inf without one
+        if self.landmark_distances is None:
+            return np.inf
+        same = self.labels[self.landmarks] == self.labels[source]
+        if not same.any():
+            return np.inf
+        via = self.landmark_distances[source, same].astype(float) + self.landmark_distances[target, same]
+        return float(via.min()) + self.landmark_error
+
+    def _goal(self, target):
+        if self.landmark_distances is None:
+            return self.positions[target], None
+        return self.positions[target], self.landmark_distances[target].astype(float)
+
+    def _bound(self, nodes, goal_position, goal_landmarks):
+        delta = self.positions[nodes] - goal_position
+        bound = (np.hypot(delta[:, 0], delta[:, 1]) - self.position_error) * STRAIGHT_LINE_SCALE
+        if goal_landmarks is not None:
+            alt = np.abs(self.landmark_distances[nodes] - goal_landmarks).max(axis=1) - self.landmark_error
+            bound = np.maximum(bound, alt)
+        return np.maximum(bound, 0)
+
+    def route(self, source, target):
+        # A* from source to target. Returns (distance, [source, ..., target]),
+        # or (inf, []) when the stars are not connected.
+        if self.labels[source] != self.labels[target]:
+            return np.inf, []
+        if source == target:
+            return 0.0, [source]
+
+        bound = self.bounds(target)
+        # Rounding can leave a reduced weight a hair below zero
+        reduced = scipy.sparse.csr_matrix(
+            (np.maximum(self.graph.data - bound[self.rows] + bound[self.graph.indices], 0), self.graph.indices,
+             self.graph.indptr), shape=self.graph.shape)
+        slack = self.upper_bound(source, target) - bound[source]
+        limit = min(ROUTE_LIMIT_LANES * self.mean_weight, slack)
+        while True:
+            reduced_distance, predecessors = scipy.sparse.csgraph.dijkstra(
+                reduced, directed=True, indices=source, return_predecessors=True, limit=limit)
+            if np.isfinite(reduced_distance[target]):
+                break
+            limit = np.inf if limit >= slack else min(limit * ROUTE_LIMIT_GROWTH, slack)
+
+        path = [target]
+        while path[-1] != source:
+            path.append(int(predecessors[path[-1]]))
+        path.reverse()
+        distance = float(np.asarray(self.graph[path[:-1], path[1:]]).sum())
+        return distance, path
+
+    def routes_to(self, sources, target):
+        # Shortest routes from many sources to one target, read from the
+        # predecessors of a single Dijkstra out of target. The search stops
+        # at the furthest landmark upper bound of the sources. Returns a
+        # [source, ..., target] path per source, [] where there is none.
+        sources = np.atleast_1d(np.asarray(sources, dtype=np.int64))
+        connected = self.labels[sources] == self.labels[target]
+        limit = np.inf
+        if self.landmark_distances is not None and connected.any():
+            same = self.labels[self.landmarks] == self.labels[target]
+            if same.any():
+                via = self.landmark_distances[sources[connected]][:, same].astype(float) + self.landmark_distances[target, same]
+                limit = float(via.min(axis=1).max()) + self.landmark_error
+        _, predecessors = scipy.sparse.csgraph.dijkstra(
+            self.graph, directed=False, indices=target, return_predecessors=True, limit=limit)
+
+        paths = []
+        for source, reached in zip(sources.tolist(), connected.tolist()):
+            path = [source] if reached else []
+            while path and path[-1] != target:
+                path.append(int(predecessors[path[-1]]))
+            paths.append(path)
+        return paths
+
+    def distances(self, sources, targets=None, limit=np.inf):
+        # Lane distances from every source to every target (all stars when
+        # targets is None) as a (len(sources), len(targets)) array; inf for
+        # unreachable pairs or pairs further apart than limit
+        table = scipy.sparse.csgraph.dijkstra(self.graph, directed=False, indices=np.atleast_1d(sources), limit=limit)
+        if targets is not None:
+            table = table[:, np.atleast_1d(targets)]
+        return table
+
+    def reachable(self, source, max_distance=np.inf):
+        # Stars reachable from source within max_distance, and their distances
+        table = self.distances([source], limit=max_distance)[0]
+        stars = np.flatnonzero(np.isfinite(table))
+        return stars, table[stars]
+
+    def build_landmarks(self, count=DEFAULT_LANDMARKS, seed=None):
+        # Farthest-point landmark selection: each new landmark is the star
+        # furthest from all landmarks chosen so far. Distances to stars in
+        # other components are stored as 0, which keeps the bound valid.
+        rng = np.random.default_rng(seed)
+        star_count = len(self.positions)
+        count = min(count, star_count)
+        landmarks = np.zeros(count, dtype=np.int64)
+        table = np.zeros((star_count, count), dtype=np.float32)
+        closest = self.distances([int(rng.integers(star_count))])[0]
+        for k in range(count):
+            landmarks[k] = int(np.argmax(np.where(np.isfinite(closest), closest, -1)))
+            distance = self.distances([landmarks[k]])[0]
+            table[:, k] = np.where(np.isfinite(distance), distance, 0)
+            closest = np.minimum(closest, distance) if k else distance
+        self.set_landmarks(landmarks, table)
+
+    def set_landmarks(self, landmarks, landmark_distances):
+        self.landmarks = landmarks
+        self.landmark_distances = landmark_distances
+        # One contiguous row per landmark, for bounds()
+        self.landmark_columns = None if landmark_distances is None else np.ascontiguousarray(landmark_distances.T)
+        self.landmark_error = 0.0
+        if landmark_distances is not None and landmark_distances.size:
+            self.landmark_error = (float(landmark_distances.max()) * np.finfo(np.float32).eps *
+                                   LANDMARK_ERROR_EPSILONS)
+
+    def save_landmarks(self, filename):
+        arrays = {'landmarks': self.landmarks, 'distances': self.landmark_distances}
+        write_arrays(filename, arrays, {'star_count': len(self.positions), 'lane_count': int(self.graph.nnz // 2)})
+
+    def load_landmarks(self, filename, mmap_mode='r'):
+        arrays, meta = read_arrays(filename, mmap_mode)
+        if meta.get('star_count') != len(self.positions) or meta.get('lane_count') != self.graph.nnz // 2:
+            raise ValueError(f"{filename} was built for a different galaxy")
+        # Plain ndarray views; indexing through np.memmap is much slower
+        self.set_landmarks(np.asarray(arrays['landmarks']), np.asarray(arrays['distances']))
+
+
+def load_route_engine(filename, galaxy_data=None):
+    # Route engine for a galaxy file, with its landmark index if one exists.
+    # Pass galaxy_data when the file has already been loaded.
+    engine = RouteEngine.from_galaxy(galaxy_data if galaxy_data is not None else read_galaxy(filename))
+    index_file = route_index_filename(filename)
+    if os.path.exists(index_file):
+        engine.load_landmarks(index_file)
+    return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a route index for a galaxy or query routes on it.")
+    parser.add_argument('galaxy', help="galaxy file (.json or .gbin)")
+    parser.add_argument('--landmarks', type=int, default=None,
+                        help=f"build and save an ALT index with this many landmarks (e.g. {DEFAULT_LANDMARKS})")
+    parser.add_argument('--seed', type=int, default=None, help="seed for the first landmark")
+    parser.add_argument('--route', type=int, nargs=2, metavar=('FROM', 'TO'), help="print the route between two stars")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    engine = load_route_engine(args.galaxy)
+
+    if args.landmarks:
+        start = time.time()
+        engine.build_landmarks(args.landmarks, args.seed)
+        engine.save_landmarks(route_index_filename(args.galaxy))
+        logger.info("Built %d landmarks in %.1fs: %s", len(engine.landmarks), time.time() - start,
+                    route_index_filename(args.galaxy))
+
+    if args.route:
+        start = time.time()
+        distance, path = engine.route(*args.route)
+        logger.info("Distance %.1f over %d lanes (%.2f ms)", distance, max(len(path) - 1, 0), (time.time() - start) * 1000)
+        logger.info("%s", path)
+
+
+if __name__ == "__main__":
+    main()
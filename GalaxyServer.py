@@ -0,0 +1,365 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import math
+from collections import OrderedDict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from GalaxyExport import TILE_SIZE, galaxy_arrays, read_galaxy
+from GalaxyFormat import STAR_TYPE_NAMES, star_name_code
+from GalaxyRoutes import RouteEngine, load_route_engine
+
+logger = logging.getLogger(__name__)
+
+# Small HTTP service for the web client. The galaxy is loaded once (memory
+# mapped for .gbin files) and clients fetch only the regions they look at
+# and the routes they need:
+#
+#   GET /galaxy                          star and lane counts, bounds, tile size
+#   GET /region?x0=&y0=&x1=&y1=          stars in a world rectangle and their lanes
+#   GET /tile/<x>/<y>                    the same for one TILE_SIZE tile
+#   GET /star/<index>, /star?name=...    one star and its lanes
+#   GET /route?from=&to=                 shortest lane route between two stars
+#
+# Responses are JSON with an ETag, gzip-compressed when the client accepts
+# it, and kept in an LRU cache keyed by the normalized request.
+
+DEFAULT_PORT = 8001
+CACHE_SIZE = 1024
+
+# Bigger regions are refused; clients should use tiles or zoom in
+MAX_REGION_STARS = 20000
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_SIZE = 512
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LRUCache:
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+class CachedResponse:
+    # Encoded JSON body with its ETag; the gzip form is made on first use.
+    # The gzip bytes are a different representation, so they get their own
+    # ETag with a -gz suffix.
+    def __init__(self, payload):
+        self.body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.digest = hashlib.sha1(self.body).hexdigest()
+        self.gzipped = None
+
+    def encoded(self, accept_gzip):
+        # (body, content encoding or None, ETag)
+        if not accept_gzip or len(self.body) < GZIP_MIN_SIZE:
+            return self.body, None, f'"{self.digest}"'
+        if self.gzipped is None:
+            self.gzipped = gzip.compress(self.body, compresslevel=5)
+        return self.gzipped, 'gzip', f'"{self.digest}-gz"'
+
+
+class GalaxyService:
+    # Request handling without the HTTP layer: handle(path, query) returns a
+    # JSON-ready payload or raises HTTPError
+    def __init__(self, galaxy_data, filename=None, tile_size=TILE_SIZE):
+        self.galaxy_data = galaxy_data
+        self.positions, self.type_codes, self.edges, _ = galaxy_arrays(galaxy_data)
+        self.names = galaxy_data['star_names']
+        self.tile_size = tile_size
+        self.engine = load_route_engine(filename, galaxy_data) if filename else RouteEngine.from_galaxy(galaxy_data)
+        # Star ids sorted by x; the stars of a region are a slice of this
+        # order filtered by y
+        self.x_order = np.argsort(self.positions[:, 0], kind='stable')
+        self.sorted_x = self.positions[self.x_order, 0]
+        self.name_order = None
+        self.name_index = None
+
+    @classmethod
+    def from_file(cls, filename, tile_size=TILE_SIZE):
+        return cls(read_galaxy(filename), filename, tile_size)
+
+    def handle(self, path, query):
+        parts = [unquote(p) for p in path.strip('/').split('/') if p]
+        if parts == ['galaxy']:
+            return self.summary()
+        if parts == ['region']:
+            return self.region(*(_float_arg(query, key) for key in ('x0', 'y0', 'x1', 'y1')))
+        if len(parts) == 3 and parts[0] == 'tile':
+            tx, ty = _int(parts[1]), _int(parts[2])
+            size = self.tile_size
+            payload = self.region(tx * size, ty * size, (tx + 1) * size, (ty + 1) * size)
+            payload.update({'x': tx, 'y': ty})
+            return payload
+        if parts == ['star'] and 'name' in query:
+            return self.star(self.find_name(query['name'][0]))
+        if len(parts) == 2 and parts[0] == 'star':
+            return self.star(_int(parts[1]))
+        if parts == ['route']:
+            return self.route(_int_arg(query, 'from'), _int_arg(query, 'to'))
+        raise HTTPError(404, "unknown endpoint")
+
+    def summary(self):
+        positions = self.positions
+        return {
+            'star_count': len(positions),
+            'lane_count': len(self.edges),
+            'bounds': positions.min(axis=0).tolist() + positions.max(axis=0).tolist() if len(positions) else [0, 0, 0, 0],
+            'tile_size': self.tile_size,
+            'star_types': STAR_TYPE_NAMES,
+            'landmarks': self.engine.landmarks is not None
+        }
+
+    def region(self, x0, y0, x1, y1):
+        # Stars inside the rectangle and every lane touching one of them, in
+        # the layout of the exported leaf tiles
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        stars = self.region_stars(x0, y0, x1, y1)
+        if len(stars) > MAX_REGION_STARS:
+            raise HTTPError(413, f"region holds {len(stars)} stars, the limit is {MAX_REGION_STARS}")
+
+        # Lanes from the CSR adjacency; a lane between two stars of the
+        # region is listed once
+        graph = self.engine.graph
+        starts, ends = graph.indptr[stars], graph.indptr[stars + 1]
+        counts = ends - starts
+        sources = np.repeat(stars, counts)
+        slots = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        targets = graph.indices[slots]
+        inside = np.isin(targets, stars)
+        keep = ~inside | (sources < targets)
+        lanes = zip(sources[keep].tolist(), targets[keep].tolist(), graph.data[slots][keep].tolist())
+
+        return {
+            'bounds': [x0, y0, x1, y1],
+            'star_count': len(stars),
+            'stars': {
+                'index': stars.tolist(),
+                'points': self.positions[stars].tolist(),
+                'types': self.type_codes[stars].tolist(),
+                'names': [self.names[i] for i in stars.tolist()]
+            },
+            'lanes': [[i, j, d] for i, j, d in lanes]
+        }
+
+    def region_stars(self, x0, y0, x1, y1):
+        # Sorted ids of the stars in the rectangle: the x range is a slice of
+        # the x order, which is then filtered by y
+        lo = np.searchsorted(self.sorted_x, x0, side='left')
+        hi = np.searchsorted(self.sorted_x, x1, side='right')
+        stars = self.x_order[lo:hi]
+        ys = self.positions[stars, 1]
+        return np.sort(stars[(ys >= y0) & (ys <= y1)]).astype(np.int64, copy=False)
+
+    def find_name(self, name):
+        codes = getattr(self.names, 'codes', None)
+        if codes is not None:
+            # Generated names: decode the name and binary search the codes
+            code = star_name_code(name)
+            if code is not None:
+                if self.name_order is None:
+                    self.name_order = np.argsort(codes, kind='stable')
+                    self.sorted_codes = np.asarray(codes)[self.name_order]
+                k = int(np.searchsorted(self.sorted_codes, code))
+                if k < len(self.sorted_codes) and self.sorted_codes[k] == code:
+                    return int(self.name_order[k])
+            raise HTTPError(404, f"no star named {name}")
+
+        if self.name_index is None:
+            self.name_index = {}
+            for i, star_name in enumerate(self.names):
+                self.name_index.setdefault(star_name, i)
+        if name not in self.name_index:
+            raise HTTPError(404, f"no star named {name}")
+        return self.name_index[name]
+
+    def star(self, index):
+        if not 0 <= index < len(self.positions):
+            raise HTTPError(404, f"no star {index}")
+        graph = self.engine.graph
+        lo, hi = graph.indptr[index], graph.indptr[index + 1]
+        return {
+            'index': index,
+            'name': self.names[index],
+            'type': STAR_TYPE_NAMES[self.type_codes[index]],
+            'point': self.positions[index].tolist(),
+            'lanes': [[j, d] for j, d in zip(graph.indices[lo:hi].tolist(), graph.data[lo:hi].tolist())]
+        }
+
+    def route(self, source, target):
+        for star in (source, target):
+            if not 0 <= star < len(self.positions):
+                raise HTTPError(404, f"no star {star}")
+        distance, path = self.engine.route(source, target)
+        if not path:
+            raise HTTPError(404, f"no route from {source} to {target}")
+        return {
+            'from': source,
+            'to': target,
+            'distance': distance,
+            'path': path,
+            'points': self.positions[path].tolist()
+        }
+
+
+def _int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(400, f"expected an integer, got {value!r}")
+
+
+def _int_arg(query, key):
+    if key not in query:
+        raise HTTPError(400, f"missing parameter {key}")
+    return _int(query[key][0])
+
+
+def _float_arg(query, key):
+    if key not in query:
+        raise HTTPError(400, f"missing parameter {key}")
+    try:
+        value = float(query[key][0])
+    except ValueError:
+        raise HTTPError(400, f"expected a number for {key}")
+    if not math.isfinite(value):
+        raise HTTPError(400, f"expected a finite number for {key}")
+    return value
+
+
+def cache_key(path, query):
+    # Same request, same key, whatever the parameter order
+    return path.rstrip('/') + '?' + '&'.join(f"{k}={v}" for k, values in sorted(query.items()) for v in values)
+
+
+class GalaxyServer:
+    def __init__(self, service, cache_size=CACHE_SIZE):
+        self.service = service
+        self.cache = LRUCache(cache_size)
+
+    async def respond(self, path, query):
+        # Cached response for a request; misses run in a worker thread so
+        # slow routes do not hold up other clients
+        key = cache_key(path, query)
+        response = self.cache.get(key)
+        if response is None:
+            loop = asyncio.get_running_loop()
+            payload = await loop.run_in_executor(None, self.service.handle, path, query)
+            response = CachedResponse(payload)
+            self.cache.put(key, response)
+        return response
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                method, target, version = (request_line.decode('latin-1').split() + ['', '', ''])[:3]
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+                await self.answer(writer, method, target, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def answer(self, writer, method, target, headers, keep_alive):
+        extra = {}
+        if method not in ('GET', 'HEAD'):
+            status, body = 405, json.dumps({'error': "only GET and HEAD are supported"}).encode('utf-8')
+        else:
+            url = urlsplit(target)
+            try:
+                response = await self.respond(url.path, parse_qs(url.query))
+            except HTTPError as error:
+                status, body = error.status, json.dumps({'error': str(error)}).encode('utf-8')
+            except Exception:
+                logger.exception("Error handling %s", target)
+                status, body = 500, json.dumps({'error': "internal error"}).encode('utf-8')
+            else:
+                body, encoding, etag = response.encoded('gzip' in headers.get('accept-encoding', ''))
+                extra['ETag'] = etag
+                extra['Vary'] = 'Accept-Encoding'
+                if etag in headers.get('if-none-match', ''):
+                    status, body = 304, b''
+                else:
+                    status = 200
+                    if encoding:
+                        extra['Content-Encoding'] = encoding
+
+        reason = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                  413: 'Payload Too Large', 500: 'Internal Server Error'}.get(status, '')
+        lines = [f"HTTP/1.1 {status} {reason}",
+                 "Content-Type: application/json",
+                 f"Content-Length: {len(body)}",
+                 "Access-Control-Allow-Origin: *",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{name}: {value}" for name, value in extra.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info("Serving %d stars on http://%s:%d", len(self.service.positions), host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve galaxy regions, stars and routes over HTTP.")
+    parser.add_argument('galaxy', help="galaxy file (.json or .gbin)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache', type=int, default=CACHE_SIZE, help="number of responses kept in the LRU cache")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    server = GalaxyServer(GalaxyService.from_file(args.galaxy), args.cache)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+
+from GalaxyExport import galaxy_arrays, read_galaxy
+from GalaxyFormat import STAR_TYPE_NAMES
+from GalaxyRoutes import RouteEngine, load_route_engine
+
+logger = logging.getLogger(__name__)
+
+# Authoritative star growth and capture, with the rules of the web client
+# (starManagement.js and triangleManagement.js in "Version6 Backup 24072024")
+# run over index arrays instead of star objects:
+#
+#   growth    every star gains GROWTH_RATE triangles a second, a fifth of
+#             that while unowned, and is capped at its STAR_LIMITS entry
+#   sending   an owned star sends half its triangles (rounded down) as one
+#             fleet along the shortest lane route to the target
+#   arrival   a fleet reaching a star it does not own attacks it: more
+#             triangles than the star holds capture it (it restarts at half
+#             its limit) and the rest fly on; otherwise the star loses the
+#             fleet's triangles and the fleet is gone. At its destination a
+#             fleet reinforces the star, or after capturing it lands what
+#             is left.
+#
+# Only stars below or above their limit change with growth, so a tick
+# touches those stars and the fleets due at a star rather than the whole
+# map. snapshot() gives the full state for a client that joins; delta()
+# gives the changes since the previous delta, for clients already in sync.
+
+STAR_LIMITS = {'small': 30, 'medium': 50, 'large': 80, 'gigantic': 100}
+GROWTH_RATE = 0.5
+NEUTRAL_GROWTH = 0.2  # share of GROWTH_RATE for unowned stars
+NEUTRAL = -1
+
+# The client moves a fleet 0.002-0.004 of a lane per frame; at 60 fps that is
+# this many seconds per lane on average
+HOP_SECONDS = 1 / (0.003 * 60)
+
+STAR_LIMIT_BY_CODE = np.array([STAR_LIMITS[name] for name in STAR_TYPE_NAMES], dtype=float)
+
+# Fleet columns and their types; route positions index GalaxySim.routes
+FLEET_COLUMNS = (('id', np.int64), ('owner', np.int16), ('count', float), ('hop', np.int64), ('end', np.int64),
+                 ('arrival', float), ('changed', bool))
+
+
+class GalaxySim:
+    def __init__(self, type_codes, engine, hop_seconds=HOP_SECONDS):
+        self.engine = engine
+        self.hop_seconds = hop_seconds
+        self.limits = STAR_LIMIT_BY_CODE[np.asarray(type_codes)]
+        self.triangles = self.limits.copy()
+        self.owner = np.full(len(self.limits), NEUTRAL, dtype=np.int16)
+        self.time = 0.0
+        self.ticks = 0
+
+        # Stars whose triangles are not at their limit, the only ones growth changes
+        self.active = np.zeros(0, dtype=np.int64)
+
+        # Fleets in flight, one array per column. The stars of every fleet's
+        # route are kept back to back in routes; hop is the fleet's position
+        # in it and end the position of its destination.
+        self.fleets = {name: np.zeros(0, dtype=dtype) for name, dtype in FLEET_COLUMNS}
+        self.routes = np.zeros(0, dtype=np.int64)
+        self.next_fleet_id = 0
+
+        # What the last delta told clients
+        self.sent_owner = self.owner.copy()
+        self.sent_triangles = self.shown_triangles()
+        self.ended_fleets = []
+
+    @classmethod
+    def from_galaxy(cls, galaxy_data, engine=None, hop_seconds=HOP_SECONDS):
+        positions, type_codes, edges, distances = galaxy_arrays(galaxy_data)
+        return cls(type_codes, engine or RouteEngine(positions, edges, distances), hop_seconds)
+
+    @classmethod
+    def from_file(cls, filename, hop_seconds=HOP_SECONDS):
+        galaxy_data = read_galaxy(filename)
+        _, type_codes, _, _ = galaxy_arrays(galaxy_data)
+        return cls(type_codes, load_route_engine(filename, galaxy_data), hop_seconds)
+
+    @property
+    def star_count(self):
+        return len(self.limits)
+
+    @property
+    def fleet_count(self):
+        return len(self.fleets['id'])
+
+    def shown_triangles(self, stars=slice(None)):
+        # Clients show whole triangles
+        return np.floor(self.triangles[stars]).astype(np.int32)
+
+    def _touch(self, stars):
+        self.active = np.union1d(self.active, stars)
+
+    def claim(self, stars, player):
+        # markStarAsOwned: unowned stars become the player's with half their
+        # limit; stars someone already owns are left alone
+        stars = np.atleast_1d(np.asarray(stars, dtype=np.int64))
+        stars = np.unique(stars[self.owner[stars] == NEUTRAL])
+        self.owner[stars] = player
+        self.triangles[stars] = np.floor(self.limits[stars] / 2)
+        self._touch(stars)
+        return stars
+
+    def send(self, sources, target, player):
+        # sendTrianglesFromMultipleStars: each of the player's stars among
+        # sources sends half its triangles to target. Every route comes from
+        # one search out of target; stars without a route keep their
+        # triangles. Returns the ids of the fleets launched.
+        sources = np.unique(np.atleast_1d(np.asarray(sources, dtype=np.int64)))
+        sources = sources[(self.owner[sources] == player) & (sources != target)]
+        counts = np.floor(self.triangles[sources] / 2)
+        sources, counts = sources[counts > 0], counts[counts > 0]
+
+        if not len(sources):
+            return np.zeros(0, dtype=np.int64)
+        paths = self.engine.routes_to(sources, target)
+        found = np.array([len(path) > 0 for path in paths])
+        if not found.any():
+            return np.zeros(0, dtype=np.int64)
+
+        routes = [path for path in paths if path]
+        sources, counts = sources[found], counts[found]
+        self.triangles[sources] -= counts
+        self._touch(sources)
+
+        lengths = np.array([len(path) for path in routes])
+        starts = len(self.routes) + np.cumsum(lengths) - lengths
+        ids = self.next_fleet_id + np.arange(len(routes))
+        self.next_fleet_id += len(routes)
+        self.routes = np.concatenate([self.routes, np.concatenate(routes)])
+        self._append_fleets({
+            'id': ids,
+            'owner': np.full(len(routes), player),
+            'count': counts,
+            'hop': starts,
+            'end': starts + lengths - 1,
+            'arrival': np.full(len(routes), self.time + self.hop_seconds),
+            'changed': np.ones(len(routes), dtype=bool),
+        })
+        return ids
+
+    def _append_fleets(self, columns):
+        for name, dtype in FLEET_COLUMNS:
+            self.fleets[name] = np.concatenate([self.fleets[name], np.asarray(columns[name], dtype=dtype)])
+
+    def _drop_fleets(self, rows):
+        if not len(rows):
+            return
+        self.ended_fleets.extend(self.fleets['id'][rows].tolist())
+        keep = np.ones(self.fleet_count, dtype=bool)
+        keep[rows] = False
+        for name in self.fleets:
+            self.fleets[name] = self.fleets[name][keep]
+        # Rebuild the route store once most of it belongs to ended fleets
+        remaining = (self.fleets['end'] - self.fleets['hop'] + 1).sum()
+        if remaining * 2 < len(self.routes):
+            hop, end = self.fleets['hop'], self.fleets['end']
+            lengths = end - hop + 1
+            starts = np.cumsum(lengths) - lengths
+            self.routes = self.routes[np.repeat(hop - starts, lengths) + np.arange(lengths.sum())]
+            self.fleets['hop'], self.fleets['end'] = starts, starts + lengths - 1
+
+    def grow(self, dt):
+        # updateStarTriangles for every star not at its limit. Stars above
+        # the limit (reinforced) drop back to it, as in the client.
+        stars = self.active
+        if not len(stars):
+            return
+        rate = np.where(self.owner[stars] == NEUTRAL, GROWTH_RATE * NEUTRAL_GROWTH, GROWTH_RATE)
+        limits = self.limits[stars]
+        triangles = np.minimum(self.triangles[stars] + rate * dt, limits)
+        self.triangles[stars] = triangles
+        self.active = stars[triangles != limits]
+
+    def resolve_arrivals(self):
+        # Fleets due at their next star by now, in rounds: each round takes
+        # the earliest due fleet at every star, so fleets meeting at a star
+        # are resolved in arrival order, and a fleet that is due again after
+        # moving on comes back in a later round. Returns the rounds taken.
+        rounds = 0
+        while True:
+            fleets = self.fleets
+            due = np.flatnonzero(fleets['arrival'] <= self.time)
+            if not len(due):
+                return rounds
+            rounds += 1
+            due = due[np.argsort(fleets['arrival'][due], kind='stable')]
+            stars = self.routes[fleets['hop'][due] + 1]
+            stars, first = np.unique(stars, return_index=True)
+            self._arrive(due[first], stars)
+
+    def _arrive(self, rows, stars):
+        # One fleet per star; rows index the fleet columns
+        fleets = self.fleets
+        owner = fleets['owner'][rows]
+        count = fleets['count'][rows]
+        final = fleets['hop'][rows] + 1 == fleets['end'][rows]
+        held = self.triangles[stars]
+
+        friendly = self.owner[stars] == owner
+        captured = ~friendly & (count > held)
+        repelled = ~friendly & ~captured
+        remaining = count - held
+
+        self.triangles[stars[repelled]] = held[repelled] - count[repelled]
+        won = stars[captured]
+        self.owner[won] = owner[captured]
+        self.triangles[won] = np.floor(self.limits[won] / 2) + np.where(final[captured], remaining[captured], 0)
+        fleets['count'][rows[captured]] = remaining[captured]
+        reinforced = friendly & final
+        self.triangles[stars[reinforced]] += count[reinforced]
+        self._touch(stars[repelled | captured | reinforced])
+
+        moving = rows[~(final | repelled)]
+        fleets['hop'][moving] += 1
+        fleets['arrival'][moving] += self.hop_seconds
+        fleets['changed'][rows] = True
+        self._drop_fleets(rows[final | repelled])
+
+    def tick(self, dt):
+        # As the client's frame: stars grow, then fleets move
+        self.time += dt
+        self.ticks += 1
+        self.grow(dt)
+        self.resolve_arrivals()
+
+    def fleet_state(self, rows):
+        fleets = self.fleets
+        hop = fleets['hop'][rows]
+        return {
+            'id': fleets['id'][rows].tolist(),
+            'owner': fleets['owner'][rows].tolist(),
+            'count': fleets['count'][rows].tolist(),
+            'star': self.routes[hop].tolist(),
+            'next': self.routes[hop + 1].tolist(),
+            'target': self.routes[fleets['end'][rows]].tolist(),
+            'arrival': fleets['arrival'][rows].tolist()
+        }
+
+    def snapshot(self):
+        # Stars that differ from a fresh galaxy (unowned, at their limit)
+        # and every fleet in flight
+        stars = np.flatnonzero((self.owner != NEUTRAL) | (self.triangles != self.limits))
+        return {
+            'tick': self.ticks,
+            'time': self.time,
+            'stars': {
+                'index': stars.tolist(),
+                'owner': self.owner[stars].tolist(),
+                'triangles': self.shown_triangles(stars).tolist()
+            },
+            'fleets': self.fleet_state(np.arange(self.fleet_count))
+        }
+
+    def delta(self):
+        # Stars whose owner or whole triangles changed, fleets launched or
+        # moved on, and fleets that ended, since the previous delta
+        shown = self.shown_triangles()
+        stars = np.flatnonzero((shown != self.sent_triangles) | (self.owner != self.sent_owner))
+        self.sent_triangles[stars] = shown[stars]
+        self.sent_owner[stars] = self.owner[stars]
+        changed = np.flatnonzero(self.fleets['changed'])
+        self.fleets['changed'][:] = False
+        ended, self.ended_fleets = self.ended_fleets, []
+        return {
+            'tick': self.ticks,
+            'time': self.time,
+            'stars': {
+                'index': stars.tolist(),
+                'owner': self.owner[stars].tolist(),
+                'triangles': shown[stars].tolist()
+            },
+            'fleets': self.fleet_state(changed),
+            'ended_fleets': ended
+        }
+
+
+def random_walk(graph, star, hops, rng):
+    # Star reached by following up to hops random lanes from star
+    for _ in range(hops):
+        lo, hi = graph.indptr[star], graph.indptr[star + 1]
+        if lo == hi:
+            break
+        star = int(graph.indices[rng.integers(lo, hi)])
+    return star
+
+
+def run_skirmish(sim, players=4, ticks=10000, dt=1 / 60, send_every=60, hops=4, seed=None):
+    # Each player claims a random star; every send_every ticks each player
+    # sends from all its stars to a star a random walk of hops lanes away
+    # from one of them. Returns the seconds spent in tick() and in send().
+    rng = np.random.default_rng(seed)
+    for player in range(players):
+        sim.claim(int(rng.integers(sim.star_count)), player)
+
+    tick_seconds = send_seconds = 0.0
+    for tick in range(ticks):
+        if tick % send_every == 0:
+            start = time.perf_counter()
+            for player in range(players):
+                owned = np.flatnonzero(sim.owner == player)
+                if not len(owned):
+                    continue
+                target = random_walk(sim.engine.graph, int(rng.choice(owned)), hops, rng)
+                sim.send(owned, target, player)
+            send_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        sim.tick(dt)
+        tick_seconds += time.perf_counter() - start
+    return tick_seconds, send_seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run star growth and capture on a galaxy and time the ticks.")
+    parser.add_argument('galaxy', help="galaxy file (.json or .gbin)")
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=10000)
+    parser.add_argument('--dt', type=float, default=1 / 60, help="seconds of game time per tick")
+    parser.add_argument('--send-every', type=int, default=60, help="ticks between each player's sends")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--snapshot', help="write the final state to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sim = GalaxySim.from_file(args.galaxy)
+    tick_seconds, send_seconds = run_skirmish(sim, args.players, args.ticks, args.dt, args.send_every, seed=args.seed)
+    logger.info("%d ticks in %.2fs (%.0f ticks/s), sends %.2fs", args.ticks, tick_seconds,
+                args.ticks / tick_seconds if tick_seconds else float('inf'), send_seconds)
+    logger.info("Owned stars per player: %s, fleets in flight: %d",
+                np.bincount(sim.owner[sim.owner != NEUTRAL], minlength=args.players).tolist(), sim.fleet_count)
+    if args.snapshot:
+        with open(args.snapshot, 'w') as f:
+            json.dump(sim.snapshot(), f)
+        logger.info("Snapshot written to %s", args.snapshot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+import argparse
+import logging
+import math
+import os
+import random
+import tempfile
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+from BetterGalaxyShape import (MAX_CONNECTION_DISTANCE, MIN_STAR_DISTANCE, ROW_SEGMENTS, STAR_TYPE_CODES, TOTAL_STARS, LaneIndex,
+                               PointGrid, delaunay_edges, generate_segment, iter_segments, select_lanes)
+from GalaxyData import save_galaxy
+from GalaxyFormat import BLOCK_ROWS, STAR_TYPE_NAMES, CodedColumn, LaneTable, NameCodes, name_space_size
+from GalaxyTelemetry import NO_TELEMETRY, Telemetry
+
+logger = logging.getLogger(__name__)
+
+# Out-of-core generation. Peak memory depends on the stars in one band of
+# ROW_SEGMENTS rows, not on the size of the galaxy; everything else lives in
+# files in a scratch directory.
+#
+#   1. bands     rows are generated band_rows at a time. Only the stars
+#                within BORDER_ROWS of the previous band are kept, for
+#                spacing and for the lanes that cross into the new band.
+#                Stars and lanes go to disk, and each band is added to the
+#                minimum spanning forest (see SpanningForest). Its edges
+#                are the band's lanes plus its unpicked Delaunay edges,
+#                which weigh REPAIR_PENALTY more so they only join
+#                components the lanes leave apart (the reconnection step).
+#   2. components  component labels, kept per star on disk, are resolved
+#                through a memory-mapped union-find over the labels
+#   3. restore   band by band, lanes off the MST are added back if they
+#                cross at most MAX_INTERSECTIONS lanes of the band and its
+#                neighbours, as in post_process_galaxy.
+#   4. assemble  stars outside the largest component are dropped, the
+#                rest renumbered, and the result written from memory-mapped
+#                columns.
+
+BAND_ROWS = 1
+BORDER_ROWS = 1
+MAX_INTERSECTIONS = 3
+
+# Added to the weight of Delaunay edges that were not picked as lanes, so
+# the spanning forest only takes one once no lane can join its two components
+REPAIR_PENALTY = 2 * MAX_CONNECTION_DISTANCE
+
+# A forest edge: its endpoints and weight, and the real edge it stands for
+FOREST_EDGE = np.dtype([('u', '<i8'), ('v', '<i8'), ('weight', '<f8'), ('band', '<i4'), ('i', '<i8'), ('j', '<i8'),
+                        ('lane', '?')])
+
+
+class DiskDisjointSet:
+    # DisjointSet over memory-mapped parent and rank arrays, with path
+    # halving and union by rank. Only used for merges of component labels,
+    # which are few; compress() resolves every root in vectorized blocks.
+    def __init__(self, n, directory):
+        self.parent = np.lib.format.open_memmap(os.path.join(directory, 'parent.npy'), mode='w+', dtype=np.int64, shape=(n,))
+        self.rank = np.lib.format.open_memmap(os.path.join(directory, 'rank.npy'), mode='w+', dtype=np.uint8, shape=(n,))
+        for start in range(0, n, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, n)
+            self.parent[start:end] = np.arange(start, end)
+            self.rank[start:end] = 0
+
+    def find(self, i):
+        parent = self.parent
+        p = int(parent[i])
+        while p != i:
+            grandparent = int(parent[p])
+            parent[i] = grandparent
+            i, p = p, grandparent
+            p = int(parent[i])
+        return i
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i == root_j:
+            return False
+        rank_i, rank_j = int(self.rank[root_i]), int(self.rank[root_j])
+        if rank_i < rank_j:
+            root_i, root_j = root_j, root_i
+        self.parent[root_j] = root_i
+        if rank_i == rank_j:
+            self.rank[root_i] = rank_i + 1
+        return True
+
+    def compress(self):
+        # Point every star straight at its root, block by block
+        parent = self.parent
+        changed = True
+        while changed:
+            changed = False
+            for start in range(0, len(parent), BLOCK_ROWS):
+                block = parent[start:start + BLOCK_ROWS]
+                jumped = parent[block]
+                if (jumped != block).any():
+                    parent[start:start + BLOCK_ROWS] = jumped
+                    changed = True
+        return parent
+
+
+class BandFiles:
+    # Per-band files in the scratch directory
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, kind, band):
+        return os.path.join(self.directory, f"{kind}_{band:05d}.npy")
+
+    def save(self, kind, band, array):
+        np.save(self.path(kind, band), array)
+
+    def load(self, kind, band, mmap_mode=None):
+        return np.load(self.path(kind, band), mmap_mode=mmap_mode)
+
+
+def sorted_pair_keys(pairs, n):
+    pairs = np.sort(np.asarray(pairs, dtype=np.int64).reshape(-1, 2), axis=1)
+    return pairs[:, 0] * n + pairs[:, 1]
+
+
+def stream_bands(files, forest, star_file, total_stars, map_size, band_rows, rng, telemetry):
+    # Step 1. Appends positions and type codes to star_file in id order and
+    # returns the star count and the number of bands.
+    segments = list(iter_segments(ROW_SEGMENTS, total_stars, map_size))
+    segment_height = segments[0][5]
+    border = BORDER_ROWS * segment_height
+
+    window_ids = np.zeros(0, dtype=np.int64)
+    window_pos = np.zeros((0, 2))
+    window_codes = np.zeros(0, dtype=np.uint8)
+    window_degree = np.zeros(0, dtype=np.int64)
+    star_count = 0
+    band = 0
+    for band, first_row in enumerate(range(0, len(ROW_SEGMENTS), band_rows)):
+        with telemetry.stage('placement'):
+            grid = PointGrid(MIN_STAR_DISTANCE, map(tuple, window_pos.tolist()))
+            points, types = [], []
+            for row, col, x, y, w, h, stars_per_segment in segments:
+                if first_row <= row < first_row + band_rows:
+                    seed_points, star_types = generate_segment(x, y, w, h, stars_per_segment, [], grid, telemetry)
+                    points.extend(seed_points)
+                    types.extend(star_types)
+
+        new_pos = np.array(points, dtype=float).reshape(-1, 2)
+        new_codes = np.array([STAR_TYPE_CODES[t] for t in types], dtype=np.uint8)
+        star_file.write(np.column_stack([new_pos, new_codes]).astype('<f8').tobytes())
+
+        local_ids = np.concatenate([window_ids, star_count + np.arange(len(new_pos))])
+        local_pos = np.concatenate([window_pos, new_pos])
+        local_codes = np.concatenate([window_codes, new_codes])
+        fresh = np.arange(len(local_ids)) >= len(window_ids)
+        star_count += len(new_pos)
+
+        with telemetry.stage('triangulation'):
+            candidates = delaunay_edges(local_pos) if len(local_pos) > 3 else np.zeros((0, 2), dtype=np.int64)
+            candidates = candidates[fresh[candidates].any(axis=1)]
+        with telemetry.stage('lane_selection'):
+            degree = np.concatenate([window_degree, np.zeros(len(new_pos), dtype=np.int64)])
+            lanes, degree = select_lanes(local_pos, local_codes, candidates, rng, degree)
+        telemetry.count('delaunay_edges', len(candidates))
+        telemetry.count('lanes_kept', len(lanes))
+
+        # The band's lanes and, at a penalty, its unpicked Delaunay edges
+        # go into the spanning forest; the next window is its terminals
+        bottom = (first_row + band_rows) * segment_height
+        near = local_pos[:, 1] >= bottom - border
+        with telemetry.stage('spanning_forest'):
+            n_local = len(local_ids)
+            repair = candidates[~np.isin(sorted_pair_keys(candidates, n_local), sorted_pair_keys(lanes, n_local))]
+            weights_of = lambda pairs: np.hypot(*(local_pos[pairs[:, 0]] - local_pos[pairs[:, 1]]).T)
+            repair = repair[weights_of(repair) <= MAX_CONNECTION_DISTANCE]
+            pairs = local_ids[np.concatenate([lanes, repair])].reshape(-1, 2)
+            weights = np.concatenate([weights_of(lanes), weights_of(repair) + REPAIR_PENALTY])
+            is_lane = np.arange(len(pairs)) < len(lanes)
+            forest.add_band(band, pairs, weights, is_lane, local_ids[fresh], local_ids[near])
+            files.save('lanes', band, local_ids[lanes].reshape(-1, 2))
+        telemetry.count('carried_edges', len(forest.carried))
+
+        # Carry the stars near the bottom of the band into the next one
+        window_ids, window_pos, window_codes, window_degree = local_ids[near], local_pos[near], local_codes[near], degree[near]
+        telemetry.count('bands')
+    return star_count, band + 1
+
+
+def terminal_paths(node_count, u, v, weights, terminal):
+    # For a forest over node_count nodes, the paths between terminals and
+    # branch points as virtual edges (a, b, k), k being the heaviest edge on
+    # the path, and a mask of the edges that are final: those off every path
+    # between terminals and those not the heaviest on theirs.
+    # Edge ids are stored one up, as scipy may drop explicit zeros
+    graph = scipy.sparse.csr_matrix((np.tile(np.arange(1, len(u) + 1), 2), (np.concatenate([u, v]), np.concatenate([v, u]))),
+                                    shape=(node_count, node_count))
+    indptr, indices, edge_ids = graph.indptr.tolist(), graph.indices.tolist(), (graph.data - 1).tolist()
+    weights = weights.tolist()
+
+    # Root every tree at a terminal if it has one
+    parent = [-1] * node_count
+    parent_edge = [-1] * node_count
+    seen = [False] * node_count
+    order = []
+    for root in np.concatenate([np.flatnonzero(terminal), np.arange(node_count)]).tolist():
+        if seen[root]:
+            continue
+        seen[root] = True
+        start = len(order)
+        order.append(root)
+        while start < len(order):
+            node = order[start]
+            start += 1
+            for k in range(indptr[node], indptr[node + 1]):
+                child = indices[k]
+                if not seen[child]:
+                    seen[child] = True
+                    parent[child], parent_edge[child] = node, edge_ids[k]
+                    order.append(child)
+
+    # With the root a terminal, an edge is on a path between terminals
+    # exactly when the subtree below it holds one
+    below = terminal.astype(np.int64).tolist()
+    for node in reversed(order):
+        if parent[node] >= 0:
+            below[parent[node]] += below[node]
+    on_path = [parent_edge[node] >= 0 and below[node] > 0 for node in range(node_count)]
+    path_degree = [0] * node_count
+    for node in range(node_count):
+        if on_path[node]:
+            path_degree[node] += 1
+            path_degree[parent[node]] += 1
+    key = [bool(t) or d >= 3 for t, d in zip(terminal.tolist(), path_degree)]
+
+    virtual = []
+    final = np.ones(len(u), dtype=bool)
+    for node in range(node_count):
+        if not (key[node] and on_path[node]):
+            continue
+        heaviest = -1
+        end = node
+        while True:
+            edge = parent_edge[end]
+            if heaviest < 0 or weights[edge] > weights[heaviest]:
+                heaviest = edge
+            end = parent[end]
+            if key[end]:
+                break
+        virtual.append((node, end, heaviest))
+        final[heaviest] = False
+    return np.array(virtual, dtype=np.int64).reshape(-1, 3), final
+
+
+class SpanningForest:
+    # Minimum spanning forest built band by band. The MST of A and B is the
+    # MST of MST(A) and B, and a band's edges only touch its own stars and
+    # the window of stars it shares with the band before. So all the forest
+    # so far has to offer a band is the part joining the window (the
+    # terminals), carried as virtual edges: each path between terminals and
+    # branch points becomes one edge as heavy as its heaviest edge. Only
+    # that heaviest edge can still be dropped by a later cycle, so the rest
+    # of the forest is final at once and goes to the band tree files.
+    def __init__(self, files, star_limit, directory):
+        self.files = files
+        self.carried = np.zeros(0, dtype=FOREST_EDGE)
+        # Each star's component label, a star id; labels found to be one
+        # component are merged in the union-find
+        self.labels = np.lib.format.open_memmap(os.path.join(directory, 'labels.npy'), mode='w+', dtype=np.int64,
+                                                shape=(max(star_limit, 1),))
+        self.components = DiskDisjointSet(max(star_limit, 1), directory)
+
+    def add_band(self, band, pairs, weights, is_lane, new_stars, terminals):
+        real = np.zeros(len(pairs), dtype=FOREST_EDGE)
+        real['u'], real['v'] = pairs[:, 0], pairs[:, 1]
+        real['weight'] = weights
+        real['band'] = band
+        real['i'], real['j'] = pairs[:, 0], pairs[:, 1]
+        real['lane'] = is_lane
+        edges = np.concatenate([self.carried, real])
+
+        nodes = np.unique(np.concatenate([edges['u'], edges['v'], new_stars, terminals]))
+        m = len(nodes)
+        u, v = np.searchsorted(nodes, edges['u']), np.searchsorted(nodes, edges['v'])
+        low, high = np.minimum(u, v), np.maximum(u, v)
+        tree = scipy.sparse.csgraph.minimum_spanning_tree(
+            scipy.sparse.csr_matrix((edges['weight'], (low, high)), shape=(m, m))).tocoo()
+        chosen = np.isin(low * m + high, np.minimum(tree.row, tree.col).astype(np.int64) * m + np.maximum(tree.row, tree.col))
+        edges, u, v = edges[chosen], u[chosen], v[chosen]
+
+        self._label(band, nodes, u, v, new_stars)
+
+        virtual, final = terminal_paths(m, u, v, edges['weight'], np.isin(nodes, terminals))
+        self._commit(edges[final])
+        carried = edges[virtual[:, 2]]
+        carried['u'], carried['v'] = nodes[virtual[:, 0]], nodes[virtual[:, 1]]
+        self.carried = carried
+
+    def _label(self, band, nodes, u, v, new_stars):
+        # New stars take the label of the earlier stars in their component,
+        # whose labels are merged, or else of the first new star in it
+        m = len(nodes)
+        _, local = scipy.sparse.csgraph.connected_components(
+            scipy.sparse.csr_matrix((np.ones(len(u)), (u, v)), shape=(m, m)), directed=False)
+        component_label = np.full(local.max() + 1 if m else 0, -1, dtype=np.int64)
+        earlier = np.flatnonzero(nodes < new_stars.min()) if len(new_stars) else np.arange(m)
+        pairs = np.unique(np.column_stack([local[earlier], self.labels[nodes[earlier]]]), axis=0)
+        for component, label in pairs.tolist():
+            if component_label[component] < 0:
+                component_label[component] = self.components.find(label)
+            else:
+                self.components.union(component_label[component], label)
+                component_label[component] = self.components.find(label)
+        fresh = np.searchsorted(nodes, new_stars)
+        unlabelled = component_label[local[fresh]] < 0
+        # First new star of each component without earlier stars
+        first = np.full(len(component_label), np.iinfo(np.int64).max)
+        np.minimum.at(first, local[fresh[unlabelled]], new_stars[unlabelled])
+        component_label = np.where(component_label < 0, first, component_label)
+        self.labels[new_stars] = component_label[local[fresh]]
+
+    def _commit(self, edges):
+        for band in np.unique(edges['band']).tolist():
+            rows = edges[edges['band'] == band]
+            with open(self.files.path('tree', band), 'ab') as f:
+                f.write(np.column_stack([rows['i'], rows['j'], rows['lane']]).astype('<i8').tobytes())
+
+    def finish(self, star_count):
+        # Commits the edges still carried and returns each star's component
+        # root, written over the labels
+        self._commit(self.carried)
+        self.carried = self.carried[:0]
+        roots = self.components.compress()
+        labels = self.labels
+        for start in range(0, star_count, BLOCK_ROWS):
+            labels[start:start + BLOCK_ROWS] = roots[labels[start:start + BLOCK_ROWS]]
+        return labels[:star_count]
+
+
+def load_tree(files, band):
+    if not os.path.exists(files.path('tree', band)):
+        return np.zeros((0, 3), dtype=np.int64)
+    return np.fromfile(files.path('tree', band), dtype='<i8').reshape(-1, 3)
+
+
+def restore_lanes(files, band, positions, neighbour_lanes, max_intersections, telemetry):
+    # Step 3 for one band: its MST edges plus the lanes that can be added
+    # back without too many crossings, and the bridges among the MST edges.
+    # neighbour_lanes are the final lanes of the band before and the MST
+    # edges of the band after.
+    tree = load_tree(files, band)
+    lanes = files.load('lanes', band)
+    tree_lanes = tree[tree[:, 2] == 1, :2]
+    span = max(int(lanes.max()) + 1 if len(lanes) else 0, int(tree.max()) + 1 if len(tree) else 0, 1)
+    candidates = lanes[~np.isin(sorted_pair_keys(lanes, span), sorted_pair_keys(tree_lanes, span))]
+
+    def coords(pairs):
+        ends = positions[np.asarray(pairs, dtype=np.int64).reshape(-1)].reshape(-1, 2, 2).tolist()
+        return [(tuple(a), tuple(b)) for a, b in ends]
+
+    lane_index = LaneIndex(coords(neighbour_lanes) + coords(tree[:, :2]))
+    candidate_lanes = coords(candidates)
+    restored = []
+    crossings = lane_index.count_intersections_batch(candidate_lanes) if candidate_lanes else []
+    for pair, new_lane, count in zip(candidates.tolist(), candidate_lanes, crossings):
+        if count > max_intersections:
+            continue
+        if lane_index.count_intersections(new_lane, max_intersections) <= max_intersections:
+            restored.append(pair)
+            lane_index.add(new_lane)
+    telemetry.count('intersection_tests', lane_index.tests)
+    telemetry.count('lanes_restored', len(restored))
+    telemetry.count('bridges', int((tree[:, 2] == 0).sum()))
+    return np.concatenate([tree[:, :2], np.array(restored, dtype=np.int64).reshape(-1, 2)]), tree[tree[:, 2] == 0, :2]
+
+
+def name_code_permutation(count, rng):
+    # Distinct name codes for count stars without holding them all: an
+    # affine map i -> (a * i + c) mod space with a coprime to space
+    space = name_space_size(count)
+    a = int(rng.integers(1, space))
+    while math.gcd(a, space) != 1:
+        a = int(rng.integers(1, space))
+    return a, int(rng.integers(0, space)), space
+
+
+def generate_galaxy_streaming(total_stars=TOTAL_STARS, seed=None, output="galaxy.gbin", map_size=None, band_rows=BAND_ROWS,
+                              work_dir=None, max_intersections=MAX_INTERSECTIONS, progress=None, telemetry=NO_TELEMETRY):
+    # Same inputs and output files as generate_galaxy; returns the star and
+    # lane counts written. work_dir is where the scratch directory goes.
+    if seed is not None:
+        random.seed(seed)
+    rng = np.random.default_rng(random.getrandbits(64))
+
+    def report(stage, done, total):
+        if progress is not None:
+            progress(stage, done, total)
+        else:
+            logger.debug("%s %d/%d", stage, done, total)
+
+    with tempfile.TemporaryDirectory(dir=work_dir, prefix='galaxy-') as directory, telemetry.capture():
+        files = BandFiles(directory)
+        star_path = os.path.join(directory, 'stars.f8')
+
+        # Every segment places at most stars_per_segment stars
+        segments = list(iter_segments(ROW_SEGMENTS, total_stars, map_size))
+        forest = SpanningForest(files, segments[0][6] * len(segments), directory)
+
+        report("bands", 0, 1)
+        with open(star_path, 'wb') as star_file, telemetry.stage('bands'):
+            star_count, band_count = stream_bands(files, forest, star_file, total_stars, map_size, band_rows, rng, telemetry)
+        logger.info("Placed %d stars in %d bands", star_count, band_count)
+        stars = np.memmap(star_path, dtype='<f8', mode='r', shape=(star_count, 3)) if star_count else np.zeros((0, 3))
+        positions = stars[:, :2]
+
+        # Keep the largest component; new_ids maps old ids to new, -1 if dropped
+        with telemetry.stage('components'):
+            roots = forest.finish(star_count)
+            sizes = np.lib.format.open_memmap(os.path.join(directory, 'sizes.npy'), mode='w+', dtype=np.int64,
+                                              shape=(max(star_count, 1),))
+            main, largest = -1, 0
+            for start in range(0, star_count, BLOCK_ROWS):
+                np.add.at(sizes, roots[start:start + BLOCK_ROWS], 1)
+            for start in range(0, star_count, BLOCK_ROWS):
+                block = sizes[start:start + BLOCK_ROWS]
+                if len(block) and block.max() > largest:
+                    main, largest = start + int(block.argmax()), int(block.max())
+            new_ids = np.lib.format.open_memmap(os.path.join(directory, 'new_ids.npy'), mode='w+', dtype=np.int64,
+                                                shape=(star_count,))
+            kept = 0
+            for start in range(0, star_count, BLOCK_ROWS):
+                keep = roots[start:start + BLOCK_ROWS] == main
+                new_ids[start:start + BLOCK_ROWS] = np.where(keep, kept + np.cumsum(keep) - 1, -1)
+                kept += int(keep.sum())
+        telemetry.count('stars_dropped', star_count - kept)
+
+        column = lambda name, dtype, shape: np.lib.format.open_memmap(os.path.join(directory, name), mode='w+',
+                                                                      dtype=dtype, shape=shape)
+        degree = column('degree.npy', np.uint16, (max(kept, 1),))[:kept]
+        degree[:] = 0
+
+        report("restore", 0, band_count)
+        lane_count = 0
+        with open(os.path.join(directory, 'edges.u4'), 'wb') as edge_file, \
+                open(os.path.join(directory, 'distances.f4'), 'wb') as distance_file, telemetry.stage('restore'):
+            previous = np.zeros((0, 2), dtype=np.int64)
+            for band in range(band_count):
+                following = load_tree(files, band + 1)[:, :2] if band + 1 < band_count else np.zeros((0, 2), dtype=np.int64)
+                final, bridges = restore_lanes(files, band, positions, np.concatenate([previous, following]),
+                                            max_intersections, telemetry)
+                previous = final
+
+                # connection_counts as generate_galaxy records them: lanes
+                # picked for the star plus bridges made to it
+                counted = new_ids[np.concatenate([files.load('lanes', band), bridges]).reshape(-1)]
+                np.add.at(degree, counted[counted >= 0], 1)
+
+                ends = new_ids[final.reshape(-1)].reshape(-1, 2)
+                inside = (ends >= 0).all(axis=1)
+                distances = np.hypot(*(positions[final[inside, 0]] - positions[final[inside, 1]]).T)
+                edge_file.write(ends[inside].astype('<u4').tobytes())
+                distance_file.write(distances.astype('<f4').tobytes())
+                lane_count += int(inside.sum())
+                report("restore", band + 1, band_count)
+
+        with telemetry.stage('assemble'):
+            out_positions = column('positions.npy', np.float32, (max(kept, 1), 2))[:kept]
+            out_codes = column('type_codes.npy', np.uint8, (max(kept, 1),))[:kept]
+            name_codes = column('name_codes.npy', np.uint32, (max(kept, 1),))[:kept]
+            a, c, space = name_code_permutation(kept, rng)
+            for start in range(0, star_count, BLOCK_ROWS):
+                ids = new_ids[start:start + BLOCK_ROWS]
+                keep = ids >= 0
+                block = stars[start:start + BLOCK_ROWS][keep]
+                out_positions[ids[keep]] = block[:, :2]
+                out_codes[ids[keep]] = block[:, 2]
+            for start in range(0, kept, BLOCK_ROWS):
+                index = np.arange(start, min(start + BLOCK_ROWS, kept), dtype=np.int64)
+                name_codes[start:start + BLOCK_ROWS] = (a * index + c) % space
+
+            if lane_count:
+                edges = np.memmap(os.path.join(directory, 'edges.u4'), dtype='<u4', mode='r', shape=(lane_count, 2))
+                lane_distances = np.memmap(os.path.join(directory, 'distances.f4'), dtype='<f4', mode='r', shape=(lane_count,))
+            else:
+                edges, lane_distances = np.zeros((0, 2), dtype=np.uint32), np.zeros(0, dtype=np.float32)
+
+        report("save", 0, 1)
+        with telemetry.stage('save'):
+            galaxy_data = {
+                'points': out_positions,
+                'types': CodedColumn(out_codes, STAR_TYPE_NAMES),
+                'connection_counts': degree,
+                'star_names': NameCodes(name_codes),
+                'lane_details': LaneTable(edges, lane_distances),
+            }
+            save_galaxy(galaxy_data, output)
+        telemetry.count('stars', kept)
+        telemetry.count('lanes', lane_count)
+        del galaxy_data, stars, positions, roots, sizes, forest, new_ids, degree, out_positions, out_codes, name_codes, edges, lane_distances
+
+    logger.info("Galaxy generation complete! %d stars, %d lanes written to %s", kept, lane_count, output)
+    return kept, lane_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a galaxy too large for memory, a band of rows at a time.")
+    parser.add_argument("--stars", type=int, default=TOTAL_STARS, help="number of stars to aim for")
+    parser.add_argument("--seed", type=int, help="random seed for a reproducible galaxy")
+    parser.add_argument("--output", default="galaxy.gbin", help="output file (.gbin, .json, .json.gz or .json.br)")
+    parser.add_argument("--map-size", type=float, nargs=2, metavar=('WIDTH', 'HEIGHT'), help="map size in world units")
+    parser.add_argument("--band-rows", type=int, default=BAND_ROWS, help="ROW_SEGMENTS rows generated together")
+    parser.add_argument("--work-dir", help="where to put the scratch files (default: the system temp directory)")
+    parser.add_argument("--report", help="write stage timings and counters for the run to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    telemetry = Telemetry() if args.report else NO_TELEMETRY
+    generate_galaxy_streaming(args.stars, args.seed, args.output, tuple(args.map_size) if args.map_size else None,
+                              args.band_rows, args.work_dir, telemetry=telemetry)
+    if args.report:
+        for line in telemetry.summary_lines():
+            logger.info("  %s", line)
+        telemetry.write_report(args.report)
+        logger.info("Telemetry report written to %s", args.report)
+
+
+if __name__ == "__main__":
+    main()
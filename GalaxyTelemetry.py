@@ -0,0 +1,135 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Stage timers and counters for a generation run. Pass a Telemetry to
+# generate_galaxy and read report() afterwards, or write it out as JSON:
+#
+#   stages    wall time and call count per named stage, plus the peak
+#             traced memory of top-level stages when tracemalloc is on
+#   counters  totals such as candidates rejected during placement or
+#             intersection tests performed during post-processing
+#   profile   the functions with the most cumulative time, when cProfile is on
+#
+# Functions that take a telemetry argument default to NO_TELEMETRY, which
+# has the same methods and records nothing.
+
+PROFILE_TOP_FUNCTIONS = 30
+REPORT_VERSION = 1
+
+
+class NullTelemetry:
+    @contextmanager
+    def capture(self):
+        yield self
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def count(self, name, amount=1):
+        pass
+
+
+NO_TELEMETRY = NullTelemetry()
+
+
+class Telemetry:
+    def __init__(self, profile=False, trace_memory=False):
+        self.seconds = {}
+        self.calls = {}
+        self.peak_traced = {}
+        self.counters = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self.trace_memory = trace_memory
+        self.depth = 0
+        self.elapsed = 0.0
+
+    @contextmanager
+    def capture(self):
+        # Runs the profiler and tracemalloc, if enabled, around a whole run
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.profiler:
+            self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.elapsed += time.perf_counter() - start
+            if self.profiler:
+                self.profiler.disable()
+            if started_tracing:
+                tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        # Stages may nest and repeat; time and calls add up under the name.
+        # Peak memory is only taken for top-level stages, since resetting
+        # the peak inside a stage would hide the outer stage's own peak.
+        tracing = self.depth == 0 and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.depth -= 1
+            if tracing:
+                self.peak_traced[name] = max(self.peak_traced.get(name, 0), tracemalloc.get_traced_memory()[1])
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+    def profile_rows(self, limit=PROFILE_TOP_FUNCTIONS):
+        if self.profiler is None:
+            return []
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({
+                'function': f"{filename}:{line}({function})",
+                'calls': calls,
+                'own_seconds': round(tottime, 6),
+                'cumulative_seconds': round(cumtime, 6)
+            })
+        rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+        return rows[:limit]
+
+    def report(self):
+        stages = {}
+        for name, seconds in self.seconds.items():
+            stages[name] = {'seconds': round(seconds, 6), 'calls': self.calls[name]}
+            if name in self.peak_traced:
+                stages[name]['peak_traced_mb'] = round(self.peak_traced[name] / (1024 * 1024), 3)
+        report = {
+            'version': REPORT_VERSION,
+            'total_seconds': round(self.elapsed, 6),
+            'stages': stages,
+            'counters': dict(self.counters),
+        }
+        if self.profiler is not None:
+            report['profile'] = self.profile_rows()
+        return report
+
+    def write_report(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def dump_profile(self, filename):
+        # Full cProfile data for pstats or snakeviz
+        self.profiler.dump_stats(filename)
+
+    def summary_lines(self):
+        lines = [f"{name}: {seconds:.3f}s" + (f" x{self.calls[name]}" if self.calls[name] > 1 else "")
+                 for name, seconds in self.seconds.items()]
+        lines += [f"{name}: {count}" for name, count in self.counters.items()]
+        return lines
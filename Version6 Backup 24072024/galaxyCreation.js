@@ -9,6 +9,10 @@ export function loadGalaxyData(scene, callback) {
     fetch('galaxy.json')
         .then(response => response.json())
         .then(data => {
+            // Index-only exports leave out the coordinate pairs; rebuild them from lane_details
+            if (!data.connections && data.lane_details) {
+                data.connections = data.lane_details.map(lane => [data.points[lane.start_star], data.points[lane.end_star]]);
+            }
             galaxyData = data;
             if (data.points && data.points.length > 0) {
                 stars = createStars(data);  // Remove scene parameter
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository; pygame stays headless
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from BetterGalaxyShape import generate_galaxy  # noqa: E402
+from GalaxyData import load_galaxy  # noqa: E402
+
+TEST_STARS = 3000
+TEST_SEED = 1
+
+
+@pytest.fixture(scope='session')
+def galaxy_file(tmp_path_factory):
+    # A small generated galaxy shared by the tests, in the binary format
+    filename = str(tmp_path_factory.mktemp('galaxy') / 'galaxy.gbin')
+    generate_galaxy(TEST_STARS, seed=TEST_SEED, output=filename)
+    return filename
+
+
+@pytest.fixture
+def galaxy(galaxy_file):
+    return load_galaxy(galaxy_file)
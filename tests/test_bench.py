@@ -0,0 +1,40 @@
+import pytest
+
+from GalaxyBench import combine_runs, compare_results, run_size, scaling_exponents
+
+STAGES = ('generate_segment', 'lanes', 'find_connected_components', 'reconnect', 'post_process', 'save_json',
+          'load_json', 'save_binary', 'load_binary', 'viewer_setup', 'frame_full', 'frame_pan', 'frame_lod_full',
+          'frame_lod_pan')
+
+
+@pytest.mark.parametrize('stars', [3000, 500])
+def test_run_size_times_every_stage(stars):
+    # 500 stars is less than one per segment, so the galaxy is empty
+    run = run_size(stars)
+    assert set(run['stages']) == set(STAGES)
+    assert all(seconds >= 0 for seconds in run['stages'].values())
+    assert run['star_count'] == (run['placed_stars'] if stars == 3000 else 0)
+    assert set(run['stage_peak_rss_mb']) <= set(STAGES)
+
+
+def fake_run(stars, seconds, rss):
+    return {'stars': stars, 'stages': {'lanes': seconds}, 'stage_peak_rss_mb': {'lanes': rss}, 'peak_rss_mb': rss}
+
+
+def test_repeats_keep_the_median_time_and_largest_rss():
+    run = combine_runs([fake_run(10, 3.0, 50), fake_run(10, 1.0, 70), fake_run(10, 2.0, None)])
+    assert run['stages'] == {'lanes': 2.0}
+    assert run['stage_peak_rss_mb'] == {'lanes': 70}
+    assert run['peak_rss_mb'] == 70
+
+
+def test_scaling_exponents():
+    exponents = scaling_exponents([fake_run(100, 1.0, 10), fake_run(1000, 100.0, 100)])
+    assert exponents == {'lanes': 2.0, 'peak_rss_mb': 1.0}
+
+
+def test_regressions_need_both_tolerances():
+    baseline = {'runs': [fake_run(10, 1.0, 1), fake_run(20, 0.01, 1)]}
+    results = {'runs': [fake_run(10, 1.5, 1), fake_run(20, 0.05, 1), fake_run(30, 9.0, 1)]}
+    rows = compare_results(results, baseline)
+    assert [(stars, regressed) for stars, _, _, _, _, regressed in rows] == [(10, True), (20, False)]
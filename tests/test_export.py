@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from GalaxyData import load_galaxy
+from GalaxyExport import write_galaxy_json
+from GalaxyRoutes import load_route_engine
+
+
+def assert_same_galaxy(loaded, galaxy):
+    assert np.allclose(loaded.positions, galaxy.positions)
+    assert np.array_equal(loaded.type_codes, galaxy.type_codes)
+    assert np.array_equal(loaded.edges, galaxy.edges)
+    assert np.array_equal(loaded.degree, galaxy.degree)
+    assert list(loaded.star_names()) == list(galaxy.star_names())
+
+
+@pytest.mark.parametrize('schema', ['full', 'index'])
+@pytest.mark.parametrize('extension', ['.json', '.json.gz', '.json.br'])
+def test_json_round_trip(galaxy, tmp_path, schema, extension):
+    if extension == '.json.br':
+        pytest.importorskip('brotli')
+    filename = str(tmp_path / ('galaxy' + extension))
+    write_galaxy_json(galaxy, filename, schema)
+    assert_same_galaxy(load_galaxy(filename), galaxy)
+
+
+def test_tools_read_compressed_json(galaxy, tmp_path):
+    filename = str(tmp_path / 'galaxy.json.gz')
+    write_galaxy_json(galaxy, filename)
+    engine = load_route_engine(filename)
+    assert engine.graph.nnz == 2 * galaxy.lane_count
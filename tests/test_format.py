@@ -0,0 +1,48 @@
+import numpy as np
+
+from GalaxyData import GalaxyData, load_galaxy, save_galaxy
+from GalaxyFormat import is_binary_galaxy, load_galaxy_binary
+
+
+def test_binary_round_trip(galaxy, tmp_path):
+    filename = str(tmp_path / 'copy.gbin')
+    save_galaxy(galaxy, filename)
+    assert is_binary_galaxy(filename)
+    loaded = load_galaxy(filename)
+    assert np.array_equal(loaded.positions, galaxy.positions)
+    assert np.array_equal(loaded.type_codes, galaxy.type_codes)
+    assert np.array_equal(loaded.edges, galaxy.edges)
+    assert np.array_equal(loaded.degree, galaxy.degree)
+    assert np.array_equal(loaded.name_codes, galaxy.name_codes)
+    assert np.allclose(loaded['lane_details'].distances, galaxy.lane_distances())
+
+
+def test_binary_round_trip_through_json(galaxy, tmp_path):
+    # JSON and back keeps every column, names included as text
+    json_file, binary_file = str(tmp_path / 'copy.json'), str(tmp_path / 'copy.gbin')
+    save_galaxy(galaxy, json_file)
+    save_galaxy(load_galaxy(json_file), binary_file)
+    loaded = load_galaxy(binary_file)
+    assert np.array_equal(loaded.positions, galaxy.positions)
+    assert np.array_equal(loaded.edges, galaxy.edges)
+    assert list(loaded.star_names()) == list(galaxy.star_names())
+
+
+def test_binary_round_trip_with_text_names(tmp_path):
+    names = ["Sol", "Alpha Centauri", "Ünïcode"]
+    galaxy = GalaxyData([(0, 0), (10, 0), (0, 10)], [0, 1, 2], [(0, 1), (1, 2)], names=names)
+    filename = str(tmp_path / 'small.gbin')
+    save_galaxy(galaxy, filename)
+    galaxy_data = load_galaxy_binary(filename)
+    assert list(galaxy_data['star_names']) == names
+    assert galaxy_data['lane_details'][1]['start_star'] == 1
+    assert galaxy_data['connections'].shape == (2, 2, 2)
+
+
+def test_connections_are_gathered_on_access(galaxy_file, galaxy):
+    connections = load_galaxy_binary(galaxy_file)['connections']
+    expected = galaxy.positions[galaxy.edges]
+    assert connections.shape == expected.shape
+    assert np.array_equal(np.asarray(connections), expected)
+    assert np.array_equal(connections[5], expected[5])
+    assert list(connections)[:3] == expected[:3].tolist()
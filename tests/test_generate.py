@@ -0,0 +1,13 @@
+import BetterGalaxyShape
+from GalaxyData import load_galaxy
+
+
+def test_main_generates_headless_on_the_given_map(tmp_path):
+    output = str(tmp_path / 'wide.gbin')
+    BetterGalaxyShape.main(['--stars', '1000', '--seed', '4', '--output', output, '--map-size', '2400', '600'])
+    galaxy = load_galaxy(output)
+    assert galaxy.star_count > 0
+    low, high = galaxy.positions.min(axis=0), galaxy.positions.max(axis=0)
+    assert low[0] >= 0 and low[1] >= 0
+    assert high[0] <= 2400 and high[1] <= 600
+    assert high[0] > BetterGalaxyShape.width
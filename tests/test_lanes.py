@@ -0,0 +1,50 @@
+import random
+
+import numpy as np
+
+from BetterGalaxyShape import LaneIndex, intersect
+
+
+def random_lanes(rng, count, size=200, length=40):
+    # Short lanes on a small map, some sharing endpoints, as generated lanes do
+    points = [(rng.uniform(0, size), rng.uniform(0, size)) for _ in range(count)]
+    lanes = []
+    for _ in range(count):
+        a = rng.choice(points)
+        b = (a[0] + rng.uniform(-length, length), a[1] + rng.uniform(-length, length))
+        lanes.append((a, rng.choice(points) if rng.random() < 0.3 else b))
+    return lanes
+
+
+def brute_force(lanes, new_edge):
+    return sum(1 for edge in lanes if edge != new_edge and intersect(new_edge[0], new_edge[1], edge[0], edge[1]))
+
+
+def test_count_intersections_matches_brute_force():
+    rng = random.Random(3)
+    lanes = random_lanes(rng, 300)
+    index = LaneIndex(lanes, cell_size=25)
+    for new_edge in random_lanes(rng, 200) + lanes[:50]:
+        assert index.count_intersections(new_edge) == brute_force(lanes, new_edge)
+
+
+def test_count_intersections_limit_stops_past_the_limit():
+    rng = random.Random(4)
+    lanes = random_lanes(rng, 300)
+    index = LaneIndex(lanes, cell_size=25)
+    for new_edge in random_lanes(rng, 100):
+        assert index.count_intersections(new_edge, limit=1) == min(brute_force(lanes, new_edge), 2)
+
+
+def test_count_intersections_batch_matches_single():
+    rng = random.Random(5)
+    lanes = random_lanes(rng, 300)
+    index = LaneIndex(lanes, cell_size=25)
+    new_edges = random_lanes(rng, 200) + lanes[:50]
+    single = [index.count_intersections(edge) for edge in new_edges]
+    assert index.count_intersections_batch(new_edges).tolist() == single
+    assert single == [brute_force(lanes, edge) for edge in new_edges]
+
+
+def test_count_intersections_batch_on_empty_index():
+    assert np.array_equal(LaneIndex().count_intersections_batch(random_lanes(random.Random(6), 10)), np.zeros(10))
@@ -0,0 +1,30 @@
+import numpy as np
+
+from BetterGalaxyShape import generate_star_names
+from GalaxyFormat import NameCodes, name_space_size, star_name, star_name_code
+
+
+def test_name_codes_round_trip_over_two_name_spaces():
+    codes = np.arange(2 * name_space_size())
+    names = [star_name(code) for code in codes.tolist()]
+    assert len(set(names)) == len(names)
+    assert [star_name_code(name) for name in names] == codes.tolist()
+
+
+def test_star_name_code_rejects_other_names():
+    for name in ("Sol", "Sol-3", "Nowhere Star-1", "Alpha Centauri", ""):
+        assert star_name_code(name) is None
+
+
+def test_name_space_size_holds_the_count():
+    for count in (0, 1, name_space_size(), name_space_size() + 1, 10 * name_space_size()):
+        assert name_space_size(count) >= count
+        assert name_space_size(count) % name_space_size() == 0
+
+
+def test_generated_names_are_unique():
+    names = generate_star_names(50000, np.random.default_rng(7))
+    assert isinstance(names, NameCodes)
+    assert len(np.unique(names.codes)) == len(names)
+    assert len(set(names)) == len(names)
+    assert names[10:20] == [names[i] for i in range(10, 20)]
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from BetterGalaxyShape import generate_galaxy
+from GalaxyParallel import generate_lanes_parallel
+
+
+@pytest.fixture(scope='module')
+def one_worker():
+    return generate_lanes_parallel(3000, seed=3, workers=1)
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_worker_count_does_not_change_the_lanes(one_worker, workers):
+    galaxy = generate_lanes_parallel(3000, seed=3, workers=workers)
+    assert np.array_equal(galaxy.positions, one_worker.positions)
+    assert np.array_equal(galaxy.type_codes, one_worker.type_codes)
+    assert np.array_equal(galaxy.edges, one_worker.edges)
+    assert np.array_equal(galaxy.degree, one_worker.degree)
+
+
+def test_seed_changes_the_galaxy(one_worker):
+    galaxy = generate_lanes_parallel(3000, seed=4, workers=1)
+    assert not np.array_equal(galaxy.positions[:100], one_worker.positions[:100])
+
+
+def test_parallel_pipeline_writes_the_same_file(tmp_path):
+    outputs = []
+    for workers in (1, 2):
+        filename = str(tmp_path / f'galaxy{workers}.gbin')
+        generate_galaxy(3000, seed=3, output=filename, pipeline='parallel', workers=workers)
+        with open(filename, 'rb') as f:
+            outputs.append(f.read())
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,27 @@
+import random
+
+import numpy as np
+import scipy.spatial
+
+from BetterGalaxyShape import MIN_STAR_DISTANCE, PointGrid, generate_segment
+
+
+def test_point_grid_matches_brute_force():
+    rng = random.Random(1)
+    points = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(300)]
+    grid = PointGrid(MIN_STAR_DISTANCE, points)
+    for _ in range(500):
+        candidate = (rng.uniform(-10, 110), rng.uniform(-10, 110))
+        near = any(np.hypot(candidate[0] - x, candidate[1] - y) < MIN_STAR_DISTANCE for x, y in points)
+        assert grid.is_far_enough(candidate) == (not near)
+
+
+def test_generate_segment_keeps_stars_apart():
+    random.seed(2)
+    existing = [(x, 50.0) for x in np.arange(0, 200, MIN_STAR_DISTANCE).tolist()]
+    points, types = generate_segment(0, 0, 200, 100, 400, existing)
+    assert len(points) == len(types) > 0
+    points = np.array(points)
+    assert np.all((points >= 0) & (points <= [200, 100]))
+    distances, _ = scipy.spatial.cKDTree(np.concatenate([points, existing])).query(points, k=2)
+    assert distances[:, 1].min() >= MIN_STAR_DISTANCE
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import scipy.sparse
+import scipy.sparse.csgraph
+
+from GalaxyRegion import RegionIndex, regenerate_region
+
+
+def check_galaxy(galaxy):
+    n = galaxy.star_count
+    edges = np.asarray(galaxy.edges, dtype=np.int64)
+    assert edges.min() >= 0 and edges.max() < n
+    assert not np.any(edges[:, 0] == edges[:, 1])
+    assert len(np.unique(np.sort(edges, axis=1), axis=0)) == len(edges)
+    components, _ = scipy.sparse.csgraph.connected_components(
+        scipy.sparse.csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n, n)), directed=False)
+    assert components == 1
+    assert len(set(galaxy.star_names())) == n
+
+
+@pytest.mark.parametrize('segments, options', [
+    ([(2, 3)], {}),
+    ([(1, 1), (1, 2)], {'stars': 40}),
+    ([(3, 0), (3, 1)], {'keep_stars': True, 'stars': 10}),
+])
+def test_regenerated_region_stays_one_galaxy(galaxy, segments, options):
+    result, delta = regenerate_region(galaxy, segments, seed=5, **options)
+    check_galaxy(result)
+    assert delta['star_count'] == result.star_count
+    assert len(delta['added_lanes']) > 0
+
+
+def test_regeneration_is_repeatable(galaxy):
+    first, _ = regenerate_region(galaxy, [(2, 3)], seed=6)
+    second, _ = regenerate_region(galaxy, [(2, 3)], seed=6)
+    assert np.array_equal(first.positions, second.positions)
+    assert np.array_equal(first.edges, second.edges)
+
+
+def test_unknown_segment_is_refused(galaxy):
+    with pytest.raises(ValueError):
+        regenerate_region(galaxy, [(99, 0)], seed=1)
+
+
+def test_prebuilt_index_gives_the_same_region(galaxy):
+    index = RegionIndex(galaxy)
+    first, first_delta = regenerate_region(galaxy, [(2, 3)], seed=7)
+    second, second_delta = regenerate_region(galaxy, [(2, 3)], seed=7, index=index)
+    assert np.array_equal(first.positions, second.positions)
+    assert np.array_equal(first.edges, second.edges)
+    assert first_delta['removed_stars'] == second_delta['removed_stars']
@@ -0,0 +1,43 @@
+import pygame
+import pytest
+
+from BetterGalaxyShape import STAR_TYPES
+from GalaxyRender import GalaxyRenderer, LayeredView, StaticLayer
+
+RED = (255, 0, 0)
+
+
+@pytest.fixture
+def view(galaxy):
+    pygame.init()
+    layer = StaticLayer(GalaxyRenderer(galaxy, STAR_TYPES), (200, 150))
+    return LayeredView(pygame.Surface((200, 150)), layer)
+
+
+def test_layer_is_repainted_once_the_zoom_settles(view, monkeypatch):
+    paints = []
+    paint = view.layer._paint
+    monkeypatch.setattr(view.layer, '_paint', lambda rect: paints.append(rect) or paint(rect))
+    view.begin_frame(0, 0, 0.5)
+    assert len(paints) == 1
+    for zoom in (0.55, 0.6, 0.65):
+        view.begin_frame(0, 0, zoom)
+    assert len(paints) == 1 and view.layer.zoom == 0.5
+    view.begin_frame(0, 0, 0.65)
+    assert len(paints) == 2 and view.layer.zoom == 0.65
+
+
+@pytest.mark.parametrize('camera_x, zoom', [(0, 2.0), (5, 2.0), (-20, 0.5)])
+def test_scaled_layer_lines_up_with_the_world(view, camera_x, zoom):
+    # A 10 by 10 block at world (50, 40) on a layer painted at zoom 1
+    layer = view.layer
+    layer.zoom, layer.camera = 1.0, (0.0, 0.0)
+    layer.surface.fill((0, 0, 0))
+    layer.surface.fill(RED, pygame.Rect(50, 40, 10, 10))
+    view.draw_scaled(camera_x, 0, zoom)
+    x0, y0 = round((50 + camera_x) * zoom), round(40 * zoom)
+    size = round(10 * zoom)
+    assert view.screen.get_at((x0 + 1, y0 + 1))[:3] == RED
+    assert view.screen.get_at((x0 + size - 1, y0 + size - 1))[:3] == RED
+    assert view.screen.get_at((x0 - 1, y0 - 1))[:3] != RED
+    assert view.screen.get_at((x0 + size + 1, y0 + size + 1))[:3] != RED
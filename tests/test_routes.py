@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+import scipy.sparse.csgraph
+
+from GalaxyData import load_galaxy
+from GalaxyRoutes import RouteEngine
+
+LANDMARKS = 8
+
+
+@pytest.fixture(scope='module')
+def engine(galaxy_file):
+    return RouteEngine.from_galaxy(load_galaxy(galaxy_file))
+
+
+@pytest.fixture(scope='module')
+def alt_engine(galaxy_file, tmp_path_factory):
+    # Landmarks go through a save and load, as the route index does
+    engine = RouteEngine.from_galaxy(load_galaxy(galaxy_file))
+    engine.build_landmarks(LANDMARKS, seed=2)
+    filename = str(tmp_path_factory.mktemp('routes') / 'galaxy.alt')
+    engine.save_landmarks(filename)
+    engine.set_landmarks(None, None)
+    engine.load_landmarks(filename)
+    return engine
+
+
+def check_routes(engine, count, seed):
+    # Routes between random pairs against scipy's Dijkstra, and each path
+    # walked lane by lane
+    pairs = np.random.default_rng(seed).integers(len(engine.positions), size=(count, 2)).tolist()
+    table = scipy.sparse.csgraph.dijkstra(engine.graph, directed=False, indices=[source for source, _ in pairs])
+    for k, (source, target) in enumerate(pairs):
+        distance, path = engine.route(source, target)
+        assert distance == pytest.approx(table[k, target])
+        assert path[0] == source and path[-1] == target
+        assert len(set(path)) == len(path)
+        steps = [engine.graph[a, b] for a, b in zip(path, path[1:])]
+        assert all(step > 0 for step in steps)
+        assert sum(steps) == pytest.approx(distance)
+
+
+def test_astar_matches_dijkstra(engine):
+    assert engine.landmark_distances is None
+    check_routes(engine, 50, 1)
+
+
+def test_alt_matches_dijkstra(alt_engine):
+    assert alt_engine.landmark_distances.shape == (len(alt_engine.positions), LANDMARKS)
+    check_routes(alt_engine, 50, 3)
+
+
+def test_landmark_bound_is_admissible(alt_engine):
+    targets = np.random.default_rng(5).integers(len(alt_engine.positions), size=10).tolist()
+    table = alt_engine.distances(targets)
+    nodes = np.arange(len(alt_engine.positions))
+    for k, target in enumerate(targets):
+        assert np.all(alt_engine.heuristic(nodes, target) <= table[k])
+
+
+def test_unconnected_stars_have_no_route():
+    engine = RouteEngine([(0, 0), (1, 0), (5, 5)], [(0, 1)], [1.0])
+    assert engine.route(0, 2) == (np.inf, [])
+    assert engine.route(1, 1) == (0.0, [1])
+    assert engine.route(0, 1) == (1.0, [0, 1])
+
+
+def test_bound_on_short_lanes_with_float32_positions():
+    # Lane distances come from the positions before they were stored as
+    # float32; far from the origin a short lane can then be shorter than
+    # the straight line between its stored stars
+    rng = np.random.default_rng(6)
+    true = np.repeat(rng.uniform(5000, 9000, size=(200, 2)), 2, axis=0)
+    true[1::2] += rng.uniform(-0.01, 0.01, size=(200, 2))
+    edges = np.arange(400).reshape(-1, 2)
+    distances = np.hypot(*(true[edges[:, 0]] - true[edges[:, 1]]).T).astype(np.float32)
+    engine = RouteEngine(true.astype(np.float32), edges, distances)
+    for (source, target), distance in zip(edges.tolist(), distances.tolist()):
+        assert engine.heuristic([source], target)[0] <= distance
+        assert engine.bounds(target)[source] <= distance
+        assert engine.route(source, target) == (pytest.approx(distance), [source, target])
+
+
+@pytest.mark.parametrize('fixture', ['engine', 'alt_engine'])
+def test_routes_to_one_target(request, fixture):
+    engine = request.getfixturevalue(fixture)
+    rng = np.random.default_rng(7)
+    target = int(rng.integers(len(engine.positions)))
+    sources = rng.integers(len(engine.positions), size=40)
+    table = scipy.sparse.csgraph.dijkstra(engine.graph, directed=False, indices=target)
+    for source, path in zip(sources.tolist(), engine.routes_to(sources, target)):
+        assert path[0] == source and path[-1] == target
+        steps = [engine.graph[a, b] for a, b in zip(path, path[1:])]
+        assert sum(steps) == pytest.approx(table[source])
@@ -0,0 +1,93 @@
+import asyncio
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from GalaxyServer import MAX_REGION_STARS, GalaxyServer, GalaxyService
+
+
+@pytest.fixture(scope='module')
+def service(galaxy_file):
+    return GalaxyService.from_file(galaxy_file)
+
+
+def fetch(service, target, headers=(), method='GET'):
+    # One request through a real server on a free port; returns the status,
+    # the response headers and the body
+    async def exchange():
+        server = GalaxyServer(service)
+        listener = await asyncio.start_server(server.handle_connection, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        lines = [f"{method} {target} HTTP/1.1", "Connection: close"] + [f"{k}: {v}" for k, v in headers]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        response = await reader.read()
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return response
+
+    head, _, body = asyncio.run(exchange()).partition(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    response_headers = dict((name.lower(), value.strip()) for name, _, value in
+                            (line.partition(':') for line in header_lines))
+    return int(status_line.split()[1]), response_headers, body
+
+
+@pytest.mark.parametrize('target, status', [
+    ('/galaxy', 200),
+    ('/star/0', 200),
+    ('/route?from=0&to=1', 200),
+    ('/region?x0=0&y0=0&x1=500&y1=500', 200),
+    ('/nowhere', 404),
+    ('/star/99999999', 404),
+    ('/star?name=Nobody', 404),
+    ('/star/x', 400),
+    ('/route?from=0', 400),
+    ('/region?x0=0&y0=0&x1=500', 400),
+    ('/region?x0=nan&y0=0&x1=500&y1=500', 400),
+    ('/region?x0=-inf&y0=0&x1=inf&y1=500', 400),
+    ('/region?x0=-1e9&y0=-1e9&x1=1e9&y1=1e9', 413),
+])
+def test_status_codes(service, target, status, monkeypatch):
+    if status == 413:
+        monkeypatch.setattr('GalaxyServer.MAX_REGION_STARS', len(service.positions) - 1)
+    code, _, body = fetch(service, target)
+    assert code == status
+    assert ('error' in json.loads(body)) == (status != 200)
+
+
+def test_post_is_refused(service):
+    assert fetch(service, '/galaxy', method='POST')[0] == 405
+
+
+def test_etag_gives_304(service):
+    status, headers, body = fetch(service, '/star/0')
+    assert status == 200 and headers['etag']
+    status, _, body = fetch(service, '/star/0', [('If-None-Match', headers['etag'])])
+    assert status == 304 and body == b''
+    status, _, _ = fetch(service, '/star/0', [('If-None-Match', '"stale"')])
+    assert status == 200
+
+
+def test_gzip_has_its_own_etag(service):
+    _, plain_headers, plain = fetch(service, '/region?x0=0&y0=0&x1=2000&y1=2000')
+    _, gzip_headers, packed = fetch(service, '/region?x0=0&y0=0&x1=2000&y1=2000', [('Accept-Encoding', 'gzip')])
+    assert gzip_headers['content-encoding'] == 'gzip'
+    assert gzip_headers['etag'] != plain_headers['etag']
+    assert gzip.decompress(packed) == plain
+
+
+def test_region_matches_a_full_scan(service):
+    x0, y0, x1, y1 = 200.0, 300.0, 700.0, 600.0
+    payload = service.region(x1, y0, x0, y1)
+    p = service.positions
+    expected = np.flatnonzero((p[:, 0] >= x0) & (p[:, 0] <= x1) & (p[:, 1] >= y0) & (p[:, 1] <= y1))
+    assert payload['stars']['index'] == expected.tolist()
+    assert payload['star_count'] <= MAX_REGION_STARS
+    inside = set(expected.tolist())
+    for i, j, _ in payload['lanes']:
+        assert i in inside
+        assert j not in inside or i < j
@@ -0,0 +1,95 @@
+import pytest
+
+from GalaxyFormat import STAR_TYPE_NAMES
+from GalaxyRoutes import RouteEngine
+from GalaxySim import NEUTRAL, GalaxySim
+
+SMALL, MEDIUM = STAR_TYPE_NAMES.index('small'), STAR_TYPE_NAMES.index('medium')
+
+
+@pytest.fixture
+def sim():
+    # Stars 0-1-2-3 in a line, one second per lane; star 4 has no lanes
+    positions = [(0, 0), (10, 0), (20, 0), (30, 0), (100, 100)]
+    edges = [(0, 1), (1, 2), (2, 3)]
+    engine = RouteEngine(positions, edges, [10, 10, 10])
+    return GalaxySim([MEDIUM, SMALL, SMALL, MEDIUM, SMALL], engine, hop_seconds=1.0)
+
+
+def run(sim, seconds):
+    # Fleets move without the stars growing
+    sim.time += seconds
+    sim.resolve_arrivals()
+
+
+def test_claim_starts_at_half_the_limit(sim):
+    assert sim.claim([0, 0], player=1).tolist() == [0]
+    assert sim.owner[0] == 1 and sim.triangles[0] == 25
+    assert not len(sim.claim(0, player=2))
+
+
+def test_send_takes_half_and_follows_the_route(sim):
+    sim.claim(0, 1)
+    ids = sim.send([0, 4], 3, player=1)
+    assert len(ids) == 1
+    assert sim.triangles[0] == 13
+    assert sim.fleet_state([0])['count'] == [12.0]
+    assert sim.routes.tolist() == [0, 1, 2, 3]
+    assert not len(sim.send([1], 3, player=1))
+
+
+def test_weaker_fleet_is_repelled(sim):
+    sim.claim(0, 1)
+    sim.triangles[1] = 20
+    sim.send(0, 1, player=1)
+    run(sim, 1)
+    assert sim.owner[1] == NEUTRAL and sim.triangles[1] == 8
+    assert sim.fleet_count == 0
+
+
+def test_capture_on_the_way_flies_on_with_the_rest(sim):
+    sim.claim(0, 1)
+    sim.triangles[0] = 40
+    sim.triangles[1] = 5
+    sim.send(0, 3, player=1)
+    run(sim, 1)
+    assert sim.owner[1] == 1 and sim.triangles[1] == 15
+    assert sim.fleet_state([0])['count'] == [15.0]
+    run(sim, 1)
+    assert sim.owner[2] == NEUTRAL and sim.triangles[2] == 15
+    assert sim.fleet_count == 0
+
+
+def test_capture_at_the_target_lands_the_rest(sim):
+    sim.claim(2, 1)
+    sim.triangles[2] = 60
+    sim.triangles[3] = 10
+    sim.send(2, 3, player=1)
+    run(sim, 1)
+    assert sim.owner[3] == 1 and sim.triangles[3] == 25 + 20
+    assert sim.fleet_count == 0
+
+
+def test_friendly_target_is_reinforced(sim):
+    sim.claim([0, 1, 2], 1)
+    sim.send(0, 2, player=1)
+    run(sim, 1)
+    assert sim.triangles[1] == 15 and sim.fleet_count == 1
+    run(sim, 1)
+    assert sim.triangles[2] == 15 + 12
+    assert sim.fleet_count == 0
+
+
+def test_delta_reports_changes_once(sim):
+    sim.claim(0, 1)
+    first = sim.delta()
+    assert first['stars']['index'] == [0]
+    assert not sim.delta()['stars']['index']
+    sim.send(0, 3, player=1)
+    launched = sim.delta()
+    assert launched['fleets']['id'] == [0] and launched['stars']['triangles'] == [13]
+    run(sim, 1)
+    repelled = sim.delta()
+    assert repelled['ended_fleets'] == [0] and not repelled['fleets']['id']
+    assert repelled['stars']['index'] == [1] and repelled['stars']['triangles'] == [18]
+    assert sim.snapshot()['stars']['index'] == [0, 1]
@@ -0,0 +1,58 @@
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+from GalaxyData import load_galaxy
+from GalaxyStream import BandFiles, SpanningForest, generate_galaxy_streaming, load_tree
+
+
+def test_streamed_galaxy_is_connected(tmp_path):
+    output = str(tmp_path / 'galaxy.gbin')
+    generate_galaxy_streaming(3000, seed=2, output=output, work_dir=str(tmp_path))
+    galaxy = load_galaxy(output)
+    n = galaxy.star_count
+    edges = np.asarray(galaxy.edges, dtype=np.int64)
+    assert n > 0 and edges.max() < n
+    assert len(np.unique(np.sort(edges, axis=1), axis=0)) == len(edges)
+    components, _ = scipy.sparse.csgraph.connected_components(
+        scipy.sparse.csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n, n)), directed=False)
+    assert components == 1
+
+
+def test_band_forest_matches_the_global_tree(tmp_path):
+    # Random bands: each band's edges join its own stars and the terminals
+    # the band before left, as in stream_bands. Random weights are distinct,
+    # so the minimum spanning forest is unique.
+    rng = np.random.default_rng(3)
+    band_sizes = [40, 25, 60, 1, 35, 50]
+    n = sum(band_sizes)
+    files = BandFiles(str(tmp_path))
+    forest = SpanningForest(files, n, str(tmp_path))
+    all_pairs, all_weights = [], []
+    window = np.zeros(0, dtype=np.int64)
+    first = 0
+    for band, size in enumerate(band_sizes):
+        new_stars = first + np.arange(size)
+        local = np.concatenate([window, new_stars])
+        pairs = np.column_stack([rng.choice(new_stars, 2 * size), rng.choice(local, 2 * size)])
+        pairs = np.unique(np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1), axis=0)
+        weights = rng.random(len(pairs))
+        terminals = rng.choice(new_stars, max(size // 4, 1), replace=False)
+        forest.add_band(band, pairs, weights, np.ones(len(pairs), dtype=bool), new_stars, terminals)
+        all_pairs.append(pairs)
+        all_weights.append(weights)
+        window = terminals
+        first += size
+    roots = np.array(forest.finish(n))
+
+    pairs, weights = np.concatenate(all_pairs), np.concatenate(all_weights)
+    graph = scipy.sparse.csr_matrix((weights, (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    expected = scipy.sparse.csgraph.minimum_spanning_tree(graph).tocoo()
+    expected = np.sort(np.column_stack([expected.row, expected.col]), axis=1)
+    tree = np.concatenate([load_tree(files, band)[:, :2] for band in range(len(band_sizes))])
+    assert len(tree) == len(expected)
+    assert set(map(tuple, np.sort(tree, axis=1).tolist())) == set(map(tuple, expected.tolist()))
+
+    # The same components, whatever the root ids
+    _, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+    assert len(np.unique(np.column_stack([labels, roots]), axis=0)) == len(np.unique(labels)) == len(np.unique(roots))
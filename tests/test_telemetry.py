@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from BetterGalaxyShape import generate_galaxy
+from GalaxyTelemetry import NO_TELEMETRY, Telemetry
+
+GENERATION_STAGES = {'placement', 'triangulation', 'lane_selection', 'reconnect', 'post_process', 'naming', 'save'}
+
+
+def test_stages_nest_and_add_up():
+    telemetry = Telemetry()
+    with telemetry.capture():
+        for _ in range(3):
+            with telemetry.stage('outer'):
+                with telemetry.stage('inner'):
+                    pass
+        telemetry.count('things', 2)
+        telemetry.count('things')
+    assert telemetry.calls == {'inner': 3, 'outer': 3}
+    assert telemetry.seconds['outer'] >= telemetry.seconds['inner']
+    assert telemetry.elapsed >= telemetry.seconds['outer']
+    assert telemetry.counters == {'things': 3}
+    assert 'outer: ' in telemetry.summary_lines()[1] and 'x3' in telemetry.summary_lines()[1]
+
+
+def test_stage_is_timed_when_it_raises():
+    telemetry = Telemetry()
+    with pytest.raises(ValueError):
+        with telemetry.stage('failing'):
+            raise ValueError
+    assert telemetry.calls == {'failing': 1}
+    assert telemetry.depth == 0
+
+
+def test_no_telemetry_records_nothing():
+    with NO_TELEMETRY.capture():
+        with NO_TELEMETRY.stage('anything'):
+            NO_TELEMETRY.count('anything')
+    assert not hasattr(NO_TELEMETRY, 'seconds')
+
+
+def test_generation_report(tmp_path):
+    telemetry = Telemetry(profile=True, trace_memory=True)
+    galaxy = generate_galaxy(3000, seed=1, output=str(tmp_path / 'galaxy.gbin'), telemetry=telemetry)
+    filename = str(tmp_path / 'report.json')
+    telemetry.write_report(filename)
+    with open(filename) as f:
+        report = json.load(f)
+    assert GENERATION_STAGES <= set(report['stages'])
+    assert report['stages']['placement']['calls'] > 1
+    assert 'peak_traced_mb' in report['stages']['post_process']
+    assert report['counters']['stars'] == galaxy.star_count
+    assert report['counters']['lanes'] == galaxy.lane_count
+    assert report['profile'] and report['total_seconds'] > 0
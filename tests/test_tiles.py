@@ -0,0 +1,49 @@
+import json
+import os
+
+import numpy as np
+
+from GalaxyExport import TILE_SIZE, export_galaxy_tiles
+
+
+def load_level(out_dir, manifest, level):
+    # Tiles of a level; the manifest's level keys are strings once read back
+    tiles = []
+    for _, _, _, path in manifest['levels'][str(level)]['tiles']:
+        with open(os.path.join(out_dir, path)) as f:
+            tiles.append(json.load(f))
+    return tiles
+
+
+def test_every_star_in_exactly_one_tile_per_level(galaxy, tmp_path):
+    out_dir = str(tmp_path / 'tiles')
+    export_galaxy_tiles(galaxy, out_dir)
+    with open(os.path.join(out_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    assert manifest['star_count'] == galaxy.star_count
+    for level in range(manifest['leaf_level'] + 1):
+        tiles = load_level(out_dir, manifest, level)
+        assert sum(tile['star_count'] for tile in tiles) == galaxy.star_count
+        for tile in tiles:
+            x0, y0, x1, y1 = tile['bounds']
+            points = np.array(tile['stars']['points']).reshape(-1, 2)
+            assert np.all((points >= [x0, y0]) & (points < [x1, y1]))
+
+    leaves = load_level(out_dir, manifest, manifest['leaf_level'])
+    stars = np.concatenate([tile['stars']['index'] for tile in leaves])
+    assert np.array_equal(np.sort(stars), np.arange(galaxy.star_count))
+    assert all(tile['bounds'][2] - tile['bounds'][0] == TILE_SIZE for tile in leaves)
+
+
+def test_every_lane_in_its_leaf_tiles(galaxy, tmp_path):
+    # Internal lanes once, boundary lanes once from each end
+    out_dir = str(tmp_path / 'tiles')
+    export_galaxy_tiles(galaxy, out_dir)
+    with open(os.path.join(out_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    leaves = load_level(out_dir, manifest, manifest['leaf_level'])
+    internal = [tuple(sorted(lane[:2])) for tile in leaves for lane in tile['lanes']]
+    boundary = [tuple(sorted((lane['star'], lane['other']))) for tile in leaves for lane in tile['boundary_lanes']]
+    assert len(internal) == len(set(internal))
+    assert len(boundary) == 2 * len(set(boundary))
+    assert sorted(set(internal) | set(boundary)) == sorted(map(tuple, np.sort(galaxy.edges, axis=1).tolist()))